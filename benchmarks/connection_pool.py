@@ -0,0 +1,41 @@
+"""
+Per-request latency of STAplusService.execute with its pooled keep-alive session, compared with a new connection
+per request (module-level requests.request), against the local stub server.
+
+    python benchmarks/connection_pool.py --requests 500 --latency 0
+"""
+import argparse
+import time
+
+import requests
+
+import staplus_client as staplus
+from stub import StubServer
+
+
+def measure(server, get, count):
+    connections = server.connections
+    started = time.perf_counter()
+    for i in range(count):
+        get('{}/Things({})'.format(server.url, i))
+    seconds = time.perf_counter() - started
+    return seconds / count * 1000, server.connections - connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500, help='the number of sequential GET requests')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the stub waits before each response')
+    args = parser.parse_args()
+    server = StubServer(latency=args.latency).start()
+    service = staplus.STAplusService(server.url)
+    for name, get in (('new connection per request', lambda url: requests.request('get', url)),
+                      ('STAplusService.execute', lambda url: service.execute('get', url))):
+        ms, connections = measure(server, get, args.requests)
+        print('{:28s} {:.2f} ms/request over {} connections'.format(name, ms, connections))
+    service.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
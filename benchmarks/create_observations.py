@@ -0,0 +1,48 @@
+"""
+Throughput of creating Observations one request each with create(), and in chunks with create_many(), which
+posts them to the CreateObservations action, against the local stub server with a fixed latency.
+
+    python benchmarks/create_observations.py --observations 2000 --chunk-size 500 --latency 0.005
+"""
+import argparse
+import time
+
+import staplus_client as staplus
+from stub import StubServer
+
+
+def observations(count):
+    datastream = staplus.Datastream(id=1)
+    feature_of_interest = staplus.FeatureOfInterest(id=1)
+    return [staplus.Observation('2023-07-02T15:34:{:02d}Z'.format(i % 60), float(i), datastream=datastream,
+                                feature_of_interest=feature_of_interest) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--observations', type=int, default=2000, help='the number of Observations to create')
+    parser.add_argument('--chunk-size', type=int, default=500, help='the Observations per CreateObservations request')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds the stub waits before each response')
+    args = parser.parse_args()
+    server = StubServer(latency=args.latency).start()
+    service = staplus.STAplusService(server.url)
+    dao = service.observations()
+
+    def create_one_by_one(items):
+        for observation in items:
+            service.create(observation)
+
+    for name, create in (('create()', create_one_by_one),
+                         ('create_many()', lambda items: dao.create_many(items, chunk_size=args.chunk_size))):
+        items = observations(args.observations)
+        started = time.perf_counter()
+        create(items)
+        seconds = time.perf_counter() - started
+        assert all(observation.id is not None for observation in items)
+        print('{:14s} {:7.2f}s {:10,.0f} Observations/s'.format(name, seconds, args.observations / seconds))
+    service.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
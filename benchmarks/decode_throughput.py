@@ -0,0 +1,54 @@
+"""
+Decode throughput of a page of synthetic Observations: the default decode of the client (orjson if installed,
+templates and learned decode plans), cls() + __setstate__ per entity, and frost_sta_client.
+
+    python benchmarks/decode_throughput.py --observations 20000 --repeat 5
+"""
+import argparse
+import json
+import time
+
+import frost_sta_client.utils
+
+import staplus_client.utils
+from stub import observation
+
+OBSERVATION = 'staplus_client.model.observation.Observation'
+
+
+def client(body):
+    return staplus_client.utils.transform_json_to_entity_list(staplus_client.utils.loads(body), OBSERVATION).entities
+
+
+def setstate(body):
+    cl = staplus_client.utils.class_from_string(OBSERVATION)
+    entities = []
+    for item in json.loads(body)['value']:
+        entity = cl()
+        entity.__setstate__(item)
+        entities.append(entity)
+    return entities
+
+
+def frost(body):
+    return [frost_sta_client.utils.transform_json_to_entity(item, OBSERVATION) for item in json.loads(body)['value']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--observations', type=int, default=20000, help='the number of Observations in the page')
+    parser.add_argument('--repeat', type=int, default=5, help='the best of this many runs is reported')
+    args = parser.parse_args()
+    body = json.dumps({'value': [observation(i) for i in range(args.observations)]}).encode('utf-8')
+    for decode in (client, setstate, frost):
+        best = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            assert len(decode(body)) == args.observations
+            seconds = time.perf_counter() - started
+            best = seconds if best is None else min(best, seconds)
+        print('{:10s} {:10,.0f} Observations/s'.format(decode.__name__, args.observations / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""
+An in-process STAplusService that answers the pages of a collection of synthetic Observations without a network,
+so that a benchmark measures the client only
+"""
+import json
+
+import requests
+from furl import furl
+
+import staplus_client as staplus
+from stub import observation
+
+
+class FakeService(staplus.STAplusService):
+    def __init__(self, total, page_size, **kwargs):
+        super().__init__('http://localhost/v1.1', **kwargs)
+        self.total = total
+        self.page_size = page_size
+        self.requests = 0
+
+    def _send(self, method, url, **kwargs):
+        self.requests += 1
+        skip = int(furl(str(url)).args.get('$skip', 0))
+        end = min(self.total, skip + self.page_size)
+        page = {'value': [observation(i) for i in range(skip, end)]}
+        if end < self.total:
+            page['@iot.nextLink'] = 'http://localhost/v1.1/Observations?$skip={}'.format(end)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(page).encode('utf-8')
+        return response
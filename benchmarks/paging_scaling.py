@@ -0,0 +1,40 @@
+"""
+The cost per page of iterating an EntityList over a growing number of pages. If following a next link only
+handles the new page, the time per page stays the same however many pages were fetched before.
+
+    python benchmarks/paging_scaling.py --pages 50 100 200 400 --page-size 100
+"""
+import argparse
+import gc
+import time
+
+from fake import FakeService
+
+
+def iterate(pages, page_size, collect):
+    service = FakeService(pages * page_size, page_size)
+    if not collect:
+        gc.disable()
+    try:
+        started = time.perf_counter()
+        count = sum(1 for _ in service.observations().query().list())
+        seconds = time.perf_counter() - started
+    finally:
+        gc.enable()
+    assert count == pages * page_size
+    return seconds / pages * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, nargs='+', default=[50, 100, 200, 400],
+                        help='the numbers of pages to iterate')
+    parser.add_argument('--page-size', type=int, default=100, help='the number of Observations per page')
+    args = parser.parse_args()
+    for pages in args.pages:
+        print('{:5d} pages: {:6.2f} ms/page, {:6.2f} ms/page without the cyclic GC'.format(
+            pages, iterate(pages, args.page_size, True), iterate(pages, args.page_size, False)))
+
+
+if __name__ == '__main__':
+    main()
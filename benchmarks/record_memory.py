@@ -0,0 +1,37 @@
+"""
+The memory retained by synthetic Observations decoded as Observation entities with query().list(), and as
+ObservationRecords with query().records(), measured with tracemalloc once the pages are decoded.
+
+    python benchmarks/record_memory.py --observations 100000
+"""
+import argparse
+import gc
+import tracemalloc
+
+from fake import FakeService
+
+
+def retained_mb(observations, page_size, decode):
+    query = FakeService(observations, page_size).observations().query()
+    gc.collect()
+    tracemalloc.start()
+    items = decode(query)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(items) == observations
+    return current / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--observations', type=int, default=100_000, help='the number of Observations')
+    parser.add_argument('--page-size', type=int, default=1000, help='the number of Observations per page')
+    args = parser.parse_args()
+    for name, decode in (('entities', lambda query: list(query.list())),
+                         ('records', lambda query: query.records())):
+        print('{:8s} {:7.1f} MB'.format(name, retained_mb(args.observations, args.page_size, decode)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Peak RSS of iterating a collection of synthetic Observations with query().stream(), which drops every page once
+it is consumed, or with query().list(), which keeps them all. Run one mode per process, the peak RSS is the one of
+the whole process. The request was measured with 10M Observations, which takes a few minutes.
+
+    python benchmarks/stream_memory.py --observations 10000000 --mode stream
+"""
+import argparse
+import resource
+import sys
+import time
+
+from fake import FakeService
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--observations', type=int, default=10_000_000, help='the number of Observations')
+    parser.add_argument('--page-size', type=int, default=1000, help='the number of Observations per page')
+    parser.add_argument('--mode', choices=('stream', 'list'), default='stream')
+    args = parser.parse_args()
+    service = FakeService(args.observations, args.page_size)
+    query = service.observations().query()
+    before = peak_rss_mb()
+    started = time.perf_counter()
+    entity_list = query.stream() if args.mode == 'stream' else query.list()
+    count = sum(1 for _ in entity_list)
+    seconds = time.perf_counter() - started
+    assert count == args.observations
+    print('{}(): {:,} Observations in {:.0f}s, peak RSS {:.1f} MB, {:.1f} MB more than before iterating'.format(
+        args.mode, count, seconds, peak_rss_mb(), peak_rss_mb() - before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+A local stub of a STAplus service for the benchmarks. It serves a collection of synthetic Observations in pages,
+any single entity, creates entities and answers the CreateObservations action, optionally after a fixed latency.
+"""
+import json
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+ENTITY = re.compile(r'/(\w+)\((\d+)\)$')
+
+
+def observation(i):
+    return {'@iot.id': i, '@iot.selfLink': 'http://localhost/v1.1/Observations({})'.format(i),
+            'phenomenonTime': '2023-07-02T15:{:02d}:{:02d}Z'.format((i // 60) % 60, i % 60),
+            'resultTime': '2023-07-02T15:34:00Z', 'result': i * 0.5, 'parameters': {'k': i % 3},
+            'Datastream': {'@iot.id': 1}}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, body=b'', headers=None):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data, headers=None):
+        self.send(status, json.dumps(data).encode('utf-8'), dict(headers or {}, **{'Content-Type': 'application/json'}))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith('/Observations'):
+            query = parse_qs(url.query)
+            skip = int(query.get('$skip', ['0'])[0])
+            end = min(self.server.total, skip + self.server.page_size)
+            page = {'value': [observation(i) for i in range(skip, end)]}
+            if end < self.server.total:
+                page['@iot.nextLink'] = 'http://{}{}?$skip={}'.format(self.headers['Host'], url.path, end)
+            return self.send_json(200, page)
+        match = ENTITY.search(url.path)
+        if match is None:
+            return self.send_json(404, {'message': 'not found'})
+        self.send_json(200, {'@iot.id': int(match.group(2)), 'name': 'name', 'description': 'description'})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+        url = urlparse(self.path)
+        entity_set = url.path.rsplit('/', 1)[1]
+        host = self.headers['Host']
+        if entity_set == 'CreateObservations':
+            links = []
+            for group in body:
+                for _ in group['dataArray']:
+                    links.append('http://{}/v1.1/Observations({})'.format(host, self.server.next_id()))
+            return self.send_json(201, links)
+        location = 'http://{}/v1.1/{}({})'.format(host, entity_set, self.server.next_id())
+        self.send(201, headers={'Location': location})
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, total=1000, page_size=100, latency=0.0):
+        """
+        params:
+            total: the number of Observations in the collection
+            page_size: the number of Observations per page
+            latency: seconds the server waits before each response
+        """
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.total = total
+        self.page_size = page_size
+        self.latency = latency
+        self.connections = 0
+        self._ids = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/v1.1'.format(self.server_address[1])
+
+    def next_id(self):
+        with self._lock:
+            self._ids += 1
+            return self._ids
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
@@ -23,5 +23,6 @@ setup(
     #data_files=[('.',['__version__.py'])],
     install_requires=['demjson3>=3.0.5', 'furl>=2.1.3', 'geojson>=2.5.0', 'jsonpickle>=2.0.0',
                       'requests>=2.26.0', 'jsonpatch', 'python-dateutil', 'pillow', 'sd-frost-sta-client'],
+    extras_require={'async': ['aiohttp']},
     keywords=['ogc', 'staplus', 'sensorthingsapi', 'IoT']
 )
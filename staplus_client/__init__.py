@@ -34,7 +34,15 @@ from staplus_client.model.observedproperty import ObservedProperty
 from staplus_client.model.historical_location import HistoricalLocation
 from staplus_client.model.ext.entity_type import EntityTypes
 from staplus_client.model.ext.unitofmeasurement import UnitOfMeasurement
+from staplus_client.model.ext.observation_record import ObservationRecord
 from staplus_client.service.staplusservice import STAplusService
+from staplus_client.service.async_staplusservice import AsyncSTAplusService
+from staplus_client.service.identity_map import IdentityMap
+from staplus_client.service.cache import EntityCache, ResponseCache
+from staplus_client.service.store import EntityStore
+from staplus_client.service.retry import RetryPolicy
+from staplus_client.service.limiter import RateLimiter
+from staplus_client.service.instrumentation import Hooks, HistogramCollector
 
 import jsonpickle
 import demjson3
@@ -13,10 +13,10 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from frost_sta_client.dao.actuator import ActuatorDao as STAActuatorDao
-from staplus_client.dao.base import BaseDao as STAplusBaseDao
+from staplus_client.dao.base import DaoMixin
 from staplus_client.query.query import Query
 
-class ActuatorDao(STAActuatorDao):
+class ActuatorDao(DaoMixin, STAActuatorDao):
     def __init__(self, service):
         """
         A data access object for operations with the Actuator entity
@@ -24,7 +24,4 @@ class ActuatorDao(STAActuatorDao):
         super().__init__(service)
 
     def query(self):
-        return Query(self.service, self.entitytype, self.entitytype_plural, self.entity_class, self.parent)
-
-    def create(self, entity):
-        return STAplusBaseDao.create(self, entity)
\ No newline at end of file
+        return Query(self.service, self.entitytype, self.entitytype_plural, self.entity_class, self.parent)
\ No newline at end of file
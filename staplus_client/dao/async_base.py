@@ -0,0 +1,85 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import requests
+
+import staplus_client.utils
+import staplus_client.query.async_query
+import staplus_client.service.async_staplusservice
+from staplus_client.dao.base import BaseDao
+
+
+class AsyncBaseDao(BaseDao):
+    """
+    The data access object of AsyncSTAplusService, for all entity types. The operations are coroutines, they
+    share everything but the request with the operations of BaseDao.
+    """
+    @property
+    def service(self):
+        return self._service
+
+    @service.setter
+    def service(self, value):
+        if value is None or isinstance(value, staplus_client.service.async_staplusservice.AsyncSTAplusService):
+            self._service = value
+            return
+        raise ValueError('service should be of type AsyncSTAplusService')
+
+    async def create(self, entity):
+        url = self._collection_url()
+        logging.debug('Posting to ' + str(url.url))
+        json_dict = staplus_client.utils.transform_entity_to_json_dict(entity)
+        response = await self._execute('post', url, 'Creating', type(entity).__name__, json=json_dict)
+        return self._created(entity, url, response)
+
+    async def find(self, id):
+        entity = self._cached(id)
+        if entity is not None:
+            return entity
+        url = self._entity_url(id)
+        logging.debug('Fetching: {}'.format(url.url))
+        response = await self._execute('get', url, 'Finding', id)
+        return self._found(id, url, response)
+
+    async def patch(self, entity, patches):
+        url = self._entity_url(self._valid_id(entity))
+        logging.debug(f'Patching to {url.url}')
+        await self._execute('patch', url, 'Patching', type(entity).__name__, json=self._patches(patches),
+                            headers=self.APPLICATION_JSON_PATCH)
+
+    async def update(self, entity):
+        url = self._entity_url(self._valid_id(entity))
+        logging.debug('Updating to {}'.format(url.url))
+        json_dict = staplus_client.utils.transform_entity_to_json_dict(entity)
+        await self._execute('put', url, 'Updating', type(entity).__name__, json=json_dict)
+
+    async def delete(self, entity):
+        url = self._entity_url(entity.id)
+        logging.debug('Deleting: {}'.format(url.url))
+        await self._execute('delete', url, 'Deleting', type(entity).__name__)
+
+    def query(self):
+        return staplus_client.query.async_query.AsyncQuery(self.service, self.entitytype, self.entitytype_plural,
+                                                           self.entity_class, self.parent)
+
+    async def _execute(self, method, url, action, name, **kwargs):
+        try:
+            response = await self.service.execute(method, url, **kwargs)
+        except requests.exceptions.HTTPError as e:
+            self._failed(action, name, e)
+            raise e
+        logging.debug('Received response: {}'.format(response.status_code))
+        return response
@@ -17,6 +17,8 @@ import staplus_client.query.query
 import staplus_client.utils
 
 import logging
+import time
+import jsonpatch
 import requests
 from furl import furl
 
@@ -24,47 +26,129 @@ from frost_sta_client.utils import extract_value
 from frost_sta_client.dao.base import BaseDao as STABaseDao
 import staplus_client.utils
 
-class BaseDao(STABaseDao):
+class DaoMixin:
     """
-    The STAplus extension
+    The STAplus operations of a data access object. The mixin comes first in the bases of every data access
+    object, so that its operations take precedence over the ones inherited from frost_sta_client.
     """
     APPLICATION_JSON_PATCH = {'Content-type': 'application/json-patch+json'}
 
-    def __init__(self, service, entitytype):
-        super().__init__(service, entitytype)
+    def create(self, entity):
+        url = self._collection_url()
+        logging.debug('Posting to ' + str(url.url))
+        json_dict = staplus_client.utils.transform_entity_to_json_dict(entity)
+        response = self._execute('post', url, 'Creating', type(entity).__name__, json=json_dict)
+        return self._created(entity, url, response)
 
-    @property
-    def service(self):
-        return self._service
+    def find(self, id):
+        entity = self._cached(id)
+        if entity is not None:
+            return entity
+        url = self._entity_url(id)
+        logging.debug('Fetching: {}'.format(url.url))
+        response = self._execute('get', url, 'Finding', id)
+        return self._found(id, url, response)
 
-    @service.setter
-    def service(self, value):
-        if value is None or isinstance(value, staplus_client.service.staplusservice.STAplusService):
-            self._service = value
-            return
-        raise ValueError('service should be of type STAplusService')
+    def patch(self, entity, patches):
+        url = self._entity_url(self._valid_id(entity))
+        logging.debug(f'Patching to {url.url}')
+        self._execute('patch', url, 'Patching', type(entity).__name__, json=self._patches(patches),
+                      headers=self.APPLICATION_JSON_PATCH)
 
-    def create(self, entity):
-        url = furl(self.service.url)
-        url.path.add(self.entitytype_plural)
-        logging.debug('Posting to ' + str(url.url))
+    def update(self, entity):
+        url = self._entity_url(self._valid_id(entity))
+        logging.debug('Updating to {}'.format(url.url))
         json_dict = staplus_client.utils.transform_entity_to_json_dict(entity)
+        self._execute('put', url, 'Updating', type(entity).__name__, json=json_dict)
+
+    def delete(self, entity):
+        url = self._entity_url(entity.id)
+        logging.debug('Deleting: {}'.format(url.url))
+        self._execute('delete', url, 'Deleting', type(entity).__name__)
+
+    def query(self):
+        return staplus_client.query.query.Query(self.service, self.entitytype, self.entitytype_plural,
+                                                  self.entity_class, self.parent)
+
+    def _execute(self, method, url, action, name, **kwargs):
         try:
-            response = self.service.execute('post', url, json=json_dict)
+            response = self.service.execute(method, url, **kwargs)
         except requests.exceptions.HTTPError as e:
-            error_json = e.response.json()
-            error_message = error_json['message']
-            logging.error("Creating {} failed with status-code {}, {}".format(type(entity).__name__,
-                                                                            e.response.status_code,
-                                                                            error_message))
+            self._failed(action, name, e)
             raise e
+        logging.debug('Received response: {}'.format(response.status_code))
+        return response
+
+    @staticmethod
+    def _failed(action, name, e):
+        error_message = staplus_client.utils.error_message(e.response)
+        logging.error("{} {} failed with status-code {}, {}".format(action, name, e.response.status_code,
+                                                                   error_message))
+
+    def _collection_url(self):
+        url = furl(self.service.url)
+        url.path.add(self.entitytype_plural)
+        return url
+
+    def _entity_url(self, id):
+        url = furl(self.service.url)
+        url.path.add(self.entity_path(id))
+        return url
+
+    @staticmethod
+    def _valid_id(entity):
+        if entity.id is None or entity.id == '':
+            raise AttributeError('please provide an entity with a valid id')
+        return entity.id
+
+    @staticmethod
+    def _patches(patches):
+        if isinstance(patches, jsonpatch.JsonPatch):
+            patches = patches.patch
+        if not (isinstance(patches, list) and all(isinstance(x, dict) for x in patches)):
+            raise ValueError('please provide a list of patches, either as a jsonpatch object or a '
+                             'list of dictionaries')
+        return patches
+
+    def _created(self, entity, url, response):
         entity.id = extract_value(response.headers['location'])
         entity.service = self.service
         id = "('" + entity.id + "')" if type(entity.id) == str else'(' + str(entity.id) + ')'
         entity.self_link = url.url + id
-        logging.debug('Received response: ' + str(response.status_code))
         return entity.id
 
-    def query(self):
-        return staplus_client.query.query.Query(self.service, self.entitytype, self.entitytype_plural,
-                                                  self.entity_class, self.parent)
+    def _cached(self, id):
+        if self.service.cache is None:
+            return None
+        return self.service.cache.get(self.entity_class.rsplit('.', 1)[-1], id)
+
+    def _found(self, id, url, response):
+        started = time.perf_counter()
+        json_response = staplus_client.utils.response_json(response)
+        json_response['id'] = json_response['@iot.id']
+        entity = staplus_client.utils.transform_json_to_trusted_entity(json_response, self.entity_class)
+        entity = self.service.canonical(entity, json_response)
+        entity.service = self.service
+        self.service.report_decode(url, 1, time.perf_counter() - started)
+        if self.service.cache is not None:
+            self.service.cache.put(self.entity_class.rsplit('.', 1)[-1], id, entity)
+        return entity
+
+
+class BaseDao(DaoMixin, STABaseDao):
+    """
+    The STAplus extension
+    """
+    def __init__(self, service, entitytype):
+        super().__init__(service, entitytype)
+
+    @property
+    def service(self):
+        return self._service
+
+    @service.setter
+    def service(self, value):
+        if value is None or isinstance(value, staplus_client.service.staplusservice.STAplusService):
+            self._service = value
+            return
+        raise ValueError('service should be of type STAplusService')
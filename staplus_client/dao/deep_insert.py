@@ -0,0 +1,272 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Creating a graph of new entities with one deep insert request. Related entities that have an id are sent as
+reference, new ones are inlined. A new entity that is related more than once in the graph is created first, as
+it would otherwise be inserted once for every relation. After the deep insert, the ids of the inlined entities
+are read with one request that expands exactly the inlined relations.
+"""
+
+import logging
+import math
+import requests
+from furl import furl
+
+import staplus_client.utils
+from staplus_client.model.ext import dedupe, time_value
+from frost_sta_client.model.entity import Entity
+from frost_sta_client.utils import extract_value
+
+
+def related(entity, key):
+    """
+    The entities related to an entity by a navigation property, as a list; None if key is no navigation property
+    """
+    value = getattr(entity, staplus_client.utils.attribute_name(key), None)
+    if isinstance(value, Entity):
+        return [value]
+    if hasattr(value, 'entities'):
+        value = value.entities
+    if isinstance(value, list) and all(isinstance(v, Entity) for v in value):
+        return value
+    return None
+
+
+def is_new(entity):
+    return entity.id is None or entity.id == ''
+
+
+def relations(entity, data, ancestors):
+    """
+    The related entities of an entity with their JSON, as (key, [(child, child_data), ...]) per navigation
+    property. Relations back to an ancestor are left out, they are implied by the nesting.
+    """
+    for key, value in data.items():
+        children = related(entity, key) if isinstance(value, (dict, list)) else None
+        if children is None:
+            continue
+        values = value if isinstance(value, list) else [value]
+        yield key, [(child, child_data) for child, child_data in zip(children, values)
+                    if id(child) not in ancestors and isinstance(child_data, dict)]
+
+
+def shared_new_entities(entity, data):
+    """
+    The new entities that are related more than once in the graph below entity
+    """
+    counts = {}
+    new_entities = []
+
+    def count(parent, parent_data, ancestors):
+        for key, children in relations(parent, parent_data, ancestors):
+            for child, child_data in children:
+                if not is_new(child):
+                    continue
+                counts[id(child)] = counts.get(id(child), 0) + 1
+                if counts[id(child)] == 1:
+                    new_entities.append(child)
+                    count(child, child_data, ancestors | {id(child)})
+
+    count(entity, data, {id(entity)})
+    return [e for e in new_entities if counts[id(e)] > 1]
+
+
+def plan(entity, data, ancestors):
+    """
+    Rewrite the JSON of a new entity for a deep insert: empty relations and relations back to an ancestor are
+    removed, related entities with an id become references. Returns the $expand items of the inlined relations
+    and the inlined entities as (key, child, child_data, nodes) tree.
+    """
+    for key in [k for k, v in data.items() if v is None and k[0].isupper()]:
+        del data[key]
+    expands = []
+    nodes = []
+    for key, children in list(relations(entity, data, ancestors)):
+        if len(children) == 0:
+            del data[key]
+            continue
+        values = []
+        nested = set()
+        for child, child_data in children:
+            if not is_new(child):
+                values.append({'@iot.id': child.id})
+                continue
+            child_expands, child_nodes = plan(child, child_data, ancestors | {id(child)})
+            values.append(child_data)
+            nodes.append((key, child, child_data, child_nodes))
+            nested.update(child_expands)
+        data[key] = values if isinstance(data[key], list) else values[0]
+        if any(node[0] == key for node in nodes):
+            expands.append(key if len(nested) == 0 else '{}($expand={})'.format(key, ','.join(sorted(nested))))
+    return expands, nodes
+
+
+class DeepInsertError(Exception):
+    """
+    Raised when the ids of inlined entities could not be read after a deep insert. The entities were created,
+    entity has its id, unresolved is the list of the inlined entities without id.
+    """
+    def __init__(self, entity, unresolved):
+        super().__init__('Could not find the id of {} created {}: {}'.format(
+            len(unresolved), 'entity' if len(unresolved) == 1 else 'entities',
+            ', '.join(type(e).__name__ for e in unresolved)))
+        self.entity = entity
+        self.unresolved = unresolved
+
+
+def comparable(key, value):
+    """
+    A property value as it can be compared with the value the service returns: times as the instant they denote,
+    so the time zone and format the service writes do not matter, and numbers as int if they are integral
+    """
+    if key.endswith('Time') and isinstance(value, (str, list, tuple)):
+        try:
+            return time_value.parse(value)
+        except ValueError:
+            return value
+    return dedupe.canonical(value)
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def equal(value, other):
+    # a float may come back with another representation, e.g. if the service stores it with less precision
+    if (isinstance(value, float) or isinstance(other, float)) and is_number(value) and is_number(other):
+        return math.isclose(value, other, rel_tol=1e-9)
+    return value == other
+
+
+def matches(data, created):
+    """
+    True if the properties that were sent for an entity are equal to the ones of a created entity
+    """
+    return all(equal(comparable(key, created.get(key, None)), comparable(key, value))
+               for key, value in data.items()
+               if not key[0].isupper() and not key.startswith('@') and not isinstance(value, (dict, list)))
+
+
+def expanded(service, created, key):
+    """
+    The JSON of the entities expanded in created by the navigation property key, with the pages behind the
+    next link of the expanded list. The pages are added to created, so they are only read once.
+    """
+    value = created.get(key, None)
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        return [value]
+    next_link = created.pop(key + '@iot.nextLink', None)
+    if next_link is None:
+        return list(value)
+    entities = value
+    while next_link is not None:
+        try:
+            page = staplus_client.utils.response_json(service.execute('get', next_link))
+        except requests.exceptions.HTTPError as e:
+            error_message = staplus_client.utils.error_message(e.response)
+            logging.error("Reading the created {} failed with status-code {}, {}".format(key, e.response.status_code,
+                                                                                       error_message))
+            raise e
+        entities += page.get('value', [])
+        next_link = page.get('@iot.nextLink', None)
+    return list(entities)
+
+
+def match_tree(service, child_data, child_nodes, created):
+    """
+    True if created has the properties of child_data and, for every inlined entity below it, a related entity
+    with its properties. Siblings with the same properties are told apart by the entities inlined below them.
+    """
+    if not matches(child_data, created):
+        return False
+    candidates = {}
+    for key, _, data, nodes in child_nodes:
+        if key not in candidates:
+            candidates[key] = expanded(service, created, key)
+        match = next((e for e in candidates[key] if match_tree(service, data, nodes, e)), None)
+        if match is None:
+            return False
+        candidates[key].remove(match)
+    return True
+
+
+def resolve(service, nodes, created):
+    """
+    Set id, self link and service of the inlined entities from the expanded JSON of the created entity. The
+    entities are matched in the order they were sent. Returns the inlined entities whose id was not found.
+    """
+    unresolved = []
+    unmatched = {}
+    for key, child, child_data, child_nodes in nodes:
+        if key not in unmatched:
+            unmatched[key] = expanded(service, created, key)
+        match = next((e for e in unmatched[key] if match_tree(service, child_data, child_nodes, e)), None)
+        if match is None:
+            logging.warning('Could not find the id of the created {}'.format(type(child).__name__))
+            unresolved.append(child)
+            continue
+        unmatched[key].remove(match)
+        child.id = match['@iot.id']
+        child.self_link = match.get('@iot.selfLink', None)
+        child.service = service
+        unresolved += resolve(service, child_nodes, match)
+    return unresolved
+
+
+def create(service, entity):
+    """
+    Create an entity together with all new related entities, see the module description. Returns the id.
+    Raises a DeepInsertError if the ids of inlined entities could not be read.
+    """
+    dao = entity.get_dao(service)
+    data = staplus_client.utils.transform_entity_to_json_dict(entity)
+    for shared in shared_new_entities(entity, data):
+        create(service, shared)
+    data = staplus_client.utils.transform_entity_to_json_dict(entity)
+    expands, nodes = plan(entity, data, {id(entity)})
+    url = furl(service.url)
+    url.path.add(dao.entitytype_plural)
+    logging.debug('Posting deep insert to ' + str(url.url))
+    try:
+        response = service.execute('post', url, json=data)
+    except requests.exceptions.HTTPError as e:
+        error_message = staplus_client.utils.error_message(e.response)
+        logging.error("Creating {} failed with status-code {}, {}".format(type(entity).__name__,
+                                                                        e.response.status_code,
+                                                                        error_message))
+        raise e
+    entity.id = extract_value(response.headers['location'])
+    entity.self_link = response.headers['location']
+    entity.service = service
+    if len(expands) == 0:
+        return entity.id
+    url = furl(service.url)
+    url.path.add(dao.entity_path(entity.id))
+    url.args['$expand'] = ','.join(expands)
+    try:
+        created = staplus_client.utils.response_json(service.execute('get', url))
+    except requests.exceptions.HTTPError as e:
+        error_message = staplus_client.utils.error_message(e.response)
+        logging.error("Reading the created {} failed with status-code {}, {}".format(type(entity).__name__,
+                                                                                   e.response.status_code,
+                                                                                   error_message))
+        raise e
+    unresolved = resolve(service, nodes, created)
+    if len(unresolved) > 0:
+        raise DeepInsertError(entity, unresolved)
+    return entity.id
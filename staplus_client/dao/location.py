@@ -13,11 +13,11 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from frost_sta_client.dao.location import LocationDao as STALocationDao
-from staplus_client.dao.base import BaseDao as STAplusBaseDao
+from staplus_client.dao.base import DaoMixin
 from staplus_client.query.query import Query
 from staplus_client.model.ext.entity_type import EntityTypes
 
-class LocationDao(STALocationDao):
+class LocationDao(DaoMixin, STALocationDao):
     def __init__(self, service):
         """
         A data access object for operations with the Location entity
@@ -30,6 +30,3 @@ class LocationDao(STALocationDao):
 
     def query(self):
         return Query(self.service, self.entitytype, self.entitytype_plural, self.entity_class, self.parent)
-
-    def create(self, entity):
-        return STAplusBaseDao.create(self, entity)
@@ -1,9 +1,14 @@
+import logging
+import requests
+
 from frost_sta_client.dao.observation import ObservationDao as STAObservationDao
-from staplus_client.dao.base import BaseDao as STAplusBaseDao
+from frost_sta_client.utils import extract_value
+from staplus_client.dao.base import DaoMixin
 from staplus_client.query.query import Query
 from staplus_client.model.ext.entity_type import EntityTypes
+import staplus_client.utils
 
-class ObservationDao(STAObservationDao):
+class ObservationDao(DaoMixin, STAObservationDao):
     def __init__(self, service):
         """
         A data access object for operations with the Observation entity
@@ -17,8 +22,40 @@ class ObservationDao(STAObservationDao):
     def query(self):
         return Query(self.service, self.entitytype, self.entitytype_plural, self.entity_class, self.parent)
 
-    def create(self, entity):
-        return STAplusBaseDao.create(self, entity)
+    def create_many(self, observations, chunk_size=1000):
+        """
+        Create many Observations with one request per chunk, instead of one request per Observation. The
+        Observations are posted in the dataArray format to the CreateObservations action, grouped by their
+        Datastream or MultiDatastream, which must already have an id. A FeatureOfInterest must be referenced
+        by id as well.
+        The created Observations get their id, self_link and service set. Returns the ids in the order of
+        the given Observations, with None for each Observation the server rejected.
+        """
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise ValueError('chunk_size should be a positive int')
+        url = self.service.url.copy()
+        url.path.add(self.CREATE_OBSERVATIONS)
+        observations = list(observations)
+        for start in range(0, len(observations), chunk_size):
+            json_list, ordered = staplus_client.utils.transform_observations_to_data_array(
+                observations[start:start + chunk_size])
+            logging.debug('Posting {} Observations to {}'.format(len(ordered), url.url))
+            try:
+                response = self.service.execute('post', url, json=json_list)
+            except requests.exceptions.HTTPError as e:
+                error_message = staplus_client.utils.error_message(e.response)
+                logging.error("Creating Observations failed with status-code {}, {}".format(e.response.status_code,
+                                                                                           error_message))
+                raise e
+            links = staplus_client.utils.response_json(response)
+            for observation, link in zip(ordered, links):
+                if link.startswith('error'):
+                    logging.error("Creating Observation {} failed: {}".format(observation.phenomenon_time, link))
+                    continue
+                observation.id = extract_value(link)
+                observation.self_link = link
+                observation.service = self.service
+        return [observation.id for observation in observations]
 
 class ObjectDao(ObservationDao):
     def __init__(self, service):
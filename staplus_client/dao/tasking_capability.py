@@ -13,10 +13,10 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from frost_sta_client.dao.tasking_capability import TaskingCapabilityDao as STATaskingCapabilityDao
-from staplus_client.dao.base import BaseDao as STAplusBaseDao
+from staplus_client.dao.base import DaoMixin
 from staplus_client.query.query import Query
 
-class TaskingCapabilityDao(STATaskingCapabilityDao):
+class TaskingCapabilityDao(DaoMixin, STATaskingCapabilityDao):
     def __init__(self, service):
         """
         A data access object for operations with the TaskingCapability entity
@@ -24,7 +24,4 @@ class TaskingCapabilityDao(STATaskingCapabilityDao):
         super().__init__(service)
 
     def query(self):
-        return Query(self.service, self.entitytype, self.entitytype_plural, self.entity_class, self.parent)
-
-    def create(self, entity):
-        return STAplusBaseDao.create(self, entity)
\ No newline at end of file
+        return Query(self.service, self.entitytype, self.entitytype_plural, self.entity_class, self.parent)
\ No newline at end of file
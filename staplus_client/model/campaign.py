@@ -12,12 +12,11 @@
 #
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-from datetime import datetime
 
 from frost_sta_client.utils import check_datetime
 from staplus_client.utils import transform_json_to_entity_list
 from staplus_client.model import entity, datastream, multi_datastream, license, observation_group, party
-from staplus_client.model.ext import entity_list, entity_type
+from staplus_client.model.ext import entity_list, entity_type, time_value
 from staplus_client.dao.campaign import CampaignDao
 
 
@@ -323,11 +322,11 @@ class Campaign(entity.Entity):
             return False
         if self.privacy_policy != other.privacy_policy:
             return False
-        if self.creation_time is not None and other.creation_time is not None and datetime.fromisoformat(self.creation_time) != datetime.fromisoformat(other.creation_time):
+        if self.creation_time is not None and other.creation_time is not None and not time_value.equal(self, other, 'creation_time'):
             return False
-        if self.start_time is not None and other.start_time is not None and datetime.fromisoformat(self.start_time) != datetime.fromisoformat(other.start_time):
+        if self.start_time is not None and other.start_time is not None and not time_value.equal(self, other, 'start_time'):
             return False
-        if self.end_time is not None and other.end_time is not None and datetime.fromisoformat(self.end_time) != datetime.fromisoformat(other.end_time):
+        if self.end_time is not None and other.end_time is not None and not time_value.equal(self, other, 'end_time'):
             return False
         if self.url != other.url:
             return False
@@ -351,11 +350,11 @@ class Campaign(entity.Entity):
         if self.privacy_policy is not None and self.privacy_policy != '':
             data['privacyPolicy'] = self.privacy_policy
         if self.creation_time is not None:
-            data['creationTime'] = datetime.fromisoformat(self.creation_time)
+            data['creationTime'] = time_value.isoformat(self, 'creation_time')
         if self.start_time is not None:
-            data['startTime'] = datetime.fromisoformat(self.start_time)
+            data['startTime'] = time_value.isoformat(self, 'start_time')
         if self.end_time is not None:
-            data['endTime'] = datetime.fromisoformat(self.end_time)
+            data['endTime'] = time_value.isoformat(self, 'end_time')
         if self.url is not None and self.url != '':
             data['url'] = self.url
         if self.properties is not None and self.terms_of_use != {}:
@@ -0,0 +1,89 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import requests
+
+import staplus_client.service.async_staplusservice
+from staplus_client.model.ext.entity_list import EntityList, parse_json, decode_page, query_failed
+
+
+async def fetch_response(service, url):
+    try:
+        response = await service.execute('get', url)
+    except requests.exceptions.HTTPError as e:
+        query_failed(e)
+        raise e
+    logging.debug('Received response: {} from {}'.format(response.status_code, url))
+    return response
+
+
+async def fetch_json(service, url):
+    """
+    Fetch one page of an entity collection as parsed JSON
+    """
+    return parse_json(await fetch_response(service, url))
+
+
+async def fetch_page(service, url, entity_class):
+    """
+    Fetch and decode one page of an entity collection. The entities of the page have the service set.
+    """
+    page = decode_page(service, url, entity_class, await fetch_response(service, url))
+    return AsyncEntityList.from_page(page)
+
+
+class AsyncEntityList(EntityList):
+    """
+    An EntityList of AsyncSTAplusService. Iterating it with 'async for' follows the next links; a plain
+    'for' raises a TypeError when it reaches the end of the pages that are already loaded.
+    """
+    def __init__(self, entity_class, entities=None, retain=True):
+        super().__init__(entity_class, entities, retain)
+
+    def __aiter__(self):
+        self.iterable_entities = iter(enumerate(self.entities, start=self._offset))
+        return self
+
+    async def __anext__(self):
+        idx, next_entity = self._next_entity()
+        if next_entity is not None:
+            return next_entity
+        if self.next_link is not None:
+            return self._add_page(await fetch_page(self.service, self.next_link, self.entity_class), idx)
+        raise StopAsyncIteration
+
+    def _next_page(self):
+        raise TypeError('the following pages of an AsyncEntityList can only be fetched with async for')
+
+    @property
+    def prefetch(self):
+        return 0
+
+    @prefetch.setter
+    def prefetch(self, value):
+        if value != 0:
+            raise ValueError('prefetch is not supported by AsyncEntityList')
+
+    @property
+    def service(self):
+        return self._service
+
+    @service.setter
+    def service(self, value):
+        if value is None or isinstance(value, staplus_client.service.async_staplusservice.AsyncSTAplusService):
+            self._service = value
+            return
+        raise ValueError('service should be of type AsyncSTAplusService')
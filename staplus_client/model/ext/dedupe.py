@@ -0,0 +1,116 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import logging
+
+import staplus_client.utils
+from staplus_client.model.ext import time_value
+from staplus_client.model.ext.entity_type import EntityTypes
+
+
+def canonical(value):
+    # 21.0 and 21 are the same result, whichever way the server or the caller wrote it
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, dict):
+        return {str(key): canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical(item) for item in value]
+    return value
+
+
+def stream_of(observation):
+    """
+    ('Datastream', id) or ('MultiDatastream', id) of an Observation, None if it has neither
+    """
+    if observation.datastream is not None and observation.datastream.id is not None:
+        return 'Datastream', observation.datastream.id
+    if observation.multi_datastream is not None and observation.multi_datastream.id is not None:
+        return 'MultiDatastream', observation.multi_datastream.id
+    return None
+
+
+def content_hash(observation, stream=None):
+    """
+    A hash of the Datastream (or MultiDatastream), phenomenonTime, result and parameters of an Observation, the
+    same in every process, so it can be stored. The phenomenonTime is compared as UTC instant, so the same time in
+    another time zone gives the same hash.
+    params:
+        stream: ('Datastream', id) or ('MultiDatastream', id), used if the Observation has neither
+    """
+    stream = stream_of(observation) or stream
+    value = time_value.cached(observation, 'phenomenon_time')
+    time = None
+    if value is not None:
+        time = value.key[0].isoformat() if value.end is None else \
+            value.key[0].isoformat() + '/' + value.key[1].isoformat()
+    content = [list(stream) if stream is not None else None, time, canonical(observation.result),
+               canonical(observation.parameters or None)]
+    encoded = json.dumps(content, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.blake2b(encoded.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def unique(entities, key=content_hash):
+    """
+    The entities without the ones that have the same key as an entity before them
+    """
+    seen = set()
+    result = []
+    for entity in entities:
+        entity_key = key(entity)
+        if entity_key in seen:
+            continue
+        seen.add(entity_key)
+        result.append(entity)
+    return result
+
+
+def literal(value):
+    return value.isoformat().replace('+00:00', 'Z')
+
+
+def present(service, observations, batch_size=100):
+    """
+    The content hashes of the observations that the service already has. The Observations are sorted by
+    phenomenonTime per Datastream or MultiDatastream and looked up batch_size at a time, with one $filter on the
+    time range of the batch instead of a request per Observation. Observations without Datastream,
+    MultiDatastream or phenomenonTime are not looked up.
+    """
+    if not isinstance(batch_size, int) or batch_size < 1:
+        raise ValueError('batch_size should be a positive int')
+    streams = {}
+    for observation in observations:
+        stream = stream_of(observation)
+        value = time_value.cached(observation, 'phenomenon_time')
+        if stream is not None and value is not None:
+            streams.setdefault(stream, []).append(value)
+    hashes = set()
+    for stream, times in streams.items():
+        parent = staplus_client.utils.transform_json_to_entity({'@iot.id': stream[1]},
+                                                               EntityTypes[stream[0]]['class'])
+        parent.service = service
+        times.sort()
+        for i in range(0, len(times), batch_size):
+            batch = times[i:i + batch_size]
+            query = parent.get_observations().query()
+            query.filter('phenomenonTime ge {} and phenomenonTime le {}'.format(
+                literal(batch[0].key[0]), literal(max(value.key[1] for value in batch))))
+            query.select('id', 'phenomenonTime', 'result', 'parameters')
+            logging.debug('Looking up {} Observations of {}({})'.format(len(batch), *stream))
+            for observation in query.stream():
+                hashes.add(content_hash(observation, stream))
+    return hashes
@@ -14,43 +14,248 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import queue
+import threading
+import time
+import weakref
 import requests
 
+import staplus_client.utils
 from staplus_client.service.staplusservice import STAplusService
 from staplus_client.model.entity import Entity
+from staplus_client.model.ext import dedupe
 from frost_sta_client.model.ext import entity_list
 
+# the service types of an EntityList; AsyncSTAplusService imports this module, so it is added on first use
+_service_types = None
+
+
+def service_types():
+    global _service_types
+    if _service_types is None:
+        from staplus_client.service.async_staplusservice import AsyncSTAplusService
+        _service_types = (STAplusService, AsyncSTAplusService)
+    return _service_types
+
+
+def fetch_response(service, url, headers=None):
+    try:
+        response = service.execute('get', url, headers=headers)
+    except requests.exceptions.HTTPError as e:
+        query_failed(e)
+        raise e
+    logging.debug('Received response: {} from {}'.format(response.status_code, url))
+    return response
+
+
+def query_failed(e):
+    error_message = staplus_client.utils.error_message(e.response)
+    logging.error("Query failed with status-code {}, {}".format(e.response.status_code, error_message))
+
+
+def parse_json(response):
+    try:
+        return staplus_client.utils.response_json(response)
+    except ValueError:
+        raise ValueError('Cannot find json in http response')
+
+
+def fetch_json(service, url):
+    """
+    Fetch one page of an entity collection as parsed JSON
+    """
+    return parse_json(fetch_response(service, url))
+
+
+def fetch_decoded(service, url, decode):
+    """
+    Fetch the url and decode the response with the decode function, which parses its JSON, so the time it reports
+    includes the parsing. If the service has a response cache, the request is conditional and the result decoded
+    before is returned when the service answers 304 Not Modified.
+    """
+    cache = service.response_cache
+    if cache is None:
+        return decode(fetch_response(service, url))
+    entry = cache.get(url)
+    response = fetch_response(service, url, entry[0] if entry is not None else None)
+    not_modified = response.status_code == 304 and entry is not None
+    cache.count(not_modified)
+    if not_modified:
+        return entry[1]
+    value = decode(response)
+    cache.put(url, response, value)
+    return value
+
+
+def decode_page(service, url, entity_class, response):
+    """
+    Decode the response of one page of an entity collection. The entities of the page have the service set. The
+    decode time reported to the hooks includes the parsing of the JSON.
+    """
+    started = time.perf_counter()
+    json_response = parse_json(response)
+    result_list = staplus_client.utils.transform_json_to_entity_list(json_response, entity_class)
+    service.canonical(result_list, json_response)
+    result_list.set_service(service)
+    service.report_decode(url, len(result_list.entities), time.perf_counter() - started)
+    return result_list
+
+
+def fetch_page(service, url, entity_class):
+    """
+    Fetch and decode one page of an entity collection. The entities of the page have the service set.
+    """
+    page = fetch_decoded(service, url, lambda response: decode_page(service, url, entity_class, response))
+    if service.response_cache is None:
+        return page
+    # a cached page can be returned again, so every caller gets a list of its own
+    return EntityList.from_page(page)
+
+
+def _prefetch_pages(service, url, entity_class, pages, stopped):
+    """
+    Worker of the read-ahead: follows the next links and puts the decoded pages (or the error) into the queue
+    until the collection ends or the EntityList is gone.
+    """
+    while url is not None and not stopped.is_set():
+        try:
+            page = fetch_page(service, url, entity_class)
+        except Exception as e:
+            page = e
+        while not stopped.is_set():
+            try:
+                pages.put(page, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        if isinstance(page, Exception):
+            return
+        url = page.next_link
+
+
 class EntityList(entity_list.EntityList):
-    def __init__(self, entity_class, entities=None):
+    def __init__(self, entity_class, entities=None, retain=True, prefetch=0):
+        """
+        params:
+            retain: if False, the list keeps only the page that is currently iterated and drops every page
+                    once it is consumed, so iterating a large collection needs constant memory
+            prefetch: the number of pages that are fetched and decoded on a worker thread ahead of the page
+                      that is currently iterated; 0 fetches the next page only when it is needed
+        """
         super().__init__(entity_class, entities)
+        self.retain = retain
+        self.prefetch = prefetch
+        self._offset = 0
+        self._prefetched_pages = None
+
+    @classmethod
+    def from_page(cls, page):
+        """
+        A new list of this class with the entities, next link, count and service of the page
+        """
+        result_list = cls(page.entity_class, list(page.entities))
+        result_list.next_link = page.next_link
+        result_list.count = page.count
+        result_list.service = page.service
+        return result_list
+
+    def __iter__(self):
+        self.iterable_entities = iter(enumerate(self.entities, start=self._offset))
+        self._start_prefetch()
+        return self
+
+    def _start_prefetch(self):
+        if self.prefetch == 0 or self.next_link is None or self._prefetched_pages is not None:
+            return
+        self._prefetched_pages = queue.Queue(maxsize=self.prefetch)
+        stopped = threading.Event()
+        # the worker must not reference the list, so it stops as soon as the list is garbage collected
+        weakref.finalize(self, stopped.set)
+        threading.Thread(target=_prefetch_pages, daemon=True,
+                         args=(self.service, self.next_link, self.entity_class, self._prefetched_pages,
+                               stopped)).start()
+
+    def _next_page(self):
+        if self.prefetch == 0:
+            return fetch_page(self.service, self.next_link, self.entity_class)
+        self._start_prefetch()
+        page = self._prefetched_pages.get()
+        if isinstance(page, Exception):
+            self._prefetched_pages = None
+            raise page
+        return page
 
     def __next__(self):
-        idx, next_entity = next(self.iterable_entities, (len(self.entities), None))
-        if self.step_size is not None and idx is not None and idx % self.step_size == 0:
-            self.callback(idx)
+        idx, next_entity = self._next_entity()
         if next_entity is not None:
             return next_entity
         if self.next_link is not None:
-            try:
-                response = self.service.execute('get', self.next_link)
-            except requests.exceptions.HTTPError as e:
-                error_json = e.response.json()
-                error_message = error_json['message']
-                logging.error("Query failed with status-code {}, {}".format(e.response.status_code, error_message))
-                raise e
-            logging.debug('Received response: {} from {}'.format(response.status_code, self.next_link))
-            try:
-                json_response = response.json()
-            except ValueError:
-                raise ValueError('Cannot find json in http response')
+            return self._add_page(self._next_page(), idx)
+        raise StopIteration
+
+    def _next_entity(self):
+        """
+        The index and the next entity of the pages that are already loaded, None at their end
+        """
+        idx, next_entity = next(self.iterable_entities, (self._offset + len(self.entities), None))
+        if self.step_size is not None and idx is not None and idx % self.step_size == 0:
+            self.callback(idx)
+        return idx, next_entity
 
-            result_list = staplus_client.utils.transform_json_to_entity_list(json_response, self.entity_class)
+    def _add_page(self, result_list, idx):
+        """
+        Continue the iteration with the entities of the next page, at index idx; returns the first of them
+        """
+        if self.retain:
             self.entities += result_list.entities
-            self.set_service(self.service)
-            self.next_link = json_response.get("@iot.nextLink", None)
-            self.iterable_entities = iter(enumerate(self.entities[-len(result_list.entities):], start=idx))
-            return next(self.iterable_entities)[1]
-        raise StopIteration
+        else:
+            self._offset += len(self.entities)
+            self.entities = result_list.entities
+        self.next_link = result_list.next_link
+        self.iterable_entities = iter(enumerate(result_list.entities, start=idx))
+        return next(self.iterable_entities)[1]
+
+    def dedupe(self, key=None, service=None, batch_size=100):
+        """
+        A new EntityList with the entities of this list, without the duplicates: the entities that have the same
+        key as an entity before them. Only the entities that were already fetched are deduplicated.
+        params:
+            key: a function of an entity that is equal for duplicates, by default the content hash of Observations
+                 (Datastream, phenomenonTime, result and parameters)
+            service: an STAplusService; if given, Observations that it already has are left out as well, they
+                     are looked up with a request per batch_size Observations of a Datastream
+        """
+        if service is not None and not isinstance(service, STAplusService):
+            raise ValueError('service should be of type STAplusService')
+        entities = dedupe.unique(self.entities, key if key is not None else dedupe.content_hash)
+        if service is not None:
+            hashes = dedupe.present(service, entities, batch_size)
+            entities = [entity for entity in entities if dedupe.content_hash(entity) not in hashes]
+        result_list = self.__class__(self.entity_class, entities)
+        result_list.service = self.service
+        return result_list
+
+    @property
+    def retain(self):
+        return self._retain
+
+    @retain.setter
+    def retain(self, value):
+        if isinstance(value, bool):
+            self._retain = value
+            return
+        raise ValueError('retain should be of type bool')
+
+    @property
+    def prefetch(self):
+        return self._prefetch
+
+    @prefetch.setter
+    def prefetch(self, value):
+        if isinstance(value, int) and value >= 0:
+            self._prefetch = value
+            return
+        raise ValueError('prefetch should be a non-negative int')
 
     @property
     def service(self):
@@ -58,7 +263,8 @@ class EntityList(entity_list.EntityList):
 
     @service.setter
     def service(self, value):
-        if value is None or isinstance(value, STAplusService):
+        # lists of related entities that are expanded into an entity of AsyncSTAplusService get that service
+        if value is None or isinstance(value, _service_types or service_types()):
             self._service = value
             return
         raise ValueError('service should be of type STAplusService')
@@ -133,10 +133,17 @@ EntityTypes = {
 }
 
 list_for_class = {}
+entity_type_for_class = {}
 for key, entity_type in EntityTypes.items():
     list_for_class[entity_type["class"]] = entity_type["plural"]
+    entity_type_for_class[entity_type["class"]] = entity_type
 
 
 def get_list_for_class(clazz):
     clazz_name = clazz.__module__ + "." + clazz.__name__
     return list_for_class[clazz_name]
+
+
+def get_entity_type_for_class(clazz):
+    clazz_name = clazz.__module__ + "." + clazz.__name__
+    return entity_type_for_class[clazz_name]
@@ -0,0 +1,107 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+import staplus_client.utils
+from staplus_client.model.ext.entity_list import EntityList
+from staplus_client.model.ext.entity_type import EntityTypes
+from staplus_client.service.staplusservice import STAplusService
+
+# the navigation properties that relate an entity to a list of entities
+PLURALS = {entity_type['plural'] for entity_type in EntityTypes.values()} | {'Subjects', 'Objects'}
+
+_decode_lock = threading.RLock()
+
+
+class LazyEntityList(EntityList):
+    """
+    The EntityList of an expanded relation. It keeps the JSON of the related entities and decodes them when the
+    list is used for the first time, so the expanded relations that are never used are never decoded.
+    """
+    def __init__(self, entity_class, entities=None, retain=True, prefetch=0, json_entities=None):
+        """
+        params:
+            json_entities: the JSON of the entities, decoded when the list is used; only if entities is None
+        """
+        super().__init__(entity_class, entities, retain, prefetch)
+        if json_entities is not None and entities is not None:
+            raise ValueError('either entities or json_entities can be given')
+        self._json = json_entities
+
+    @property
+    def decoded(self):
+        return self._json is None
+
+    @property
+    def entities(self):
+        if self._json is not None:
+            self._decode()
+        return self.__dict__['entities']
+
+    @entities.setter
+    def entities(self, values):
+        self.__dict__['_json'] = None
+        self.__dict__['entities'] = values
+
+    def _decode(self):
+        with _decode_lock:
+            if self._json is None:
+                return
+            json_entities = self._json
+            entities = staplus_client.utils.transform_json_to_entity_list(json_entities, self.entity_class).entities
+            self.__dict__['entities'] = entities
+            self._json = None
+            service = self.service
+            if isinstance(service, STAplusService):
+                service.canonical(self, json_entities)
+            if service:
+                super().set_service(service)
+
+    def set_service(self, service):
+        if self._json is not None:
+            # the entities get the service when they are decoded
+            self.service = service
+            return
+        super().set_service(service)
+
+
+def load(entity, relation, refresh=False):
+    """
+    The entity or EntityList related to an entity by the navigation property relation, e.g. 'Datastreams'. If the
+    relation was not expanded, it is fetched with the DAO of the relation and kept in the entity, so it is only
+    fetched once. The entity needs an STAplusService. The relation can also be given as attribute name, e.g.
+    'datastreams'; a ValueError is raised if it is no navigation property of the entity.
+    params:
+        refresh: fetch the relation again, even if it was expanded or fetched before
+    """
+    name = staplus_client.utils.attribute_name(relation)
+    relations = EntityTypes.get(type(entity).__name__, {}).get('relations_list', [])
+    key = next((key for key in relations if staplus_client.utils.attribute_name(key) == name), None)
+    attributes = entity.__dict__
+    if key is None or '_' + name not in attributes:
+        raise ValueError('{} is no relation of {}'.format(relation, type(entity).__name__))
+    value = attributes['_' + name]
+    if value is not None and not refresh:
+        return value
+    if not isinstance(getattr(entity, 'service', None), STAplusService):
+        raise ValueError('loading {} of {} needs an STAplusService'.format(key, type(entity).__name__))
+    accessor = getattr(entity, 'get_' + name, None)
+    if accessor is None:
+        raise ValueError('{} has no DAO for {}'.format(type(entity).__name__, key))
+    query = accessor().query()
+    value = query.list() if key in PLURALS else query.item()
+    attributes['_' + name] = value
+    return value
@@ -0,0 +1,110 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+
+import staplus_client.utils
+from staplus_client.model.ext.entity_type import EntityTypes
+
+# slot -> JSON property of an Observation
+PROPERTIES = {'id': '@iot.id', 'phenomenon_time': 'phenomenonTime', 'result': 'result', 'result_time': 'resultTime',
+              'result_quality': 'resultQuality', 'valid_time': 'validTime', 'parameters': 'parameters'}
+
+# slot -> navigation property of an Observation
+RELATIONS = {'datastream_id': 'Datastream', 'multi_datastream_id': 'MultiDatastream',
+             'feature_of_interest_id': 'FeatureOfInterest'}
+
+
+class ObservationRecord:
+    """
+    A compact, read-only Observation: the properties are stored in slots instead of an instance dict, and the
+    Datastream, MultiDatastream and FeatureOfInterest as their ids. A record takes about a third of the memory of
+    an Observation, for keeping millions of Observations in memory. __getstate__ returns the same JSON as
+    Observation.__getstate__ for these properties; to_entity() creates the Observation, e.g. to use it with the
+    DAOs.
+    """
+    __slots__ = tuple(PROPERTIES) + tuple(RELATIONS)
+
+    def __init__(self, id=None, phenomenon_time=None, result=None, result_time=None, result_quality=None,
+                 valid_time=None, parameters=None, datastream_id=None, multi_datastream_id=None,
+                 feature_of_interest_id=None):
+        for key, value in zip(self.__slots__, (id, phenomenon_time, result, result_time, result_quality, valid_time,
+                                               parameters, datastream_id, multi_datastream_id,
+                                               feature_of_interest_id)):
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('ObservationRecord is read-only')
+
+    def __delattr__(self, key):
+        raise AttributeError('ObservationRecord is read-only')
+
+    def __getstate__(self):
+        data = {}
+        for key, name in PROPERTIES.items():
+            value = getattr(self, key)
+            if value is not None:
+                data[name] = value
+        for key, name in RELATIONS.items():
+            value = getattr(self, key)
+            if value is not None:
+                data[name] = {'@iot.id': value}
+        return data
+
+    def __setstate__(self, state):
+        for key, name in PROPERTIES.items():
+            object.__setattr__(self, key, state.get(name, None))
+        for key, name in RELATIONS.items():
+            related = state.get(name, None)
+            object.__setattr__(self, key, related.get('@iot.id', None) if isinstance(related, dict) else None)
+
+    def __eq__(self, other):
+        if not isinstance(other, ObservationRecord):
+            return False
+        return all(getattr(self, key) == getattr(other, key) for key in self.__slots__)
+
+    def __repr__(self):
+        return 'ObservationRecord({})'.format(', '.join('{}={!r}'.format(key, getattr(self, key))
+                                                        for key in self.__slots__ if getattr(self, key) is not None))
+
+    def to_entity(self):
+        """
+        The Observation of this record
+        """
+        return staplus_client.utils.transform_json_to_entity(self.__getstate__(),
+                                                             EntityTypes['Observation']['class'])
+
+
+def from_json(rows, parent=None):
+    """
+    Records of Observations in JSON. The times are interned, so Observations with the same time share the string.
+    The Observations without Datastream or MultiDatastream get the one of parent, if it is one of them.
+    """
+    parent_key = None
+    if parent is not None:
+        parent_key = {'Datastream': 'datastream_id', 'MultiDatastream': 'multi_datastream_id'}.get(
+            type(parent).__name__, None)
+    records = []
+    for row in rows:
+        record = object.__new__(ObservationRecord)
+        record.__setstate__(row)
+        for key in ('phenomenon_time', 'result_time', 'valid_time'):
+            value = getattr(record, key)
+            if isinstance(value, str):
+                object.__setattr__(record, key, sys.intern(value))
+        if parent_key is not None and record.datastream_id is None and record.multi_datastream_id is None:
+            object.__setattr__(record, parent_key, parent.id)
+        records.append(record)
+    return records
@@ -0,0 +1,160 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+
+from dateutil.parser import isoparse
+
+# if True, cached() keeps the parsed time values with the entities, so comparing or serializing the same entities
+# again does not parse their times again; it costs a dict per entity, so it is off by default
+keep_parsed = False
+
+
+class TimeValue:
+    """
+    A parsed time instant or interval of an entity. Time values compare and sort by the instants they denote, so
+    '2023-01-01T01:00:00+01:00' equals '2023-01-01T00:00:00Z'; times without a time zone are taken as UTC.
+    An instant sorts before an interval with the same start and end.
+    """
+    __slots__ = ('start', 'end', 'key', '_iso')
+
+    def __init__(self, start, end=None):
+        self.start = start
+        self.end = end
+        self.key = (utc(start), utc(end if end is not None else start), end is not None)
+        self._iso = None
+
+    def isoformat(self):
+        """
+        The time as ISO string, the same as frost_sta_client.utils.parse_datetime returns
+        """
+        if self._iso is None:
+            self._iso = self.start.isoformat() if self.end is None else \
+                self.start.isoformat() + '/' + self.end.isoformat()
+        return self._iso
+
+    def __eq__(self, other):
+        return isinstance(other, TimeValue) and self.key == other.key
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def __le__(self, other):
+        return self.key <= other.key
+
+    def __gt__(self, other):
+        return self.key > other.key
+
+    def __ge__(self, other):
+        return self.key >= other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __str__(self):
+        return self.isoformat()
+
+    def __repr__(self):
+        return 'TimeValue({!r})'.format(self.isoformat())
+
+
+def utc(value):
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+
+def parse_instant(value):
+    # fromisoformat is much faster than isoparse and gives the same datetime for the times it accepts
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return isoparse(value)
+
+
+def parse_time(value):
+    return value if isinstance(value, datetime.datetime) else parse_instant(value)
+
+
+def parse(value):
+    """
+    The TimeValue of an ISO string, an interval 'start/end', a datetime or a list [start, end] of datetimes or ISO
+    strings; None for None
+    """
+    if value is None or isinstance(value, TimeValue):
+        return value
+    if isinstance(value, datetime.datetime):
+        return TimeValue(value)
+    if isinstance(value, (list, tuple)) and len(value) == 2 and all(isinstance(v, (datetime.datetime, str))
+                                                                    for v in value):
+        return TimeValue(parse_time(value[0]), parse_time(value[1]))
+    if isinstance(value, str):
+        times = value.split('/')
+        if len(times) == 1:
+            return TimeValue(parse_instant(times[0]))
+        if len(times) == 2:
+            return TimeValue(parse_instant(times[0]), parse_instant(times[1]))
+    raise ValueError('The time should be in isoformat, or an interval of two times in isoformat')
+
+
+def cached(entity, name):
+    """
+    The TimeValue of the time property name of an entity, e.g. 'phenomenon_time'. If keep_parsed is set, the parsed
+    value is kept with the entity together with the value it was parsed from, so it is only parsed again after the
+    property was set. Use it to compare or sort entities by time, e.g.
+    sorted(observations, key=lambda o: cached(o, 'phenomenon_time')).
+    """
+    attributes = entity.__dict__
+    value = attributes.get('_' + name, None)
+    if value is None:
+        return None
+    if not keep_parsed:
+        return parse(value)
+    times = attributes.get('_times', None)
+    if times is None:
+        times = attributes['_times'] = {}
+    known = times.get(name, None)
+    if known is not None and known[0] is value:
+        return known[1]
+    if isinstance(value, list):
+        # a list can be changed in place, so it is compared by its items
+        items = tuple(value)
+        if known is not None and known[0] == items:
+            return known[1]
+        parsed = parse(value)
+        times[name] = (items, parsed)
+        return parsed
+    parsed = parse(value)
+    times[name] = (value, parsed)
+    return parsed
+
+
+def equal(entity, other, name):
+    """
+    True if the time property name of two entities denotes the same time, e.g. in different time zones
+    """
+    value = entity.__dict__.get('_' + name, None)
+    other_value = other.__dict__.get('_' + name, None)
+    if value is other_value or (type(value) is str and value == other_value):
+        return True
+    return cached(entity, name) == cached(other, name)
+
+
+def isoformat(entity, name):
+    """
+    The time property name of an entity as ISO string, as frost_sta_client.utils.parse_datetime returns it
+    """
+    parsed = cached(entity, name)
+    return parsed.isoformat() if parsed is not None else None
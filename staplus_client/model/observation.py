@@ -13,11 +13,9 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from datetime import datetime
-
 from frost_sta_client.model import observation
 from staplus_client import utils
-from staplus_client.model.ext import entity_list, entity_type
+from staplus_client.model.ext import dedupe, entity_list, entity_type, time_value
 from staplus_client.dao.observation import ObservationDao, SubjectDao, ObjectDao
 from staplus_client.model import observation_group, relation
 
@@ -146,6 +144,13 @@ class Observation(observation.Observation):
 
     def __getstate__(self):
         data = super().__getstate__()
+        # an interval given as list [start, end] is written as 'start/end'
+        if self.phenomenon_time is not None:
+            data['phenomenonTime'] = time_value.isoformat(self, 'phenomenon_time')
+        if self.result_time is not None:
+            data['resultTime'] = time_value.isoformat(self, 'result_time')
+        if self.valid_time is not None:
+            data['validTime'] = time_value.isoformat(self, 'valid_time')
         if self._observation_groups is not None and len(self.observation_groups.entities) > 0:
             data['ObservationGroups'] = self.observation_groups.__getstate__()
         if self._subjects is not None and len(self.subjects.entities) > 0:
@@ -181,11 +186,11 @@ class Observation(observation.Observation):
             return True
         if self.result != other.result:
             return False
-        if datetime.fromisoformat(self.phenomenon_time) != datetime.fromisoformat(other.phenomenon_time):
+        if not time_value.equal(self, other, 'phenomenon_time'):
             return False
-        if self.result_time is not None and other.result_time is not None and datetime.fromisoformat(self.result_time) != datetime.fromisoformat(other.result_time):
+        if self.result_time is not None and other.result_time is not None and not time_value.equal(self, other, 'result_time'):
             return False
-        if self.valid_time is not None and other.valid_time is not None and datetime.fromisoformat(self.valid_time) != datetime.fromisoformat(other.valid_time):
+        if self.valid_time is not None and other.valid_time is not None and not time_value.equal(self, other, 'valid_time'):
             return False
         if self.parameters != other.parameters:
             return False
@@ -193,6 +198,13 @@ class Observation(observation.Observation):
             return False
         return True
 
+    def content_hash(self):
+        """
+        A stable hash of the Datastream (or MultiDatastream), phenomenonTime, result and parameters, equal for
+        Observations with the same content
+        """
+        return dedupe.content_hash(self)
+
     def get_dao(self, service):
         return ObservationDao(service)
 
@@ -13,11 +13,10 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from datetime import datetime
 from staplus_client import utils
 from frost_sta_client.utils import check_datetime
 from staplus_client.model import entity
-from staplus_client.model.ext import entity_list, entity_type
+from staplus_client.model.ext import entity_list, entity_type, time_value
 from staplus_client.dao.observation_group import ObservationGroupDao
 from staplus_client.model import license, party, campaign, relation, observation
 
@@ -309,9 +308,9 @@ class ObservationGroup(entity.Entity):
             return False
         if self.privacy_policy != other.privacy_policy:
             return False
-        if self.creation_time is not None and other.creation_time is not None and datetime.fromisoformat(self.creation_time) != datetime.fromisoformat(other.creation_time):
+        if self.creation_time is not None and other.creation_time is not None and not time_value.equal(self, other, 'creation_time'):
             return False
-        if self.end_time is not None and other.end_time is not None and datetime.fromisoformat(self.end_time) != datetime.fromisoformat(other.end_time):
+        if self.end_time is not None and other.end_time is not None and not time_value.equal(self, other, 'end_time'):
             return False
         if self.properties != other.properties:
             return False
@@ -336,9 +335,9 @@ class ObservationGroup(entity.Entity):
         if self.privacy_policy is not None and self.privacy_policy != '':
             data['privacyPolicy'] = self.privacy_policy
         if self.creation_time is not None:
-            data['creationTime'] = datetime.fromisoformat(self.creation_time)
+            data['creationTime'] = time_value.isoformat(self, 'creation_time')
         if self.end_time is not None:
-            data['endTime'] = datetime.fromisoformat(self.end_time)
+            data['endTime'] = time_value.isoformat(self, 'end_time')
         if self.properties is not None and self.properties != {}:
             data['properties'] = self.properties
         if self.data_quality is not None and self.data_quality != {}:
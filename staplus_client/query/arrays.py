@@ -0,0 +1,122 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime, timezone
+
+import numpy as np
+
+from staplus_client.utils import is_data_array, data_array_keys
+
+# column name -> JSON property of an Observation
+OBSERVATION_COLUMNS = {
+    'id': '@iot.id',
+    'phenomenon_time': 'phenomenonTime',
+    'result': 'result',
+    'result_time': 'resultTime',
+    'result_quality': 'resultQuality',
+    'valid_time': 'validTime',
+    'parameters': 'parameters'
+}
+
+# time columns that can hold an interval; the end of the interval goes into the column <name>_end
+INTERVAL_COLUMNS = ['phenomenon_time', 'valid_time']
+
+
+class ObservationColumns:
+    """
+    Collects the Observations of one or more pages as plain column lists, without creating entities
+    """
+    def __init__(self):
+        self.values = {column: [] for column in OBSERVATION_COLUMNS}
+
+    def add_rows(self, rows):
+        """
+        Add Observations as they are found in the 'value' of a JSON page, in the default or dataArray format
+        """
+        if is_data_array(rows):
+            for group in rows:
+                self.add_data_array(group['components'], group['dataArray'])
+            return
+        for column, key in OBSERVATION_COLUMNS.items():
+            self.values[column].extend([row.get(key, None) for row in rows])
+
+    def add_data_array(self, components, data_array):
+        index = {key: i for i, key in enumerate(data_array_keys(components))}
+        for column, key in OBSERVATION_COLUMNS.items():
+            i = index.get(key, None)
+            if i is None:
+                self.values[column].extend([None] * len(data_array))
+            else:
+                self.values[column].extend([values[i] for values in data_array])
+
+    def __len__(self):
+        return len(self.values['id'])
+
+    def to_arrays(self):
+        """
+        Returns a dict of column name -> numpy array. Times are datetime64[us] in UTC (NaT if missing), results
+        are int64 or float64 (NaN if missing) if all of them are numbers, otherwise object arrays.
+        """
+        arrays = {}
+        for column, values in self.values.items():
+            if column in INTERVAL_COLUMNS:
+                arrays[column], arrays[column + '_end'] = interval_arrays(values)
+            elif column == 'result_time':
+                arrays[column] = datetime_array(values)
+            else:
+                arrays[column] = value_array(values)
+        return arrays
+
+
+def utc_string(value):
+    """
+    Convert an ISO datetime string to a UTC string without offset, as numpy only parses naive datetimes
+    """
+    if value is None:
+        return None
+    if value[-1] == 'Z':
+        return value[:-1]
+    time = datetime.fromisoformat(value)
+    if time.tzinfo is not None:
+        time = time.astimezone(timezone.utc).replace(tzinfo=None)
+    return time.isoformat()
+
+
+def datetime_array(values):
+    return np.array([utc_string(v) for v in values], dtype='datetime64[us]')
+
+
+def interval_arrays(values):
+    starts = []
+    ends = []
+    for value in values:
+        if value is not None and '/' in value:
+            start, end = value.split('/')
+            starts.append(start)
+            ends.append(end)
+        else:
+            starts.append(value)
+            ends.append(None)
+    return datetime_array(starts), datetime_array(ends)
+
+
+def value_array(values):
+    if all(type(v) == int for v in values):
+        return np.array(values, dtype=np.int64)
+    if all(v is None or type(v) in (int, float) for v in values) and any(v is not None for v in values):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
@@ -0,0 +1,124 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import staplus_client.service.async_staplusservice
+from staplus_client.model.ext import async_entity_list
+from staplus_client.query.query import Query
+
+
+class AsyncQuery(Query):
+    """
+    The query of AsyncSTAplusService: the query options are set like for Query, the methods that send
+    the request are coroutines. They share everything but the requests with the methods of Query.
+    """
+    @property
+    def service(self):
+        return self._service
+
+    @service.setter
+    def service(self, service):
+        if service is None:
+            self._service = service
+            return
+        if not isinstance(service, staplus_client.service.async_staplusservice.AsyncSTAplusService):
+            raise ValueError('service should be of type AsyncSTAplusService')
+        self._service = service
+
+    async def list(self, callback=None, step_size=None):
+        """
+        Get an entity collection as AsyncEntityList, which fetches the following pages in 'async for'
+        """
+        entity_list = await async_entity_list.fetch_page(self.service, self._collection_url(), self.entity_class)
+        entity_list.callback = callback
+        entity_list.step_size = step_size
+        return entity_list
+
+    async def stream(self, callback=None, step_size=None):
+        """
+        Like list(), but the returned AsyncEntityList does not keep the pages it has already iterated
+        """
+        entity_list = await self.list(callback, step_size)
+        entity_list.retain = False
+        return entity_list
+
+    async def fetch_all(self, parallelism=4):
+        """
+        Get the complete entity collection with up to parallelism concurrent requests, see Query.fetch_all
+        """
+        url = self._fetch_all_url(parallelism)
+        entity_list = await async_entity_list.fetch_page(self.service, url, self.entity_class)
+        windows = self._windows(entity_list)
+        if windows is None:
+            return entity_list
+        start, end, page_size = windows
+        slots = asyncio.Semaphore(parallelism)
+
+        async def fetch_window(skip):
+            window_url = self._window_url(url, skip, page_size)
+            async with slots:
+                page = await async_entity_list.fetch_page(self.service, window_url, self.entity_class)
+                entities = page.entities
+                # the server may return less than $top, the remainder of the window is behind the next link
+                while len(entities) < page_size and skip + len(entities) < end and page.next_link is not None:
+                    page = await async_entity_list.fetch_page(self.service, page.next_link, self.entity_class)
+                    entities += page.entities
+            return entities[:min(page_size, end - skip)]
+
+        for entities in await asyncio.gather(*[fetch_window(skip) for skip in range(start, end, page_size)]):
+            entity_list.entities += entities
+        entity_list.next_link = None
+        return entity_list
+
+    async def to_arrays(self):
+        """
+        Get an Observation collection as columns of numpy arrays, see Query.to_arrays
+        """
+        self._require_observations('to_arrays is only supported for Observations')
+        # numpy is only needed for this query mode
+        from staplus_client.query.arrays import ObservationColumns
+        url = self._collection_url()
+        columns = ObservationColumns()
+        while url is not None:
+            json_response = await async_entity_list.fetch_json(self.service, url)
+            columns.add_rows(json_response['value'])
+            url = json_response.get('@iot.nextLink', None)
+        return columns.to_arrays()
+
+    async def records(self):
+        """
+        Get an Observation collection as a list of ObservationRecords, see Query.records
+        """
+        self._require_observations('records are only supported for Observations')
+        url = self._collection_url()
+        records = []
+        while url is not None:
+            json_response = await async_entity_list.fetch_json(self.service, url)
+            records += self._page_records(json_response)
+            url = json_response.get('@iot.nextLink', None)
+        return records
+
+    async def item(self, callback=None, step_size=None):
+        """
+        Get an entity
+        """
+        url = self.service.get_full_path(self.parent, self.entity)
+        url.args = self.params
+        entity = self._cached_item(url)
+        if entity is not None:
+            return entity
+        entity = self._decode_item(url, await async_entity_list.fetch_response(self.service, url))
+        return self._cache_item(url, entity)
@@ -15,13 +15,15 @@
 
 
 
+import time
+
 import staplus_client.utils
 import staplus_client.model.ext.entity_list
+from staplus_client.model.ext.entity_type import EntityTypes
+from staplus_client.model.ext import observation_record
 from frost_sta_client.query import query
 
-import logging
-import requests
-from requests.exceptions import JSONDecodeError
+from concurrent.futures import ThreadPoolExecutor
 
 
 class Query(query.Query):
@@ -41,13 +43,26 @@ class Query(query.Query):
             raise ValueError('service should be of type STAplusService')
         self._service = service
 
+    def result_format(self, value):
+        """
+        Request the result in another format, e.g. 'dataArray' for Observations. dataArray responses are decoded
+        into entities by list() and into columns by to_arrays().
+        """
+        self.remove_all_params('$resultFormat')
+        self.params['$resultFormat'] = value
+        return self
+
     # exception: similar functions in basedao
-    def list(self, callback=None, step_size=None):
+    def list(self, callback=None, step_size=None, prefetch=0, offline=False):
         """
         Get an entity collection as a dictionary
         callbacks so far only work in combination with step_size. If step_size is set, then the callback function
         is called at every iteration of the step_size
+        If prefetch is set, that many of the following pages are fetched on a worker thread during iteration
+        If offline is True, the collection is read from the store of the service instead (see EntityStore)
         """
+        if offline:
+            return self.offline_list()
         url = self.service.get_full_path(self.parent, self.entitytype_plural)
         #slash = "" if str(furl.path).endswith('/') else "/"
         #if self.parent is None:
@@ -57,25 +72,103 @@ class Query(query.Query):
 
         #url = furl(url)
         url.args = self.params
-        try:
-            response = self.service.execute('get', url)
-        except requests.exceptions.HTTPError as e:
-            error_json = e.response.json()
-            error_message = error_json['message']
-            logging.error("Query failed with status-code {}, {}".format(e.response.status_code, error_message))
-            raise e
-        logging.debug('Received response: {} from {}'.format(response.status_code, url))
-        try:
-            json_response = response.json()
-        except JSONDecodeError:
-            raise ValueError('Cannot find json in http response')
-        entity_list = staplus_client.utils.transform_json_to_entity_list(json_response, self.entity_class)
-        entity_list.set_service(self.service)
+        entity_list = staplus_client.model.ext.entity_list.fetch_page(self.service, url, self.entity_class)
 
         entity_list.callback = callback
         entity_list.step_size = step_size
+        entity_list.prefetch = prefetch
 
         return entity_list
+
+    def offline_list(self):
+        """
+        Get an entity collection from the store of the service, without requests
+        """
+        if self.service.store is None:
+            raise ValueError('offline queries need a service with a store')
+        entity_type = self.entity_class.rsplit('.', 1)[-1]
+        values, count = self.service.store.select(entity_type, self.params, self.parent)
+        entity_list = staplus_client.utils.transform_json_to_entity_list(values, self.entity_class)
+        entity_list.count = count
+        entity_list = self.service.canonical(entity_list, values)
+        entity_list.set_service(self.service)
+        return entity_list
+
+    def stream(self, callback=None, step_size=None, prefetch=0):
+        """
+        Get an entity collection like list(), but the returned EntityList does not keep the pages it has
+        already iterated. Memory stays bounded by the page size, however large the collection is. The list
+        can be iterated only once.
+        """
+        entity_list = self.list(callback, step_size, prefetch)
+        entity_list.retain = False
+        return entity_list
+
+    def fetch_all(self, parallelism=4):
+        """
+        Get the complete entity collection, downloading it with parallel requests instead of following the
+        next links one by one. The first request returns the total (@iot.count) and the page size of the
+        server. The rest of the collection is split into $skip/$top windows that are fetched concurrently.
+        The windows only fit together if the ordering is stable, so the ordering is made unique by adding
+        'id asc' if the $orderby does not already contain the id. A $top of the query limits the collection.
+        Returns an EntityList with all entities in order.
+        """
+        url = self._fetch_all_url(parallelism)
+        entity_list = staplus_client.model.ext.entity_list.fetch_page(self.service, url, self.entity_class)
+        windows = self._windows(entity_list)
+        if windows is None:
+            return entity_list
+        start, end, page_size = windows
+
+        def fetch_window(skip):
+            window_url = self._window_url(url, skip, page_size)
+            page = staplus_client.model.ext.entity_list.fetch_page(self.service, window_url, self.entity_class)
+            entities = page.entities
+            # the server may return less than $top, the remainder of the window is behind the next link
+            while len(entities) < page_size and skip + len(entities) < end and page.next_link is not None:
+                page = staplus_client.model.ext.entity_list.fetch_page(self.service, page.next_link,
+                                                                       self.entity_class)
+                entities += page.entities
+            return entities[:min(page_size, end - skip)]
+
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            for entities in executor.map(fetch_window, range(start, end, page_size)):
+                entity_list.entities += entities
+        entity_list.next_link = None
+        return entity_list
+
+    def to_arrays(self):
+        """
+        Get an Observation collection as columns of numpy arrays instead of entities. All pages are fetched
+        and decoded directly into the columns id, phenomenon_time, phenomenon_time_end, result, result_time,
+        result_quality, valid_time, valid_time_end and parameters, without creating an Observation per row.
+        See staplus_client.query.arrays for the column types.
+        """
+        self._require_observations('to_arrays is only supported for Observations')
+        # numpy is only needed for this query mode
+        from staplus_client.query.arrays import ObservationColumns
+        url = self._collection_url()
+        columns = ObservationColumns()
+        while url is not None:
+            json_response = staplus_client.model.ext.entity_list.fetch_json(self.service, url)
+            columns.add_rows(json_response['value'])
+            url = json_response.get('@iot.nextLink', None)
+        return columns.to_arrays()
+
+    def records(self):
+        """
+        Get an Observation collection as a list of read-only ObservationRecords, which need much less memory than
+        Observation entities. All pages are fetched. Supports the dataArray result format.
+        """
+        self._require_observations('records are only supported for Observations')
+        url = self._collection_url()
+        records = []
+        while url is not None:
+            json_response = staplus_client.model.ext.entity_list.fetch_json(self.service, url)
+            records += self._page_records(json_response)
+            url = json_response.get('@iot.nextLink', None)
+        return records
+
     def item(self, callback=None, step_size=None):
         """
         Get an entity as a dictionary
@@ -91,19 +184,99 @@ class Query(query.Query):
 
         #url = furl(url)
         url.args = self.params
-        try:
-            response = self.service.execute('get', url)
-        except requests.exceptions.HTTPError as e:
-            error_json = e.response.json()
-            error_message = error_json['message']
-            logging.error("Query failed with status-code {}, {}".format(e.response.status_code, error_message))
-            raise e
-        logging.debug('Received response: {} from {}'.format(response.status_code, url))
-        try:
-            json_response = response.json()
-        except JSONDecodeError:
-            raise ValueError('Cannot find json in http response')
-        entity = staplus_client.utils.transform_json_to_entity(json_response, self.entity_class)
-        entity.set_service(self.service)
+        entity = self._cached_item(url)
+        if entity is not None:
+            return entity
+        entity = staplus_client.model.ext.entity_list.fetch_decoded(
+            self.service, url, lambda response: self._decode_item(url, response))
+        return self._cache_item(url, entity)
+
+    def _collection_url(self):
+        url = self.service.get_full_path(self.parent, self.entitytype_plural)
+        url.args = self.params
+        return url
+
+    def _require_observations(self, message):
+        if self.entity_class != EntityTypes['Observation']['class']:
+            raise ValueError(message)
+
+    def _page_records(self, json_response):
+        """
+        The ObservationRecords of one page of an Observation collection
+        """
+        rows = json_response['value']
+        if staplus_client.utils.is_data_array(rows):
+            rows = staplus_client.utils.transform_data_array_to_json(rows)
+        return observation_record.from_json(rows, self.parent)
+
+    def _fetch_all_url(self, parallelism):
+        """
+        The url of the first page of fetch_all(), with the total count and a stable ordering
+        """
+        if not isinstance(parallelism, int) or parallelism < 1:
+            raise ValueError('parallelism should be a positive int')
+        url = self._collection_url()
+        url.args['$count'] = 'true'
+        url.args['$orderby'] = stable_orderby(self.params.get('$orderby', None))
+        return url
 
+    def _windows(self, entity_list):
+        """
+        The start and end of the rest of the collection after the first page of fetch_all() and the page size of
+        the server, None if the first page is the complete collection
+        """
+        page_size = len(entity_list.entities)
+        if entity_list.next_link is None or entity_list.count is None or page_size == 0:
+            return None
+        return int(self.params.get('$skip', 0)) + page_size, collection_end(self.params, entity_list.count), page_size
+
+    @staticmethod
+    def _window_url(url, skip, page_size):
+        window_url = url.copy()
+        del window_url.args['$count']
+        window_url.args['$skip'] = skip
+        window_url.args['$top'] = page_size
+        return window_url
+
+    def _cached_item(self, url):
+        if self.service.cache is None:
+            return None
+        return self.service.cache.get(self.entity_class.rsplit('.', 1)[-1], url.url)
+
+    def _cache_item(self, url, entity):
+        if self.service.cache is not None:
+            self.service.cache.put(self.entity_class.rsplit('.', 1)[-1], url.url, entity)
+        return entity
+
+    def _decode_item(self, url, response):
+        # the decode time includes the parsing of the JSON
+        started = time.perf_counter()
+        json_response = staplus_client.model.ext.entity_list.parse_json(response)
+        entity = staplus_client.utils.transform_json_to_trusted_entity(json_response, self.entity_class)
+        entity = self.service.canonical(entity, json_response)
+        entity.set_service(self.service)
+        self.service.report_decode(url, 1, time.perf_counter() - started)
         return entity
+
+
+def collection_end(params, total):
+    """
+    The position after the last entity of a collection with total entities that a query with the params gets:
+    $skip + $top if the query has a $top, but at most total
+    """
+    if params.get('$top', None) is None:
+        return total
+    return min(total, int(params.get('$skip', 0)) + int(params['$top']))
+
+
+def stable_orderby(orderby):
+    """
+    Append the id to an $orderby expression, so that entities with equal sort values keep their order
+    """
+    # empty criteria, e.g. of a trailing comma, are left out
+    criteria = [criterion.strip() for criterion in (orderby or '').split(',') if criterion.strip() != '']
+    if len(criteria) == 0:
+        return 'id asc'
+    if not any(criterion.split()[0] in ('id', '@iot.id') for criterion in criteria):
+        criteria.append('id asc')
+    return ','.join(criteria)
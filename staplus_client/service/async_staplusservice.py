@@ -0,0 +1,295 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import contextlib
+import logging
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from frost_sta_client.service import sensorthingsservice
+from staplus_client.service.staplusservice import ServiceMixin
+from staplus_client.service import instrumentation
+
+import staplus_client.dao.async_base
+import staplus_client.model.ext.entity_type as staplus_entity_type
+from staplus_client.model.ext.entity_type import EntityTypes
+
+
+class AsyncSTAplusService(ServiceMixin, sensorthingsservice.SensorThingsService):
+    def __init__(self, url, auth_handler=None, proxies=None, pool_maxsize=10, keep_alive=True,
+                 connect_timeout=None, read_timeout=None, identity_map=None, cache=None, retry=None, limiter=None,
+                 hooks=None):
+        """
+        The asyncio counterpart of STAplusService, based on aiohttp. create, update, patch and delete, the
+        DAO methods and the terminal query methods are coroutines; the URLs, models and JSON transforms are
+        the same as for STAplusService. The aiohttp session is opened on first use and should be closed
+        with close() or by using the service as async context manager.
+        Not supported are the response cache and the store of STAplusService (conditional requests, offline
+        queries, mirror() and sync()), batch(), deep inserts and the prefetch of EntityList.
+        params:
+            pool_maxsize: the maximum number of connections kept open
+            keep_alive: if False, every connection is closed after the response
+            connect_timeout: seconds to wait for the connection to the server (None waits forever)
+            read_timeout: seconds to wait for the server to send a response (None waits forever)
+            identity_map: an IdentityMap; if set, every entity that is read gets replaced by the instance that is
+                          already known for its type and id
+            cache: an EntityCache; if set, find() and AsyncQuery.item() return cached entities until they expire
+            retry: a RetryPolicy; if set, requests that failed with e.g. 503 or 429 are sent again after a backoff
+            limiter: a RateLimiter; if set, the requests of all tasks wait to stay within its limits
+            hooks: a list of Hooks, e.g. a HistogramCollector, that are called before and after every request and
+                   after a response was decoded into entities
+        """
+        if aiohttp is None:
+            raise ImportError('AsyncSTAplusService requires aiohttp, please install it')
+        super().__init__(url, auth_handler, proxies)
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.identity_map = identity_map
+        self.cache = cache
+        self.retry = retry
+        self.limiter = limiter
+        self.hooks = hooks if hooks is not None else []
+        self._session = None
+
+    @property
+    def session(self):
+        """
+        The aiohttp session of the service; it has to be used from one event loop only
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_maxsize, force_close=not self.keep_alive)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def auth_headers(self):
+        """
+        The headers the auth handler adds to a request, e.g. Authorization
+        """
+        request = requests.PreparedRequest()
+        request.headers = CaseInsensitiveDict()
+        self.auth_handler.add_auth_header()(request)
+        return dict(request.headers)
+
+    async def execute(self, method, url, **kwargs):
+        """
+        Send a request and read the complete response. Returns a requests.Response, so responses and
+        HTTPErrors can be handled the same way as with STAplusService.
+        """
+        url = str(url)
+        if self.proxies is not None:
+            kwargs.setdefault('proxy', self.proxies.get(url.split(':', 1)[0], None))
+        if self.auth_handler is not None:
+            kwargs['headers'] = {**kwargs.get('headers', {}), **self.auth_headers()}
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                response = await self._send(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                delay = self.retry.delay(method, attempt, start) if self.retry is not None else None
+                if delay is None:
+                    raise e
+                logging.warning('{} {} failed with {!r}, retrying in {:.1f}s'.format(method, url, e, delay))
+            else:
+                if response.status_code < 400:
+                    self.written_request(method, url)
+                    return response
+                delay = self.retry.delay(method, attempt, start, response.status_code, response.headers) \
+                    if self.retry is not None else None
+                if delay is None:
+                    response.raise_for_status()
+                logging.warning('{} {} failed with status-code {}, retrying in {:.1f}s'.format(
+                    method, url, response.status_code, delay))
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _send(self, method, url, **kwargs):
+        """
+        Send one attempt of a request within the limits of the limiter, and report it to the hooks
+        """
+        async with self.limiter if self.limiter is not None else contextlib.nullcontext():
+            if len(self.hooks) == 0:
+                return await self._request(method, url, **kwargs)
+            template = instrumentation.url_template(self.url, url)
+            for hook in self.hooks:
+                hook.before_request(method, template)
+            status, size = None, 0
+            started = time.perf_counter()
+            try:
+                response = await self._request(method, url, **kwargs)
+                status, size = response.status_code, len(response.content)
+                return response
+            finally:
+                seconds = time.perf_counter() - started
+                for hook in self.hooks:
+                    hook.after_response(method, template, status, size, seconds)
+
+    async def _request(self, method, url, **kwargs):
+        async with self.session.request(method, url, **kwargs) as async_response:
+            response = requests.Response()
+            response.status_code = async_response.status
+            response.reason = async_response.reason
+            response.headers = CaseInsensitiveDict(async_response.headers)
+            response.url = url
+            response._content = await async_response.read()
+        return response
+
+    def dao(self, entity):
+        """
+        The DAO for the type of an entity
+        """
+        return staplus_client.dao.async_base.AsyncBaseDao(
+            self, staplus_entity_type.get_entity_type_for_class(type(entity)))
+
+    async def create(self, entity, deep=False):
+        if deep:
+            raise ValueError('deep inserts are not supported by AsyncSTAplusService')
+        return await self.dao(entity).create(entity)
+
+    async def update(self, entity):
+        await self.dao(entity).update(entity)
+
+    async def patch(self, entity, patches):
+        await self.dao(entity).patch(entity, patches)
+
+    async def delete(self, entity):
+        await self.dao(entity).delete(entity)
+
+    def get_path(self, parent, relation):
+        if parent is None:
+            return relation
+        this_entity_type = staplus_entity_type.get_list_for_class(type(parent))
+        if type(parent.id) == str:
+            return "{entity_type}('{id}')/{relation}".format(entity_type=this_entity_type, id=parent.id, relation=relation)
+        else:
+            return "{entity_type}({id})/{relation}".format(entity_type=this_entity_type, id=parent.id, relation=relation)
+
+    def _dao(self, entitytype):
+        return staplus_client.dao.async_base.AsyncBaseDao(self, entitytype)
+
+    def party(self):
+        return self._dao(EntityTypes['Party'])
+
+    def parties(self):
+        return self._dao(EntityTypes['Party'])
+
+    def license(self):
+        return self._dao(EntityTypes['License'])
+
+    def licenses(self):
+        return self._dao(EntityTypes['License'])
+
+    def thing(self):
+        return self._dao(EntityTypes['Thing'])
+
+    def things(self):
+        return self._dao(EntityTypes['Thing'])
+
+    def sensor(self):
+        return self._dao(EntityTypes['Sensor'])
+
+    def sensors(self):
+        return self._dao(EntityTypes['Sensor'])
+
+    def datastream(self):
+        return self._dao(EntityTypes['Datastream'])
+
+    def datastreams(self):
+        return self._dao(EntityTypes['Datastream'])
+
+    def multi_datastream(self):
+        return self._dao(EntityTypes['MultiDatastream'])
+
+    def multi_datastreams(self):
+        return self._dao(EntityTypes['MultiDatastream'])
+
+    def observed_property(self):
+        return self._dao(EntityTypes['ObservedProperty'])
+
+    def observed_properties(self):
+        return self._dao(EntityTypes['ObservedProperty'])
+
+    def features_of_interest(self):
+        return self._dao(EntityTypes['FeatureOfInterest'])
+
+    def historical_locations(self):
+        return self._dao(EntityTypes['HistoricalLocation'])
+
+    def locations(self):
+        return self._dao(EntityTypes['Location'])
+
+    def observations(self):
+        return self._dao(EntityTypes['Observation'])
+
+    def campaigns(self):
+        return self._dao(EntityTypes['Campaign'])
+
+    def relations(self):
+        return self._dao(EntityTypes['Relation'])
+
+    def subjects(self):
+        return self._dao({
+            'singular': '-',
+            'plural': 'Subjects',
+            'class': 'staplus_client.model.relation.Relation',
+            'relations_list': ['Object']
+        })
+
+    def subject(self):
+        return self._dao({
+            'singular': 'Subject',
+            'plural': 'Relations',
+            'class': 'staplus_client.model.observation.Observation',
+            'relations_list': ['Objects']
+        })
+
+    def objects(self):
+        return self._dao({
+            'singular': '-',
+            'plural': 'Objects',
+            'class': 'staplus_client.model.relation.Relation',
+            'relations_list': ['Subject']
+        })
+
+    def object(self):
+        return self._dao({
+            'singular': 'Object',
+            'plural': 'Relations',
+            'class': 'staplus_client.model.observation.Observation',
+            'relations_list': ['Subjects']
+        })
+
+    def observation_groups(self):
+        return self._dao(EntityTypes['ObservationGroup'])
@@ -0,0 +1,206 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from contextlib import contextmanager
+
+import jsonpatch
+import requests
+
+import staplus_client.utils
+from frost_sta_client.utils import extract_value
+
+
+class BatchError(Exception):
+    """
+    Raised when requests of a batch failed. errors is a list of (entity, status, message) tuples.
+    """
+    def __init__(self, errors):
+        super().__init__('{} request(s) of the batch failed: {}'.format(
+            len(errors), '; '.join('{} {}'.format(status, message) for _, status, message in errors)))
+        self.errors = errors
+
+
+class Batch:
+    """
+    Records create, update, patch and delete operations and sends them as one OData JSON batch request
+    ($batch). Entities created in the batch get the content-id of their request ('$1', '$2', ...) as
+    temporary id, so they can be referenced by the following requests of the batch. When the batch is
+    sent, the ids and self links of the created entities are set from the responses.
+    Use it via STAplusService.batch():
+
+        with service.batch() as batch:
+            with batch.change_set():
+                service.create(party)
+                service.create(thing)
+    """
+    APPLICATION_JSON_PATCH = {'Content-type': 'application/json-patch+json'}
+
+    def __init__(self, service):
+        self.service = service
+        self.requests = []
+        self._atomicity_group = None
+        self._change_sets = 0
+
+    def __enter__(self):
+        if self.service.current_batch is not None:
+            raise ValueError('batches can not be nested')
+        self.service.current_batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.service.current_batch = None
+        if exc_type is None:
+            self.send()
+        else:
+            self._reset_pending_ids()
+
+    @contextmanager
+    def change_set(self):
+        """
+        The requests recorded in this context are executed atomically: either all of them succeed or none
+        """
+        if self._atomicity_group is not None:
+            raise ValueError('change sets can not be nested')
+        self._change_sets += 1
+        self._atomicity_group = 'changeset{}'.format(self._change_sets)
+        try:
+            yield self
+        finally:
+            self._atomicity_group = None
+
+    def _add(self, method, url, entity, body=None, headers=None, depends_on=None):
+        request = {'id': str(len(self.requests) + 1), 'method': method, 'url': url}
+        if self._atomicity_group is not None:
+            request['atomicityGroup'] = self._atomicity_group
+        if depends_on:
+            # the requests creating the referenced entities must be executed before this one
+            request['dependsOn'] = sorted((content_id[1:] for content_id in depends_on), key=int)
+        if headers is not None:
+            request['headers'] = headers
+        if body is not None:
+            request['body'] = body
+        self.requests.append((request, entity))
+        return request
+
+    def _pending_ids(self):
+        return {'$' + request['id'] for request, _ in self.requests if request['method'] == 'post'}
+
+    def _body(self, entity, used):
+        """
+        The JSON of the entity with all its properties; related entities created earlier in the batch are
+        referenced by their content-id, which is added to used
+        """
+        data = staplus_client.utils.transform_entity_to_json_dict(entity)
+        pending_ids = self._pending_ids()
+        if data.get('@iot.id', None) in pending_ids:
+            # the entity itself is addressed by the url of the request
+            used.add(data.pop('@iot.id'))
+        return {key: self._reference_pending(value, pending_ids, used) for key, value in data.items()}
+
+    def _reference_pending(self, data, pending_ids, used):
+        # an entity created earlier in the batch is only referenced by its content-id, not inlined again
+        if isinstance(data, dict):
+            if data.get('@iot.id', None) in pending_ids:
+                used.add(data['@iot.id'])
+                return {'@iot.id': data['@iot.id']}
+            return {key: self._reference_pending(value, pending_ids, used) for key, value in data.items()}
+        if isinstance(data, list):
+            return [self._reference_pending(value, pending_ids, used) for value in data]
+        return data
+
+    def _entity_url(self, entity, used):
+        if entity.id is None or entity.id == '':
+            raise AttributeError('please provide an entity with a valid id')
+        if entity.id in self._pending_ids():
+            used.add(entity.id)
+            return entity.id
+        return entity.get_dao(self.service).entity_path(entity.id)
+
+    def create(self, entity):
+        used = set()
+        body = self._body(entity, used)
+        request = self._add('post', entity.get_dao(self.service).entitytype_plural, entity, body, depends_on=used)
+        entity.id = '$' + request['id']
+        return entity.id
+
+    def update(self, entity):
+        used = set()
+        url = self._entity_url(entity, used)
+        self._add('put', url, entity, self._body(entity, used), depends_on=used)
+
+    def patch(self, entity, patches):
+        if isinstance(patches, jsonpatch.JsonPatch):
+            patches = patches.patch
+        if not (isinstance(patches, list) and all(isinstance(x, dict) for x in patches)):
+            raise ValueError('please provide a list of patches, either as a jsonpatch object or a '
+                             'list of dictionaries')
+        used = set()
+        url = self._entity_url(entity, used)
+        self._add('patch', url, entity, patches, self.APPLICATION_JSON_PATCH, depends_on=used)
+
+    def delete(self, entity):
+        used = set()
+        url = self._entity_url(entity, used)
+        self._add('delete', url, entity, depends_on=used)
+
+    def _reset_pending_ids(self):
+        pending_ids = self._pending_ids()
+        for _, entity in self.requests:
+            if entity.id in pending_ids:
+                entity.id = None
+
+    def send(self):
+        """
+        Send the recorded requests as one batch request and apply the responses to the entities.
+        Raises a BatchError if any of the requests failed.
+        """
+        if len(self.requests) == 0:
+            return
+        url = self.service.url.copy()
+        url.path.add('$batch')
+        logging.debug('Posting batch of {} requests to {}'.format(len(self.requests), url.url))
+        try:
+            response = self.service.execute('post', url, json={'requests': [r for r, _ in self.requests]})
+        except requests.exceptions.HTTPError as e:
+            self._reset_pending_ids()
+            logging.error("Batch failed with status-code {}, {}".format(e.response.status_code, e.response.text))
+            raise e
+        responses = {r['id']: r for r in staplus_client.utils.response_json(response).get('responses', [])}
+        errors = []
+        for request, entity in self.requests:
+            result = responses.get(request['id'], {})
+            status = result.get('status', 0)
+            location = {k.lower(): v for k, v in (result.get('headers', None) or {}).items()}.get('location', None)
+            if 200 <= status < 300 and (request['method'] != 'post' or location is not None):
+                if request['method'] == 'post':
+                    entity.id = extract_value(location)
+                    entity.self_link = location
+                    entity.service = self.service
+                else:
+                    self.service.written(request['method'], entity)
+                continue
+            if request['method'] == 'post':
+                entity.id = None
+            body = result.get('body', None)
+            message = body.get('message', body) if isinstance(body, dict) else body
+            if 200 <= status < 300:
+                message = 'the response has no Location header'
+            logging.error("Batch request {} {} failed with status-code {}, {}".format(request['method'],
+                                                                                     request['url'], status, message))
+            errors.append((entity, status, message))
+        self.requests = []
+        if len(errors) > 0:
+            raise BatchError(errors)
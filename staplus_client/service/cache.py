@@ -0,0 +1,186 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class EntityCache:
+    """
+    A read-through cache for BaseDao.find and Query.item. An entity that was read is returned from the cache
+    until its time to live has passed, instead of being read from the service again. Updating, patching or
+    deleting an entity removes it from the cache once the request succeeded, also if it was sent by a DAO or in a
+    batch. The cached instance is returned, so it is shared by all callers.
+    params:
+        ttls: seconds to keep the entities per entity type, e.g. {'License': 3600, 'Party': 600}
+        ttl: seconds to keep entities of the other types; None does not cache them
+        maxsize: the maximum number of entities in the cache, the least recently used are dropped
+    To plug in another cache, subclass it and override get, put, invalidate and clear.
+    """
+    def __init__(self, ttls=None, ttl=None, maxsize=1000):
+        self.ttls = ttls if ttls is not None else {}
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # (entity class, id) -> the keys of the entries holding that entity, so invalidating does not scan them all
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ttls(self):
+        return self._ttls
+
+    @ttls.setter
+    def ttls(self, value):
+        if isinstance(value, dict) and all(isinstance(v, (int, float)) for v in value.values()):
+            self._ttls = value
+            return
+        raise ValueError('ttls should be a dict of entity type names to seconds')
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value):
+        if isinstance(value, int) and value > 0:
+            self._maxsize = value
+            return
+        raise ValueError('maxsize should be a positive int')
+
+    def ttl_for(self, entity_type):
+        return self.ttls.get(entity_type, self.ttl)
+
+    def get(self, entity_type, key):
+        """
+        The cached entity of the type for the key (an id or a request url), None if it is not cached or expired
+        """
+        if self.ttl_for(entity_type) is None:
+            return None
+        with self._lock:
+            entry = self._entries.get((entity_type, key), None)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end((entity_type, key))
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._remove((entity_type, key))
+            self.misses += 1
+            return None
+
+    def put(self, entity_type, key, entity):
+        ttl = self.ttl_for(entity_type)
+        if ttl is None:
+            return
+        with self._lock:
+            if (entity_type, key) in self._entries:
+                self._remove((entity_type, key))
+            # the index key is kept with the entry, the id of the entity may change while it is cached
+            index = (type(entity), entity.id)
+            self._entries[(entity_type, key)] = (time.monotonic() + ttl, entity, index)
+            self._keys.setdefault(index, set()).add((entity_type, key))
+            if len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        index = self._entries.pop(key)[2]
+        keys = self._keys[index]
+        keys.discard(key)
+        if len(keys) == 0:
+            del self._keys[index]
+
+    def invalidate(self, entity):
+        """
+        Remove an entity from the cache, whether it was read by id or by a request url
+        """
+        with self._lock:
+            for key in list(self._keys.get((type(entity), entity.id), ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ResponseCache:
+    """
+    Keeps the validators (ETag, Last-Modified) and the decoded result of the GET responses by url. With a response
+    cache, the service sends conditional requests (If-None-Match, If-Modified-Since) and reuses the decoded
+    entities when the service answers 304 Not Modified, so unchanged pages are neither transferred nor decoded
+    again. Only responses with a validator are kept; the least recently used are dropped beyond maxsize.
+    """
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value):
+        if isinstance(value, int) and value > 0:
+            self._maxsize = value
+            return
+        raise ValueError('maxsize should be a positive int')
+
+    def get(self, url):
+        """
+        The conditional request headers and the decoded result for the url, None if it is not cached
+        """
+        with self._lock:
+            entry = self._entries.get(str(url), None)
+            if entry is not None:
+                self._entries.move_to_end(str(url))
+            return entry
+
+    def put(self, url, response, value):
+        headers = {}
+        if response.headers.get('ETag', None) is not None:
+            headers['If-None-Match'] = response.headers['ETag']
+        if response.headers.get('Last-Modified', None) is not None:
+            headers['If-Modified-Since'] = response.headers['Last-Modified']
+        with self._lock:
+            if len(headers) == 0:
+                self._entries.pop(str(url), None)
+                return
+            self._entries[str(url)] = (headers, value)
+            self._entries.move_to_end(str(url))
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def count(self, not_modified):
+        with self._lock:
+            if not_modified:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
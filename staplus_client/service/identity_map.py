@@ -0,0 +1,153 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+import threading
+from collections import OrderedDict
+
+from frost_sta_client.model.entity import Entity
+from frost_sta_client.model.ext.entity_list import EntityList
+
+ENTITY = 1
+ENTITY_LIST = 2
+
+# type -> ENTITY, ENTITY_LIST or 0; isinstance checks against the abstract Entity class are slow
+_kinds = {}
+
+# JSON key -> attribute of the entity
+_attributes = {'@iot.id': '_id', '@iot.selfLink': '_self_link'}
+
+
+def _kind(value):
+    cls = type(value)
+    kind = _kinds.get(cls, None)
+    if kind is None:
+        kind = ENTITY if issubclass(cls, Entity) else ENTITY_LIST if issubclass(cls, EntityList) else 0
+        _kinds[cls] = kind
+    return kind
+
+
+def _attribute(key):
+    attribute = _attributes.get(key, None)
+    if attribute is None:
+        attribute = None if '@' in key else '_' + re.sub(r'(?<!^)(?=[A-Z])', '_', key).lower()
+        _attributes[key] = attribute
+    return attribute
+
+
+class IdentityMap:
+    """
+    Keeps one instance per (entity type, id). Entities decoded by a service with an identity map are replaced by
+    the instance that is already known, so e.g. the Party of 100k Datastreams is one object. The properties that
+    were read are merged into the known instance, so it always holds the latest state that was read, and a partial
+    decode, e.g. with $select or of a reference, does not overwrite the properties it did not read. The least
+    recently used entities are dropped when there are more than maxsize.
+    """
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entities = OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value):
+        if isinstance(value, int) and value > 0:
+            self._maxsize = value
+            return
+        raise ValueError('maxsize should be a positive int')
+
+    def __len__(self):
+        return len(self._entities)
+
+    def __contains__(self, entity):
+        return (type(entity), entity.id) in self._entities
+
+    def get(self, entity_class, id):
+        """
+        The known instance of the entity class with the id, None if there is none
+        """
+        with self._lock:
+            entity = self._entities.get((entity_class, id), None)
+            if entity is not None:
+                self._entities.move_to_end((entity_class, id))
+            return entity
+
+    def add(self, entity, json=None):
+        """
+        Returns the known instance for the entity after merging the entity into it, or the entity itself if it is
+        not known yet. The related entities are replaced by their known instances as well.
+        params:
+            json: the JSON the entity was decoded from; only the properties that are in it are merged, so a
+                  partial decode (e.g. with $select, or a reference by id) keeps the other properties of the
+                  known instance. Without it, the properties that are not None are merged.
+        """
+        with self._lock:
+            return self._add(entity, json, set())
+
+    def _add(self, entity, json, visited):
+        if id(entity) in visited:
+            return entity
+        visited.add(id(entity))
+        attributes = entity.__dict__
+        fields = None
+        if isinstance(json, dict):
+            fields = {}
+            for json_key in json:
+                attribute = _attribute(json_key)
+                if attribute is not None and attribute in attributes:
+                    fields[attribute] = json_key
+        for key, value in attributes.items():
+            kind = _kinds.get(type(value), None)
+            if kind is None:
+                kind = _kind(value)
+            if kind == 0:
+                continue
+            related_json = json.get(fields[key], None) if fields is not None and key in fields else None
+            if kind == ENTITY:
+                attributes[key] = self._add(value, related_json, visited)
+            elif kind == ENTITY_LIST and getattr(value, 'decoded', True):
+                # a LazyEntityList adds its entities when they are decoded
+                entities = value.entities
+                rows = related_json if isinstance(related_json, list) and len(related_json) == len(entities) \
+                    else [None] * len(entities)
+                for i, related in enumerate(entities):
+                    entities[i] = self._add(related, rows[i], visited)
+        if entity.id is None:
+            return entity
+        key = (type(entity), entity.id)
+        known = self._entities.get(key, None)
+        if known is None:
+            self._entities[key] = entity
+            if len(self._entities) > self.maxsize:
+                self._entities.popitem(last=False)
+            return entity
+        self._entities.move_to_end(key)
+        if known is not entity:
+            if fields is not None:
+                known.__dict__.update({k: attributes[k] for k in fields})
+            else:
+                known.__dict__.update({k: v for k, v in attributes.items() if v is not None})
+        return known
+
+    def remove(self, entity):
+        with self._lock:
+            self._entities.pop((type(entity), entity.id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entities.clear()
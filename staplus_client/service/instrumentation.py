@@ -0,0 +1,180 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+import re
+import threading
+
+from furl import furl
+
+# the upper bounds in seconds of the histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ID = re.compile(r"\((?:'(?:[^']|'')*'|[^)/]*)\)")
+
+
+def url_template(service_url, url):
+    """
+    The url of a request without host and ids, e.g. 'Things({id})/Datastreams', and the $expand if there is one.
+    Requests of the same kind have the same template, so their statistics can be collected together.
+    """
+    url = furl(str(url))
+    path = str(url.path)
+    base = str(furl(str(service_url)).path).rstrip('/')
+    if path.startswith(base):
+        path = path[len(base):]
+    template = ID.sub('({id})', path.strip('/'))
+    if '$expand' in url.args:
+        template += '?$expand=' + str(url.args['$expand'])
+    return template
+
+
+class Hooks:
+    """
+    The base class of the instrumentation of a service, e.g. HistogramCollector. Override the methods to observe
+    the requests and the decoding of their responses. Hooks are called on the thread (or task) of the request.
+    """
+    def before_request(self, method, template):
+        """
+        Called before a request (or each retry of it) is sent
+        """
+        pass
+
+    def after_response(self, method, template, status, size, seconds):
+        """
+        Called with the status and the number of bytes of a response and the seconds until it was read;
+        status is None if no response was received
+        """
+        pass
+
+    def after_decode(self, template, count, seconds):
+        """
+        Called with the number of entities that were decoded from a response and the seconds it took to parse the
+        JSON of the response and to build the entities
+        """
+        pass
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        An estimate of the quantile q (0..1): the upper bound of the bucket that contains it
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float('inf')
+
+
+class HistogramCollector(Hooks):
+    """
+    Collects in memory, per url template: histograms of the network time by method and status, the response
+    bytes, and histograms of the decode time with the number of decoded entities. to_prometheus() exports them
+    in the Prometheus text format.
+    params:
+        buckets: the upper bounds in seconds of the histogram buckets
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.requests = {}
+        self.response_bytes = {}
+        self.decodes = {}
+        self.decoded_entities = {}
+        self._lock = threading.Lock()
+
+    def after_response(self, method, template, status, size, seconds):
+        key = (method.upper(), template, str(status) if status is not None else 'error')
+        with self._lock:
+            histogram = self.requests.get(key, None)
+            if histogram is None:
+                histogram = self.requests[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            self.response_bytes[key] = self.response_bytes.get(key, 0) + size
+
+    def after_decode(self, template, count, seconds):
+        with self._lock:
+            histogram = self.decodes.get(template, None)
+            if histogram is None:
+                histogram = self.decodes[template] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            self.decoded_entities[template] = self.decoded_entities.get(template, 0) + count
+
+    def clear(self):
+        with self._lock:
+            self.requests.clear()
+            self.response_bytes.clear()
+            self.decodes.clear()
+            self.decoded_entities.clear()
+
+    def to_prometheus(self, prefix='staplus_client'):
+        """
+        The collected metrics in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            lines += histogram_lines(prefix + '_request_duration_seconds', 'Network time of the requests',
+                                     [(labels('method', 'path', 'status', *key), h) for key, h in
+                                      sorted(self.requests.items())])
+            lines += counter_lines(prefix + '_response_bytes_total', 'Bytes of the response bodies',
+                                   [(labels('method', 'path', 'status', *key), v) for key, v in
+                                    sorted(self.response_bytes.items())])
+            lines += histogram_lines(prefix + '_decode_duration_seconds',
+                                     'Time to parse the responses and decode them into entities',
+                                     [(labels('path', key), h) for key, h in sorted(self.decodes.items())])
+            lines += counter_lines(prefix + '_decoded_entities_total', 'Number of decoded entities',
+                                   [(labels('path', key), v) for key, v in sorted(self.decoded_entities.items())])
+        return '\n'.join(lines) + '\n'
+
+
+def labels(*names_and_values):
+    half = len(names_and_values) // 2
+    return ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in zip(names_and_values[:half], names_and_values[half:]))
+
+
+def histogram_lines(name, description, histograms):
+    lines = ['# HELP {} {}'.format(name, description), '# TYPE {} histogram'.format(name)]
+    for label, histogram in histograms:
+        total = 0
+        for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+            total += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, label, le, total))
+        lines.append('{}_sum{{{}}} {}'.format(name, label, histogram.sum))
+        lines.append('{}_count{{{}}} {}'.format(name, label, histogram.count))
+    return lines
+
+
+def counter_lines(name, description, values):
+    lines = ['# HELP {} {}'.format(name, description), '# TYPE {} counter'.format(name)]
+    for label, value in values:
+        lines.append('{}{{{}}} {}'.format(name, label, value))
+    return lines
@@ -0,0 +1,103 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import threading
+import time
+import weakref
+
+
+class RateLimiter:
+    """
+    Limits the requests of a service: at most rate requests per second on average, with bursts of up to burst
+    requests (a token bucket), and at most max_in_flight requests at the same time. The limits hold for all
+    threads using the service, or for all tasks using an AsyncSTAplusService. Requests wait until they are
+    allowed, in the order they arrived at the token bucket.
+    params:
+        rate: requests per second, None does not limit the rate
+        burst: the number of requests that can be sent at once after a pause, at least 1; None uses rate
+        max_in_flight: the maximum number of concurrent requests, None does not limit them
+    """
+    def __init__(self, rate=None, burst=None, max_in_flight=None):
+        if rate is not None and (not isinstance(rate, (int, float)) or rate <= 0):
+            raise ValueError('rate should be a positive number')
+        if burst is not None and (not isinstance(burst, int) or burst < 1):
+            raise ValueError('burst should be a positive int')
+        if max_in_flight is not None and (not isinstance(max_in_flight, int) or max_in_flight < 1):
+            raise ValueError('max_in_flight should be a positive int')
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate or 1))
+        self.max_in_flight = max_in_flight
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight is not None else None
+        self._async_slots = weakref.WeakKeyDictionary()
+
+    def reserve(self):
+        """
+        Take a token, returns the seconds to wait until it may be used
+        """
+        if self.rate is None:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0
+
+    def __enter__(self):
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            delay = self.reserve()
+            if delay > 0:
+                time.sleep(delay)
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._slots is not None:
+            self._slots.release()
+
+    def async_slots(self):
+        """
+        The semaphore limiting the requests in flight of the running event loop
+        """
+        loop = asyncio.get_running_loop()
+        slots = self._async_slots.get(loop, None)
+        if slots is None:
+            slots = asyncio.Semaphore(self.max_in_flight)
+            self._async_slots[loop] = slots
+        return slots
+
+    async def __aenter__(self):
+        if self.max_in_flight is not None:
+            await self.async_slots().acquire()
+        try:
+            delay = self.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        except BaseException:
+            await self.__aexit__(None, None, None)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if self.max_in_flight is not None:
+            self.async_slots().release()
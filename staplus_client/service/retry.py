@@ -0,0 +1,110 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import email.utils
+import random
+import time
+from datetime import datetime, timezone
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+class RetryPolicy:
+    """
+    Decides if and when a failed request is sent again. Requests are retried if the response status is one of
+    statuses, or if the connection failed. Only idempotent methods are retried, except for 429 Too Many Requests,
+    which means that the request was not processed. The delay is the Retry-After of the response if there is one,
+    otherwise a random time between 0 and backoff_factor * 2 ** attempt seconds, at most max_backoff.
+    params:
+        retries: the maximum number of retries of a request
+        backoff_factor: seconds of the first backoff, doubled with each retry
+        max_backoff: the maximum seconds to wait before a retry without Retry-After
+        max_elapsed: the maximum seconds from the first attempt until a retry is sent, None has no limit
+        statuses: the response status codes that are retried
+        methods: the HTTP methods that are retried for all statuses
+    """
+    def __init__(self, retries=3, backoff_factor=0.5, max_backoff=60, max_elapsed=300,
+                 statuses=(429, 502, 503, 504), methods=IDEMPOTENT_METHODS):
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.max_elapsed = max_elapsed
+        self.statuses = statuses
+        self.methods = methods
+
+    @property
+    def retries(self):
+        return self._retries
+
+    @retries.setter
+    def retries(self, value):
+        if isinstance(value, int) and value >= 0:
+            self._retries = value
+            return
+        raise ValueError('retries should be a non-negative int')
+
+    @property
+    def methods(self):
+        return self._methods
+
+    @methods.setter
+    def methods(self, value):
+        self._methods = {method.upper() for method in value}
+
+    def retryable(self, method, status=None):
+        """
+        True if a request with the method is retried after the response status, or if status is None after a
+        connection error
+        """
+        if status is None:
+            return method.upper() in self.methods
+        return status in self.statuses and (method.upper() in self.methods or status == 429)
+
+    def delay(self, method, attempt, start, status=None, headers=None):
+        """
+        The seconds to wait before the next attempt, None if the request is not retried
+        params:
+            attempt: the number of retries that were already sent
+            start: the time.monotonic() of the first attempt
+            status: the status of the response, None after a connection error
+            headers: the headers of the response
+        """
+        if attempt >= self.retries or not self.retryable(method, status):
+            return None
+        delay = retry_after(headers.get('Retry-After', None)) if headers is not None else None
+        if delay is None:
+            delay = random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+        if self.max_elapsed is not None and time.monotonic() - start + delay > self.max_elapsed:
+            return None
+        return delay
+
+
+def retry_after(value):
+    """
+    The seconds of a Retry-After header, given as seconds or as HTTP date; None if there is no valid value
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
@@ -13,11 +13,31 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import contextlib
+import logging
+import re
+import threading
+import time
+
 import requests
+from furl import furl
+from requests.adapters import HTTPAdapter
+
+import staplus_client.utils
 
 from staplus_client.service.auth_handler import AuthHandler as STAplusAuthHandler
 from frost_sta_client.service.auth_handler import AuthHandler as STAAuthHandler
 from frost_sta_client.service import sensorthingsservice
+from staplus_client.service import batch
+from staplus_client.service.identity_map import IdentityMap
+from staplus_client.service.cache import EntityCache, ResponseCache
+from staplus_client.service.store import EntityStore
+from staplus_client.service.retry import RetryPolicy
+from staplus_client.service.limiter import RateLimiter
+from staplus_client.service import instrumentation
+from staplus_client.service import sync
+from frost_sta_client.model.entity import Entity
+from frost_sta_client.utils import extract_value
 
 from staplus_client.dao import observedproperty
 from staplus_client.dao import historical_location
@@ -33,23 +53,135 @@ from staplus_client.dao import campaign
 from staplus_client.dao import relation
 from staplus_client.dao import thing
 from staplus_client.dao import sensor
+from staplus_client.dao import deep_insert
 import staplus_client.model.ext.entity_type as staplus_entity_type
 
-class STAplusService(sensorthingsservice.SensorThingsService):
-    def __init__(self, url, auth_handler=None):
-        super().__init__(url, auth_handler)
+# the last path segment of the url of an entity, e.g. Things(5) or Parties('abc')
+ENTITY_SEGMENT = re.compile(r"^(\w+)\((.+)\)$")
+
+class ServiceMixin:
+    """
+    The options and the handling of decoded and written entities that STAplusService and AsyncSTAplusService
+    share. It comes first in the bases of both services.
+    """
+    def written(self, method, entity):
+        """
+        Called when a put, patch or delete of an entity succeeded, by execute() or by the batch that sent it.
+        Removes the entity from the cache, and a deleted entity from the identity map.
+        """
+        if self.cache is not None:
+            self.cache.invalidate(entity)
+        if method == 'delete' and self.identity_map is not None:
+            self.identity_map.remove(entity)
+
+    def written_entity(self, url):
+        """
+        An entity with the type and id of the entity a url addresses, e.g. .../Things(5), None for other urls
+        """
+        segments = furl(url).path.segments
+        match = ENTITY_SEGMENT.match(segments[-1]) if len(segments) > 0 else None
+        if match is None:
+            return None
+        entity_type = next((name for name, entity_type in staplus_entity_type.EntityTypes.items()
+                            if entity_type.get('plural', None) == match.group(1)), None)
+        if entity_type is None:
+            return None
+        return staplus_client.utils.transform_json_to_entity({'@iot.id': extract_value(segments[-1])},
+                                                             staplus_entity_type.EntityTypes[entity_type]['class'])
+
+    def canonical(self, value, json_response=None):
+        """
+        Replace a decoded entity, or the entities of an EntityList, by the instances of the identity map
+        params:
+            json_response: the JSON the value was decoded from, so only the properties in it are merged into
+                           the known instances
+        """
+        if self.identity_map is None:
+            return value
+        if isinstance(value, Entity):
+            return self.identity_map.add(value, json_response)
+        entities = value.entities
+        rows = json_response.get('value', None) if isinstance(json_response, dict) else json_response
+        if rows is not None and staplus_client.utils.is_data_array(rows):
+            rows = staplus_client.utils.transform_data_array_to_json(rows)
+        if rows is None or len(rows) != len(entities):
+            rows = [None] * len(entities)
+        for i, e in enumerate(entities):
+            entities[i] = self.identity_map.add(e, rows[i])
+        return value
+
+    def written_request(self, method, url):
+        """
+        Called when a request to url succeeded; calls written() if it was a put, patch or delete of an entity
+        """
+        if method in ('put', 'patch', 'delete') and (self.cache is not None or self.identity_map is not None):
+            entity = self.written_entity(url)
+            if entity is not None:
+                self.written(method, entity)
 
-    def create(self, entity):
-        return entity.get_dao(self).create(entity)
+    @property
+    def cache(self):
+        return self._cache
 
-    def update(self, entity):
-        entity.get_dao(self).update(entity)
+    @cache.setter
+    def cache(self, value):
+        if value is None or isinstance(value, EntityCache):
+            self._cache = value
+            return
+        raise ValueError('cache should be of type EntityCache')
 
-    def patch(self, entity, patches):
-        entity.get_dao(self).patch(entity, patches)
+    @property
+    def hooks(self):
+        return self._hooks
 
-    def delete(self, entity):
-        entity.get_dao(self).delete(entity)
+    @hooks.setter
+    def hooks(self, value):
+        if isinstance(value, list) and all(isinstance(h, instrumentation.Hooks) for h in value):
+            self._hooks = value
+            return
+        raise ValueError('hooks should be a list of Hooks')
+
+    def report_decode(self, url, count, seconds):
+        """
+        Pass the number of entities decoded from the response of url and the seconds it took to the hooks
+        """
+        if len(self.hooks) > 0:
+            template = instrumentation.url_template(self.url, url)
+            for hook in self.hooks:
+                hook.after_decode(template, count, seconds)
+
+    @property
+    def limiter(self):
+        return self._limiter
+
+    @limiter.setter
+    def limiter(self, value):
+        if value is None or isinstance(value, RateLimiter):
+            self._limiter = value
+            return
+        raise ValueError('limiter should be of type RateLimiter')
+
+    @property
+    def retry(self):
+        return self._retry
+
+    @retry.setter
+    def retry(self, value):
+        if value is None or isinstance(value, RetryPolicy):
+            self._retry = value
+            return
+        raise ValueError('retry should be of type RetryPolicy')
+
+    @property
+    def identity_map(self):
+        return self._identity_map
+
+    @identity_map.setter
+    def identity_map(self, value):
+        if value is None or isinstance(value, IdentityMap):
+            self._identity_map = value
+            return
+        raise ValueError('identity_map should be of type IdentityMap')
 
     @property
     def auth_handler(self):
@@ -64,17 +196,208 @@ class STAplusService(sensorthingsservice.SensorThingsService):
             raise ValueError('auth should be of type AuthHandler!')
         self._auth_handler = value
 
+
+class STAplusService(ServiceMixin, sensorthingsservice.SensorThingsService):
+    def __init__(self, url, auth_handler=None, proxies=None, pool_connections=10, pool_maxsize=10,
+                 pool_block=False, keep_alive=True, connect_timeout=None, read_timeout=None, identity_map=None,
+                 cache=None, response_cache=None, store=None, retry=None, limiter=None, hooks=None):
+        """
+        All requests of a service instance share one connection pool, so consecutive requests to the same
+        host reuse the open (TLS) connection instead of doing a new handshake.
+        params:
+            pool_connections: the number of hosts for which connections are pooled
+            pool_maxsize: the maximum number of connections kept open per host
+            pool_block: if True, a thread waits for a free connection instead of opening an extra one
+            keep_alive: if False, every connection is closed after the response
+            connect_timeout: seconds to wait for the connection to the server (None waits forever)
+            read_timeout: seconds to wait for the server to send a response (None waits forever)
+            identity_map: an IdentityMap; if set, every entity that is read gets replaced by the instance that is
+                          already known for its type and id
+            cache: an EntityCache; if set, find() and Query.item() return cached entities until they expire
+            response_cache: a ResponseCache; if set, queries and the paging of an EntityList send conditional
+                            requests and reuse the decoded entities if the response is 304 Not Modified
+            store: an EntityStore; mirror() copies entity types into it, queries with offline=True read from it
+            retry: a RetryPolicy; if set, requests that failed with e.g. 503 or 429 are sent again after a backoff
+            limiter: a RateLimiter; if set, the requests of all threads wait to stay within its limits
+            hooks: a list of Hooks, e.g. a HistogramCollector, that are called before and after every request and
+                   after a response was decoded into entities
+        """
+        super().__init__(url, auth_handler, proxies)
+        self.identity_map = identity_map
+        self.cache = cache
+        self.response_cache = response_cache
+        self.store = store
+        self.retry = retry
+        self.limiter = limiter
+        self.hooks = hooks if hooks is not None else []
+        self.keep_alive = keep_alive
+        self.timeout = (connect_timeout, read_timeout)
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                    pool_block=pool_block)
+        self._local = threading.local()
+
+    def create(self, entity, deep=False):
+        """
+        Create an entity. If deep is True, the new related entities are created with it in one deep insert
+        request, and get their ids from one follow-up request (see staplus_client.dao.deep_insert).
+        """
+        if deep:
+            if self.current_batch is not None:
+                raise ValueError('a deep insert can not be recorded in a batch')
+            return deep_insert.create(self, entity)
+        if self.current_batch is not None:
+            return self.current_batch.create(entity)
+        return entity.get_dao(self).create(entity)
+
+    def update(self, entity):
+        if self.current_batch is not None:
+            return self.current_batch.update(entity)
+        entity.get_dao(self).update(entity)
+
+    def patch(self, entity, patches):
+        if self.current_batch is not None:
+            return self.current_batch.patch(entity, patches)
+        entity.get_dao(self).patch(entity, patches)
+
+    def delete(self, entity):
+        if self.current_batch is not None:
+            return self.current_batch.delete(entity)
+        entity.get_dao(self).delete(entity)
+
+    def mirror(self, *entity_types):
+        """
+        Copy all entities of the given types (singular names of EntityTypes, e.g. 'Thing') into the store.
+        Returns the number of entities per type.
+        """
+        if self.store is None:
+            raise ValueError('mirror needs a service with a store')
+        return {entity_type: self.store.mirror(self, entity_type) for entity_type in entity_types}
+
+    def sync(self, parent, since=None, sink=None, by='phenomenonTime', page_size=None):
+        """
+        Send the Observations of a Datastream or MultiDatastream that are newer than the watermark since to sink,
+        page by page, and return the new watermark (see staplus_client.service.sync). Passing the returned or the
+        last sunk watermark to the next call resumes the sync, so only new Observations are read.
+        """
+        return sync.sync(self, parent, since, sink, by, page_size)
+
+    def batch(self):
+        """
+        Returns a Batch context: create, update, patch and delete calls on this service made by the same
+        thread inside the context are recorded and sent as one $batch request when the context exits.
+        """
+        return batch.Batch(self)
+
+    @property
+    def current_batch(self):
+        """
+        The batch that is recorded by the calling thread, None if there is none
+        """
+        return getattr(self._local, 'batch', None)
+
+    @current_batch.setter
+    def current_batch(self, value):
+        self._local.batch = value
+
+    @property
+    def response_cache(self):
+        return self._response_cache
+
+    @response_cache.setter
+    def response_cache(self, value):
+        if value is None or isinstance(value, ResponseCache):
+            self._response_cache = value
+            return
+        raise ValueError('response_cache should be of type ResponseCache')
+
+    @property
+    def store(self):
+        return self._store
+
+    @store.setter
+    def store(self, value):
+        if value is None or isinstance(value, EntityStore):
+            self._store = value
+            return
+        raise ValueError('store should be of type EntityStore')
+
+    @property
+    def session(self):
+        """
+        The requests session of the calling thread. Sessions are not shared between threads, but all of
+        them are mounted on the same adapter and therefore use the same thread-safe connection pool.
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self._adapter)
+            session.mount('https://', self._adapter)
+            if not self.keep_alive:
+                session.headers['Connection'] = 'close'
+            self._local.session = session
+        return session
+
+    def close(self):
+        """
+        Closes all pooled connections. The service can still be used afterwards, it opens new connections.
+        """
+        self._adapter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def execute(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if self.proxies is not None:
+            kwargs.setdefault('proxies', self.proxies)
         if self.auth_handler is not None:
-            response = requests.request(method, url, auth=self.auth_handler.add_auth_header(), **kwargs)
-        else:
-            response = requests.request(method, url, **kwargs)
-        try:
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            raise e
-
-        return response
+            kwargs['auth'] = self.auth_handler.add_auth_header()
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                response = self._send(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                delay = self.retry.delay(method, attempt, start) if self.retry is not None else None
+                if delay is None:
+                    raise e
+                logging.warning('{} {} failed with {}, retrying in {:.1f}s'.format(method, url, e, delay))
+            else:
+                if response.status_code < 400:
+                    self.written_request(method, url)
+                    return response
+                delay = self.retry.delay(method, attempt, start, response.status_code, response.headers) \
+                    if self.retry is not None else None
+                if delay is None:
+                    response.raise_for_status()
+                logging.warning('{} {} failed with status-code {}, retrying in {:.1f}s'.format(
+                    method, url, response.status_code, delay))
+            time.sleep(delay)
+            attempt += 1
+
+    def _send(self, method, url, **kwargs):
+        """
+        Send one attempt of a request within the limits of the limiter, and report it to the hooks
+        """
+        with self.limiter if self.limiter is not None else contextlib.nullcontext():
+            if len(self.hooks) == 0:
+                return self.session.request(method, str(url), **kwargs)
+            template = instrumentation.url_template(self.url, url)
+            for hook in self.hooks:
+                hook.before_request(method, template)
+            status, size = None, 0
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, str(url), **kwargs)
+                status, size = response.status_code, len(response.content)
+                return response
+            finally:
+                seconds = time.perf_counter() - started
+                for hook in self.hooks:
+                    hook.after_response(method, template, status, size, seconds)
 
     def get_path(self, parent, relation):
         if parent is None:
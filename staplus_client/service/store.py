@@ -0,0 +1,355 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+
+import staplus_client.utils
+import staplus_client.model.ext.entity_list
+from staplus_client.model.ext import time_value
+from staplus_client.model.ext.entity_type import EntityTypes
+
+# the OData comparison operators that are answered offline
+OPERATORS = {'eq': '=', 'ne': '<>', 'gt': '>', 'ge': '>=', 'lt': '<', 'le': '<='}
+
+TOKEN = re.compile(r"\s*(?:(?P<string>'(?:[^']|'')*')"
+                   r"|(?P<datetime>\d{4}-\d{2}-\d{2}T[\d:.]+(?:Z|[+-]\d{2}:\d{2})?)"
+                   r"|(?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)"
+                   r"|(?P<paren>[()])"
+                   r"|(?P<name>[A-Za-z_@][\w@.]*(?:/[A-Za-z_@][\w@.]*)*))")
+
+
+def foreign_keys(entity_type):
+    """
+    The navigation properties of an entity type that relate to at most one entity, e.g. 'Thing' of a Datastream.
+    They are stored as indexed columns holding the id of the related entity.
+    """
+    cl = staplus_client.utils.class_from_string(EntityTypes[entity_type]['class'])
+    plurals = {t['plural'] for t in EntityTypes.values()}
+    return [relation for relation in EntityTypes[entity_type].get('relations_list', [])
+            if relation not in plurals and
+            isinstance(getattr(cl, staplus_client.utils.attribute_name(relation), None), property)]
+
+
+def utc_time(value, end=0):
+    """
+    A time as UTC ISO string with microseconds, which sorts and compares as the instant it denotes; the end of an
+    interval if end is 1, otherwise the start. Values that are no time are returned unchanged.
+    """
+    if not isinstance(value, str):
+        return value
+    try:
+        parsed = time_value.parse(value)
+    except ValueError:
+        return value
+    return parsed.key[1 if end else 0].isoformat(timespec='microseconds')
+
+
+def select_properties(item, select):
+    """
+    The JSON of an entity with only the properties of a $select expression, e.g. 'id,name'
+    """
+    keys = set()
+    for key in select.split(','):
+        key = key.strip()
+        if '/' in key or key[:1].isupper():
+            raise ValueError('$select={} can not be evaluated offline'.format(select))
+        if key != '':
+            keys.add('@iot.id' if key == 'id' else key)
+    return {key: value for key, value in item.items() if key in keys}
+
+
+def tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN.match(expression, position)
+        if match is None or match.end() == position:
+            raise ValueError('can not evaluate $filter offline at: ' + expression[position:])
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        position = match.end()
+    return tokens
+
+
+class EntityStore:
+    """
+    A local SQLite database that mirrors entity types of a service, to read slow-changing entities like Things,
+    Datastreams or Campaigns without paging through the service. There is one table per entity type of EntityTypes,
+    with the id, the JSON of the entity and one indexed column per related entity (e.g. the Thing of a Datastream).
+    Queries with offline=True are answered from the store; they support $filter with comparisons of properties
+    combined by and, or, not and parentheses, $select, $orderby, $top, $skip and $count, and the related entities of
+    a parent that have a column for it, e.g. thing.get_datastreams(). Times are compared by the instant they denote.
+    params:
+        path: the file of the database, ':memory:' keeps it in memory
+    """
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        # times are compared by the instant they denote, not as text
+        self._connection.create_function('utc_time', 2, utc_time, deterministic=True)
+        self._lock = threading.Lock()
+        self._tables = {}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def table(self, entity_type):
+        """
+        Create the table of an entity type if it does not exist, returns its foreign key columns
+        """
+        columns = self._tables.get(entity_type, None)
+        if columns is not None:
+            return columns
+        if entity_type not in EntityTypes or 'relations_list' not in EntityTypes[entity_type]:
+            raise ValueError('{} is no entity type'.format(entity_type))
+        columns = foreign_keys(entity_type)
+        name = EntityTypes[entity_type]['plural']
+        self._connection.execute('CREATE TABLE IF NOT EXISTS "{}" (id PRIMARY KEY, json TEXT NOT NULL{})'.format(
+            name, ''.join(', "{}"'.format(column) for column in columns)))
+        for column in columns:
+            self._connection.execute('CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" ("{1}")'.format(name, column))
+        self._tables[entity_type] = columns
+        return columns
+
+    def _rows(self, entity_type, items):
+        columns = self.table(entity_type)
+        for item in items:
+            keys = []
+            for column in columns:
+                related = item.get(column, None)
+                keys.append(related.get('@iot.id', None) if isinstance(related, dict) else None)
+            yield [item['@iot.id'], json.dumps(item)] + keys
+
+    def _insert(self, entity_type, items):
+        columns = self.table(entity_type)
+        statement = 'INSERT OR REPLACE INTO "{}" VALUES ({})'.format(EntityTypes[entity_type]['plural'],
+                                                                       ', '.join(['?'] * (len(columns) + 2)))
+        self._connection.executemany(statement, self._rows(entity_type, items))
+
+    def put(self, *entities):
+        """
+        Store entities, replacing the stored entities with the same id
+        """
+        with self._lock, self._connection:
+            for entity in entities:
+                entity_type = type(entity).__name__
+                data = staplus_client.utils.transform_entity_to_json_dict(entity)
+                data['@iot.id'] = entity.id
+                self._insert(entity_type, [data])
+
+    def remove(self, entity):
+        with self._lock, self._connection:
+            entity_type = type(entity).__name__
+            self.table(entity_type)
+            self._connection.execute('DELETE FROM "{}" WHERE id = ?'.format(EntityTypes[entity_type]['plural']),
+                                     (entity.id,))
+
+    def mirror(self, service, entity_type, filter=None):
+        """
+        Replace the stored entities of a type by all entities of that type of the service. The ids of the related
+        entities with a column are read with the same requests. Returns the number of stored entities.
+        params:
+            entity_type: the singular name of the type in EntityTypes, e.g. 'Datastream'
+            filter: a $filter to store only part of the entities; they are added to the stored ones
+        """
+        columns = self.table(entity_type)
+        url = service.get_full_path(None, EntityTypes[entity_type]['plural'])
+        if len(columns) > 0:
+            url.args['$expand'] = ','.join('{}($select=id)'.format(column) for column in columns)
+        if filter is not None:
+            url.args['$filter'] = filter
+        logging.debug('Mirroring ' + str(url.url))
+        count = 0
+        with self._lock, self._connection:
+            if filter is None:
+                self._connection.execute('DELETE FROM "{}"'.format(EntityTypes[entity_type]['plural']))
+            while url is not None:
+                json_response = staplus_client.model.ext.entity_list.fetch_json(service, url)
+                self._insert(entity_type, json_response['value'])
+                count += len(json_response['value'])
+                url = json_response.get('@iot.nextLink', None)
+        return count
+
+    def select(self, entity_type, params, parent=None):
+        """
+        The stored JSON of the entities of a type that match the query options, and their number if $count is true
+        """
+        columns = self.table(entity_type)
+        unsupported = [key for key in params.keys() if key not in ('$filter', '$orderby', '$top', '$skip',
+                                                                   '$count', '$select')]
+        if len(unsupported) > 0:
+            raise ValueError('{} can not be evaluated offline'.format(', '.join(unsupported)))
+        where = []
+        args = []
+        if parent is not None:
+            column = type(parent).__name__
+            if column not in columns:
+                raise ValueError('the {} of a {} can not be queried offline'.format(
+                    EntityTypes[entity_type]['plural'], column))
+            where.append('"{}" = ?'.format(column))
+            args.append(parent.id)
+        if params.get('$filter', None):
+            expression, filter_args = Filter(tokenize(params['$filter']), columns).parse()
+            where.append(expression)
+            args += filter_args
+        statement = 'FROM "{}"'.format(EntityTypes[entity_type]['plural'])
+        if len(where) > 0:
+            statement += ' WHERE ' + ' AND '.join('({})'.format(w) for w in where)
+        with self._lock:
+            count = None
+            if str(params.get('$count', 'false')).lower() == 'true':
+                count = self._connection.execute('SELECT count(*) ' + statement, args).fetchone()[0]
+            if params.get('$orderby', None):
+                statement += ' ORDER BY ' + orderby(params['$orderby'], columns)
+            statement += ' LIMIT {} OFFSET {}'.format(int(params.get('$top', -1)), int(params.get('$skip', 0)))
+            rows = self._connection.execute('SELECT json ' + statement, args).fetchall()
+        items = [staplus_client.utils.loads(row[0]) for row in rows]
+        if params.get('$select', None):
+            items = [select_properties(item, params['$select']) for item in items]
+        return items, count
+
+    def __len__(self):
+        with self._lock:
+            return sum(self._connection.execute('SELECT count(*) FROM "{}"'.format(
+                EntityTypes[entity_type]['plural'])).fetchone()[0] for entity_type in self._tables)
+
+
+def column_expression(path, columns):
+    """
+    The SQL expression of a property path, e.g. 'properties/owner' or 'Thing/id'
+    """
+    segments = path.split('/')
+    if segments[0] in ('id', '@iot.id') and len(segments) == 1:
+        return 'id'
+    if len(segments) == 2 and segments[0] in columns and segments[1] in ('id', '@iot.id'):
+        return '"{}"'.format(segments[0])
+    if segments[0][0].isupper():
+        raise ValueError('the property {} can not be evaluated offline'.format(path))
+    return "json_extract(json, '$.{}')".format('.'.join('"{}"'.format(s) for s in segments))
+
+
+def orderby(expression, columns):
+    criteria = []
+    for criterion in expression.split(','):
+        parts = criterion.split()
+        if len(parts) == 0 or len(parts) > 2 or (len(parts) == 2 and parts[1].lower() not in ('asc', 'desc')):
+            raise ValueError('can not evaluate $orderby offline: ' + expression)
+        criteria.append(column_expression(parts[0], columns) + (' ' + parts[1].upper() if len(parts) == 2 else ''))
+    return ', '.join(criteria)
+
+
+class Filter:
+    """
+    Translates a $filter expression into a SQL expression with parameters
+    """
+    def __init__(self, tokens, columns):
+        self.tokens = tokens
+        self.columns = columns
+        self.position = 0
+        self.args = []
+
+    def parse(self):
+        expression = self.disjunction()
+        if self.position < len(self.tokens):
+            raise ValueError('can not evaluate $filter offline at: ' + self.tokens[self.position][1])
+        return expression, self.args
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            raise ValueError('incomplete $filter')
+        self.position += 1
+        return token
+
+    def keyword(self, word):
+        kind, value = self.peek()
+        if kind == 'name' and value.lower() == word:
+            self.position += 1
+            return True
+        return False
+
+    def disjunction(self):
+        expression = self.conjunction()
+        while self.keyword('or'):
+            expression = '{} OR {}'.format(expression, self.conjunction())
+        return expression
+
+    def conjunction(self):
+        expression = self.negation()
+        while self.keyword('and'):
+            expression = '{} AND {}'.format(expression, self.negation())
+        return expression
+
+    def negation(self):
+        if self.keyword('not'):
+            return 'NOT ({})'.format(self.negation())
+        if self.peek() == ('paren', '('):
+            self.next()
+            expression = self.disjunction()
+            if self.next() != ('paren', ')'):
+                raise ValueError('unbalanced parentheses in $filter')
+            return '({})'.format(expression)
+        return self.comparison()
+
+    def comparison(self):
+        left, left_kind = self.operand()
+        kind, operator = self.next()
+        if kind != 'name' or operator.lower() not in OPERATORS:
+            raise ValueError('can not evaluate the operator {} offline'.format(operator))
+        right, right_kind = self.operand()
+        operator = operator.lower()
+        if 'datetime' in (left_kind, right_kind):
+            # an interval is before a time if it ends before it, and after a time if it starts after it
+            before = operator in ('lt', 'le') if right_kind == 'datetime' else operator in ('gt', 'ge')
+            end = 1 if before else 0
+            if left_kind == 'property':
+                left = 'utc_time({}, {})'.format(left, end)
+            if right_kind == 'property':
+                right = 'utc_time({}, {})'.format(right, end)
+        if right == 'NULL' or left == 'NULL':
+            if operator not in ('eq', 'ne'):
+                raise ValueError('null can only be compared with eq or ne')
+            return '{} IS {}{}'.format(left if right == 'NULL' else right, 'NOT ' if operator == 'ne' else '', 'NULL')
+        return '{} {} {}'.format(left, OPERATORS[operator], right)
+
+    def operand(self):
+        """
+        The SQL expression of an operand and whether it is a 'property', 'datetime', 'literal' or 'null';
+        literals are added to the args
+        """
+        kind, value = self.next()
+        if kind == 'string':
+            self.args.append(value[1:-1].replace("''", "'"))
+        elif kind == 'datetime':
+            self.args.append(utc_time(value))
+        elif kind == 'number':
+            self.args.append(float(value) if any(c in value for c in '.eE') else int(value))
+        elif kind == 'name' and value in ('true', 'false'):
+            self.args.append(1 if value == 'true' else 0)
+        elif kind == 'name' and value == 'null':
+            return 'NULL', 'null'
+        elif kind == 'name':
+            return column_expression(value, self.columns), 'property'
+        else:
+            raise ValueError('can not evaluate $filter offline at: ' + value)
+        return '?', 'datetime' if kind == 'datetime' else 'literal'
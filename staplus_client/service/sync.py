@@ -0,0 +1,119 @@
+# Copyright (C) 2023-2024 Secure Dimensions GmbH, Munich, Germany.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Incremental sync of the Observations of a Datastream or MultiDatastream. The Observations are read in the order
+of a time property, starting at a watermark: the latest time that was synced, together with the ids of the
+Observations that have exactly this time. Observations at the watermark time are read again, because more of them
+may have been added, and skipped by their id. The watermark is handed to the sink with every batch, so a job that
+persists it can resume after an interruption without losing or repeating Observations.
+"""
+
+import logging
+
+import staplus_client.model.ext.entity_list
+from staplus_client.model.ext import time_value
+from staplus_client.query.query import stable_orderby
+
+TIME_PROPERTIES = {'phenomenonTime': 'phenomenon_time', 'resultTime': 'result_time'}
+
+
+class Watermark:
+    """
+    The position of a sync: the latest synced time and the ids of the Observations with that time.
+    Use __getstate__ and __setstate__ to persist it as JSON.
+    """
+    def __init__(self, time=None, ids=None):
+        self.time = time
+        self.ids = set(ids) if ids is not None else set()
+
+    def __getstate__(self):
+        return {'time': self.time, 'ids': sorted(self.ids, key=str)}
+
+    def __setstate__(self, state):
+        self.time = state.get('time', None)
+        self.ids = set(state.get('ids', []))
+
+    def __eq__(self, other):
+        return isinstance(other, Watermark) and self.time == other.time and self.ids == other.ids
+
+    def __repr__(self):
+        return 'Watermark({!r}, {} ids)'.format(self.time, len(self.ids))
+
+
+def observation_time(observation, by):
+    """
+    The time of an Observation as ISO string, the start if it is an interval
+    """
+    value = time_value.cached(observation, TIME_PROPERTIES[by])
+    if value is None:
+        return None
+    return value.start.isoformat()
+
+
+def advance(watermark, observations, by):
+    """
+    The watermark after the Observations of a page (in ascending time order), and the Observations that are new
+    """
+    time = watermark.time
+    ids = set(watermark.ids)
+    new = []
+    for observation in observations:
+        if observation.id in ids:
+            continue
+        new.append(observation)
+        observation_at = observation_time(observation, by)
+        if observation_at is None:
+            continue
+        if observation_at != time:
+            time = observation_at
+            ids = set()
+        ids.add(observation.id)
+    return Watermark(time, ids), new
+
+
+def sync(service, parent, since, sink, by='phenomenonTime', page_size=None):
+    """
+    Send the Observations of parent after the watermark since to sink, page by page. Returns the final watermark.
+    params:
+        parent: the Datastream or MultiDatastream
+        since: a Watermark, an ISO time string or None to sync all Observations
+        sink: called with (observations, watermark) for every page with new Observations; if it raises, the
+              sync stops and the watermark of the previous call is the one to resume from
+        by: the time property that orders the Observations, 'phenomenonTime' or 'resultTime'
+        page_size: the $top of the requests, None uses the page size of the server
+    """
+    if by not in TIME_PROPERTIES:
+        raise ValueError('by should be one of ' + ', '.join(TIME_PROPERTIES))
+    if not callable(sink):
+        raise ValueError('sink should be callable')
+    watermark = since if isinstance(since, Watermark) else Watermark(since)
+    query = parent.get_observations().query()
+    if watermark.time is not None:
+        query.filter('{} ge {}'.format(by, watermark.time))
+    query.orderby(by, 'asc')
+    query.params['$orderby'] = stable_orderby(query.params['$orderby'])
+    if page_size is not None:
+        query.top(page_size)
+    url = service.get_full_path(query.parent, query.entitytype_plural)
+    url.args = query.params
+    logging.debug('Syncing ' + str(url.url))
+    while url is not None:
+        page = staplus_client.model.ext.entity_list.fetch_page(service, url, query.entity_class)
+        watermark, observations = advance(watermark, page.entities, by)
+        if len(observations) > 0:
+            sink(observations, watermark)
+        url = page.next_link
+    return watermark
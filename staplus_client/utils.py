@@ -12,14 +12,151 @@
 #
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import copy
 import json
+import re
+import threading
 
 import geojson
 import jsonpickle, sys
 
+from staplus_client.model.ext import time_value
 from staplus_client.model.ext.entity_list import EntityList
+from staplus_client.model.ext.lazy import LazyEntityList
 from staplus_client.model.thing import Thing
 from frost_sta_client import utils
+from frost_sta_client.utils import extract_value
+from frost_sta_client.model.entity import Entity
+from frost_sta_client.model.ext.entity_list import EntityList as STAEntityList
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def attribute_name(key):
+    """
+    The attribute of an entity for a navigation property, e.g. 'ObservedProperty' -> 'observed_property'
+    """
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', key).lower()
+
+
+def loads(content):
+    """
+    Parse a JSON document (str or bytes), using the C-accelerated orjson if it is installed
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def response_json(response):
+    """
+    Parse the body of a http response as JSON, raises ValueError if it is not JSON
+    """
+    return loads(response.content)
+
+
+def error_message(response):
+    """
+    The message of an error response: the 'message' of a JSON body, otherwise the body or the reason as text
+    """
+    try:
+        body = loads(response.content)
+    except ValueError:
+        body = None
+    if isinstance(body, dict) and body.get('message', None) is not None:
+        return body['message']
+    return response.text or response.reason
+
+
+# dataArray component -> JSON property of an Observation
+DATA_ARRAY_COMPONENTS = {'id': '@iot.id', 'FeatureOfInterest/id': 'FeatureOfInterest'}
+
+# the components of the CreateObservations action, in the order they are sent
+DATA_ARRAY_CREATE_COMPONENTS = ['phenomenonTime', 'result', 'resultTime', 'resultQuality', 'validTime', 'parameters',
+                                'FeatureOfInterest/id']
+
+
+def is_data_array(response_list):
+    """
+    Checks if the 'value' of a response is in the dataArray result format ($resultFormat=dataArray)
+    """
+    return len(response_list) > 0 and isinstance(response_list[0], dict) and 'dataArray' in response_list[0]
+
+
+def data_array_keys(components):
+    return [DATA_ARRAY_COMPONENTS.get(component, component) for component in components]
+
+
+def transform_data_array_to_json(response_list):
+    """
+    Expand the dataArray result format into one JSON object per Observation
+    """
+    rows = []
+    for group in response_list:
+        relations = {}
+        for relation in ('Datastream', 'MultiDatastream'):
+            link = group.get(relation + '@iot.navigationLink', None)
+            if link is not None:
+                relations[relation] = extract_value(link)
+        keys = data_array_keys(group['components'])
+        for values in group['dataArray']:
+            row = dict(zip(keys, values))
+            if 'FeatureOfInterest' in row:
+                row['FeatureOfInterest'] = {'@iot.id': row['FeatureOfInterest']}
+            for relation, id in relations.items():
+                row[relation] = {'@iot.id': id}
+            rows.append(row)
+    return rows
+
+
+def transform_observations_to_data_array(observations):
+    """
+    Transform Observations into the dataArray format of the CreateObservations action, with one group per
+    Datastream or MultiDatastream. Returns the JSON and the Observations in the order of the rows in the JSON.
+    """
+    groups = {}
+    for observation in observations:
+        if observation.datastream is not None and observation.datastream.id is not None:
+            key = ('Datastream', observation.datastream.id)
+        elif observation.multi_datastream is not None and observation.multi_datastream.id is not None:
+            key = ('MultiDatastream', observation.multi_datastream.id)
+        else:
+            raise ValueError('Observations in a dataArray need a Datastream or MultiDatastream with an id')
+        if observation.feature_of_interest is not None and observation.feature_of_interest.id is None:
+            raise ValueError('Observations in a dataArray can only reference a FeatureOfInterest with an id')
+        groups.setdefault(key, []).append(observation)
+    data = []
+    ordered = []
+    for (relation, id), group in groups.items():
+        rows = [observation_data_array_row(observation) for observation in group]
+        components = [component for component in DATA_ARRAY_CREATE_COMPONENTS
+                      if any(row.get(component, None) is not None for row in rows)]
+        data.append({
+            relation: {'@iot.id': id},
+            'components': components,
+            'dataArray@iot.count': len(rows),
+            'dataArray': [[row.get(component, None) for component in components] for row in rows]
+        })
+        ordered += group
+    return data, ordered
+
+
+def observation_data_array_row(observation):
+    row = {
+        'phenomenonTime': time_value.isoformat(observation, 'phenomenon_time'),
+        'result': observation.result,
+        'resultTime': time_value.isoformat(observation, 'result_time'),
+        'resultQuality': observation.result_quality,
+        'validTime': time_value.isoformat(observation, 'valid_time')
+    }
+    if observation.parameters:
+        row['parameters'] = observation.parameters
+    if observation.feature_of_interest is not None:
+        row['FeatureOfInterest/id'] = observation.feature_of_interest.id
+    return row
 
 
 def transform_json_to_entity_list(json_response, entity_class):
@@ -36,15 +173,211 @@ def transform_json_to_entity_list(json_response, entity_class):
         response_list = json_response
     else:
         raise ValueError("expected json as a dict or list to transform into entity list")
-    entity_list.entities = [transform_json_to_entity(item, entity_list.entity_class) for item in response_list]
+    if is_data_array(response_list):
+        response_list = transform_data_array_to_json(response_list)
+    entity_list.entities = [transform_json_to_trusted_entity(item, entity_list.entity_class) for item in response_list]
     return entity_list
 
 
+# entity class name -> (class, attributes of a default constructed instance, keys of mutable attributes)
+_entity_templates = {}
+
+
+def new_entity(entity_class):
+    """
+    Create an empty entity of the class given by its name, equal to one created with the default constructor,
+    but without running the property setters of __init__ for every new entity
+    """
+    template = _entity_templates.get(entity_class, None)
+    if template is None:
+        cl = class_from_string(entity_class)
+        try:
+            attributes = cl().__dict__
+        except (TypeError, ValueError):
+            # the default constructor of this class needs arguments, keep calling it for every entity
+            attributes = None
+        mutable = [key for key, value in (attributes or {}).items() if isinstance(value, (dict, list))]
+        template = (cl, attributes, mutable)
+        _entity_templates[entity_class] = template
+    cl, attributes, mutable = template
+    if attributes is None:
+        return cl()
+    entity = object.__new__(cl)
+    entity.__dict__.update(attributes)
+    for key in mutable:
+        entity.__dict__[key] = copy.copy(attributes[key])
+    return entity
+
+
 def transform_json_to_entity(json_response, entity_class):
-    return utils.transform_json_to_entity(json_response, entity_class)
+    entity = new_entity(entity_class)
+    entity.__setstate__(json_response)
+    return entity
+
+# (entity class name, JSON keys, JSON value types) -> (the expanded entity lists, and the DecodePlan of the other keys
+# or None if they are decoded by __setstate__)
+_decode_plans = {}
+_decode_plans_lock = threading.Lock()
+
+# the number of shapes a DecodePlan is kept for, the oldest plan is dropped when a new shape is learned; with 0
+# every JSON is decoded by __setstate__
+decode_plans_maxsize = 1000
+
+# the JSON keys of the Entity base class -> attribute
+_ENTITY_KEYS = {'@iot.id': '_id', '@iot.selfLink': '_self_link'}
+
+
+class DecodePlan:
+    """
+    How to fill an entity from JSON of one shape without the property setters: the values that are stored
+    unchanged, the related entities and entity lists, and the attributes __setstate__ sets to a default
+    """
+    def __init__(self, values, entities, lists, defaults):
+        self.values = values
+        self.entities = entities
+        self.lists = lists
+        self.defaults = defaults
+
+
+def transform_json_to_trusted_entity(json_response, entity_class):
+    """
+    Decode JSON that was received from the service into an entity, without the validation of the property
+    setters. The first JSON of each shape (keys and value types) is decoded by __setstate__, and a DecodePlan is
+    derived from the result. It is only used if it produces the same entity, i.e. if the setters store the values
+    of that shape unchanged. Entities created by the user are not affected and keep the full validation.
+    At most decode_plans_maxsize plans are kept.
+    The expanded entity lists are kept as LazyEntityList, which decodes them when they are used.
+    """
+    if decode_plans_maxsize <= 0:
+        return transform_json_to_entity(json_response, entity_class)
+    shape = (entity_class, tuple(json_response), tuple(map(type, json_response.values())))
+    known = _decode_plans.get(shape, None)
+    if known is None:
+        entity = transform_json_to_entity(json_response, entity_class)
+        known = learn_decode_plan(entity, json_response, entity_class)
+        with _decode_plans_lock:
+            while _decode_plans and len(_decode_plans) >= decode_plans_maxsize:
+                del _decode_plans[next(iter(_decode_plans))]
+            _decode_plans[shape] = known
+        return entity
+    lazy_lists, plan = known
+    if lazy_lists:
+        lazy_keys = {key for key, _, _ in lazy_lists}
+        rest = {key: value for key, value in json_response.items() if key not in lazy_keys}
+    else:
+        rest = json_response
+    if plan is None:
+        entity = transform_json_to_entity(rest, entity_class)
+    else:
+        entity = apply_decode_plan(plan, rest, entity_class)
+    for key, attribute, related_class in lazy_lists:
+        related = LazyEntityList(related_class, json_entities=json_response[key])
+        related.next_link = json_response.get(key + '@iot.nextLink', None)
+        related.count = json_response.get(key + '@iot.count', None)
+        entity.__dict__[attribute] = related
+    return entity
+
+
+def learn_decode_plan(entity, json_response, entity_class):
+    """
+    The expanded entity lists of JSON of the shape of json_response, as (key, attribute, entity class), and the
+    DecodePlan of the other keys, derived from the entity __setstate__ made of it
+    """
+    lazy_lists = []
+    for key, value in json_response.items():
+        if not isinstance(value, list) or '@' in key:
+            continue
+        attribute = '_' + re.sub(r'(?<!^)(?=[A-Z])', '_', key).lower()
+        decoded = entity.__dict__.get(attribute, None)
+        if isinstance(decoded, STAEntityList) and len(decoded.entities) == len(value):
+            lazy_lists.append((key, attribute, decoded.entity_class))
+    if not lazy_lists:
+        return (), decode_plan(entity, json_response, entity_class)
+    lazy_keys = {key for key, _, _ in lazy_lists}
+    rest = {key: value for key, value in json_response.items() if key not in lazy_keys}
+    return tuple(lazy_lists), decode_plan(transform_json_to_entity(rest, entity_class), rest, entity_class)
+
+
+def apply_decode_plan(plan, json_response, entity_class):
+    entity = new_entity(entity_class)
+    attributes = entity.__dict__
+    for attribute, value in plan.defaults:
+        attributes[attribute] = copy.copy(value) if isinstance(value, (dict, list)) else value
+    for key, attribute in plan.values:
+        attributes[attribute] = json_response[key]
+    for key, attribute, related_class in plan.entities:
+        attributes[attribute] = transform_json_to_trusted_entity(json_response[key], related_class)
+    for key, attribute, list_class, related_class in plan.lists:
+        related = list_class(related_class)
+        related.entities = [transform_json_to_trusted_entity(item, related_class) for item in json_response[key]]
+        related.next_link = json_response.get(key + '@iot.nextLink', None)
+        related.count = json_response.get(key + '@iot.count', None)
+        attributes[attribute] = related
+    return entity
+
+
+def decode_plan(entity, json_response, entity_class):
+    """
+    The DecodePlan for JSON of the shape of json_response, derived from the entity __setstate__ made of it;
+    None if the setters changed a value or the plan does not produce the same entity
+    """
+    if _entity_templates[entity_class][1] is None:
+        return None
+    attributes = entity.__dict__
+    values, entities, lists, used = [], [], [], set()
+    for key, value in json_response.items():
+        if key in _ENTITY_KEYS:
+            attribute = _ENTITY_KEYS[key]
+        elif '@' in key:
+            # navigation links, and next links and counts of the related entity lists
+            continue
+        else:
+            attribute = '_' + re.sub(r'(?<!^)(?=[A-Z])', '_', key).lower()
+        if attribute not in attributes:
+            return None
+        used.add(attribute)
+        decoded = attributes[attribute]
+        if decoded is value:
+            values.append((key, attribute))
+        elif isinstance(value, dict) and isinstance(decoded, Entity):
+            entities.append((key, attribute, class_name(type(decoded))))
+        elif isinstance(value, list) and isinstance(decoded, STAEntityList):
+            lists.append((key, attribute, type(decoded), decoded.entity_class))
+        else:
+            return None
+    template = _entity_templates[entity_class][1]
+    defaults = [(attribute, value) for attribute, value in attributes.items()
+                if attribute not in used and not same_state(value, template.get(attribute, None))]
+    if any(isinstance(value, (Entity, STAEntityList)) for _, value in defaults):
+        return None
+    plan = DecodePlan(values, entities, lists, defaults)
+    if not same_state(apply_decode_plan(plan, json_response, entity_class), entity):
+        return None
+    return plan
+
+
+def same_state(a, b):
+    """
+    True if two decoded values are equal, comparing entities and entity lists by their attributes
+    """
+    if type(a) != type(b):
+        return False
+    if isinstance(a, (Entity, STAEntityList)):
+        return same_state(a.__dict__, b.__dict__)
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(same_state(value, b[key]) for key, value in a.items())
+    if isinstance(a, list):
+        return len(a) == len(b) and all(same_state(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def class_name(cl):
+    return cl.__module__ + '.' + cl.__name__
+
 
 def transform_entity_to_json_dict(entity):
-    data = utils.transform_entity_to_json_dict(entity)
+    # flatten directly to JSON compatible python values, instead of encoding to and decoding from a JSON string
+    data = jsonpickle.pickler.Pickler(unpicklable=False).flatten(entity)
     if 'feature' in data and type(data['feature']) != dict:
         data['feature'] = json.loads(geojson.dumps(entity.feature))
     if 'location' in data and type(data['location']) != dict:
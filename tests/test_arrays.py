@@ -0,0 +1,81 @@
+import json
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import staplus_client as staplus
+
+
+class Response:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, data):
+        self.content = json.dumps(data).encode('utf-8')
+
+
+class Service(staplus.STAplusService):
+    def __init__(self, pages):
+        super().__init__('http://localhost:8080/v1.1')
+        self.pages = pages
+
+    def _send(self, method, url, **kwargs):
+        return Response(self.pages.pop(0))
+
+
+def observation(id, result, phenomenon_time='2023-01-01T00:00:00Z', **kwargs):
+    return dict({'@iot.id': id, 'phenomenonTime': phenomenon_time, 'result': result}, **kwargs)
+
+
+@unittest.skipIf(np is None, 'to_arrays requires numpy')
+class ToArraysTest(unittest.TestCase):
+    def to_arrays(self, *pages):
+        pages = [{'value': rows} for rows in pages]
+        for i, page in enumerate(pages[:-1]):
+            page['@iot.nextLink'] = 'http://localhost:8080/v1.1/Observations?$skip={}'.format(i + 1)
+        return Service(pages).observations().query().to_arrays()
+
+    def test_integer_results_are_int64(self):
+        arrays = self.to_arrays([observation(1, 21), observation(2, 22)], [observation(3, 23)])
+        self.assertEqual(arrays['id'].dtype, np.int64)
+        self.assertEqual(arrays['result'].dtype, np.int64)
+        self.assertEqual(arrays['result'].tolist(), [21, 22, 23])
+
+    def test_missing_numbers_are_nan(self):
+        arrays = self.to_arrays([observation(1, 21), observation(2, None), observation(3, 21.5)])
+        self.assertEqual(arrays['result'].dtype, np.float64)
+        self.assertTrue(np.isnan(arrays['result'][1]))
+        self.assertEqual(arrays['result'][2], 21.5)
+
+    def test_other_results_are_objects(self):
+        arrays = self.to_arrays([observation(1, 21), observation(2, 'high'), observation(3, True)])
+        self.assertEqual(arrays['result'].dtype, object)
+        self.assertEqual(arrays['result'].tolist(), [21, 'high', True])
+        self.assertEqual(arrays['parameters'].dtype, object)
+
+    def test_times_are_utc_datetime64(self):
+        arrays = self.to_arrays([
+            observation(1, 1, '2023-01-01T01:00:00+01:00', resultTime='2023-01-01T00:00:01Z'),
+            observation(2, 2, '2023-01-01T00:00:00Z/2023-01-01T00:10:00Z'),
+            observation(3, 3, None)])
+        self.assertEqual(arrays['phenomenon_time'].dtype, np.dtype('datetime64[us]'))
+        self.assertTrue((arrays['phenomenon_time'][:2] == np.datetime64('2023-01-01T00:00:00', 'us')).all())
+        self.assertTrue(np.isnat(arrays['phenomenon_time'][2]))
+        self.assertTrue(np.isnat(arrays['phenomenon_time_end'][0]))
+        self.assertEqual(arrays['phenomenon_time_end'][1], np.datetime64('2023-01-01T00:10:00', 'us'))
+        self.assertEqual(arrays['result_time'][0], np.datetime64('2023-01-01T00:00:01', 'us'))
+        self.assertTrue(np.isnat(arrays['result_time'][1]))
+
+    def test_data_array_pages(self):
+        arrays = self.to_arrays([{'components': ['id', 'phenomenonTime', 'result'], 'dataArray@iot.count': 2,
+                                  'dataArray': [[1, '2023-01-01T00:00:00Z', 1.5], [2, '2023-01-01T00:01:00Z', 2.5]]}])
+        self.assertEqual(arrays['id'].tolist(), [1, 2])
+        self.assertEqual(arrays['result'].dtype, np.float64)
+        self.assertTrue(np.isnat(arrays['result_time']).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
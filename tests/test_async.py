@@ -0,0 +1,191 @@
+import asyncio
+import re
+import unittest
+
+import requests
+
+try:
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+except ImportError:
+    web = None
+
+import staplus_client as staplus
+
+ENTITY = re.compile(r'^(\w+)\((\d+)\)$')
+
+
+class Server:
+    """
+    A SensorThings service with five Things in pages of two, a Sensor that is unavailable once, and Sensors that
+    can not be created
+    """
+    def __init__(self):
+        self.things = {id: {'@iot.id': id, 'name': 'thing ' + str(id), 'description': 'a thing'} for id in range(1, 6)}
+        self.requests = []
+        self.latency = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.unavailable = 1
+        app = web.Application()
+        app.router.add_route('*', '/v1.1/{path:.*}', self.handle)
+        self.server = TestServer(app)
+
+    @property
+    def url(self):
+        return str(self.server.make_url('/v1.1'))
+
+    async def handle(self, request):
+        body = await request.json() if request.can_read_body else None
+        self.requests.append((request.method, request.path_qs, body))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            return self.respond(request, request.match_info['path'])
+        finally:
+            self.in_flight -= 1
+
+    def respond(self, request, path):
+        if path == 'Things' and request.method == 'GET':
+            skip = int(request.query.get('$skip', 0))
+            ids = sorted(self.things)
+            page = {'value': [self.things[id] for id in ids[skip:skip + 2]]}
+            if request.query.get('$count', None) == 'true':
+                page['@iot.count'] = len(ids)
+            if skip + 2 < len(ids):
+                page['@iot.nextLink'] = self.url + '/Things?$skip=' + str(skip + 2)
+            return web.json_response(page)
+        if path == 'Things' and request.method == 'POST':
+            return web.Response(status=201, headers={'Location': self.url + '/Things(6)'})
+        if path == 'Sensors':
+            return web.json_response({'message': 'try again'}, status=503, headers={'Retry-After': '0'})
+        if path == 'Sensors(1)':
+            if self.unavailable > 0:
+                self.unavailable -= 1
+                return web.json_response({'message': 'try again'}, status=503, headers={'Retry-After': '0'})
+            return web.json_response({'@iot.id': 1, 'name': 'thermometer', 'description': 'a thermometer',
+                                      'encodingType': 'application/pdf', 'metadata': 'http://example.org/t.pdf'})
+        match = ENTITY.match(path)
+        if match is None or match.group(1) != 'Things' or int(match.group(2)) not in self.things:
+            return web.json_response({'message': 'not found'}, status=404)
+        if request.method == 'GET':
+            return web.json_response(self.things[int(match.group(2))])
+        return web.Response(status=200)
+
+
+@unittest.skipIf(web is None, 'AsyncSTAplusService requires aiohttp')
+class AsyncSTAplusServiceTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = Server()
+        await self.server.server.start_server()
+        self.service = staplus.AsyncSTAplusService(self.server.url)
+
+    async def asyncTearDown(self):
+        await self.service.close()
+        await self.server.server.close()
+
+    def sent(self):
+        return [(method, path) for method, path, _ in self.server.requests]
+
+    async def test_async_for_follows_the_next_links(self):
+        things = await self.service.things().query().list()
+        self.assertEqual([1, 2], [thing.id for thing in things.entities])
+        self.assertEqual([1, 2, 3, 4, 5], [thing.id async for thing in things])
+        self.assertEqual(5, len(things.entities))
+        self.assertTrue(all(thing.service is self.service for thing in things.entities))
+        self.assertEqual([('GET', '/v1.1/Things'), ('GET', '/v1.1/Things?$skip=2'), ('GET', '/v1.1/Things?$skip=4')],
+                         self.sent())
+
+    async def test_stream_keeps_only_the_current_page(self):
+        things = await self.service.things().query().stream()
+        self.assertEqual([1, 2, 3, 4, 5], [thing.id async for thing in things])
+        self.assertEqual([5], [thing.id for thing in things.entities])
+
+    async def test_plain_for_does_not_fetch_pages(self):
+        things = await self.service.things().query().list()
+        with self.assertRaises(TypeError):
+            list(things)
+
+    async def test_find(self):
+        thing = await self.service.things().find(3)
+        self.assertIsInstance(thing, staplus.Thing)
+        self.assertEqual('thing 3', thing.name)
+        self.assertIs(self.service, thing.service)
+        with self.assertRaises(requests.exceptions.HTTPError) as raised:
+            await self.service.things().find(9)
+        self.assertEqual(404, raised.exception.response.status_code)
+
+    async def test_create_update_patch_and_delete(self):
+        thing = staplus.Thing('boat', 'a boat')
+        self.assertEqual(6, await self.service.create(thing))
+        self.assertEqual(self.server.url + '/Things(6)', thing.self_link)
+        self.assertIs(self.service, thing.service)
+        thing = await self.service.things().find(2)
+        thing.name = 'sailing boat'
+        await self.service.update(thing)
+        await self.service.patch(thing, [{'op': 'replace', 'path': '/name', 'value': 'boat'}])
+        await self.service.delete(thing)
+        create, _, update, patch, delete = self.server.requests
+        self.assertEqual(('POST', '/v1.1/Things'), create[:2])
+        self.assertEqual('boat', create[2]['name'])
+        self.assertEqual(('PUT', '/v1.1/Things(2)'), update[:2])
+        self.assertEqual('sailing boat', update[2]['name'])
+        self.assertEqual(('PATCH', '/v1.1/Things(2)', [{'op': 'replace', 'path': '/name', 'value': 'boat'}]), patch)
+        self.assertEqual(('DELETE', '/v1.1/Things(2)'), delete[:2])
+
+    async def test_deep_insert_is_rejected(self):
+        with self.assertRaises(ValueError):
+            await self.service.create(staplus.Thing('boat', 'a boat'), deep=True)
+        self.assertEqual([], self.server.requests)
+
+    async def test_get_is_retried(self):
+        self.service.retry = staplus.RetryPolicy(retries=2, backoff_factor=0)
+        sensor = await self.service.sensors().find(1)
+        self.assertEqual('thermometer', sensor.name)
+        self.assertEqual([('GET', '/v1.1/Sensors(1)')] * 2, self.sent())
+
+    async def test_get_is_not_retried_without_retry_policy(self):
+        with self.assertRaises(requests.exceptions.HTTPError):
+            await self.service.sensors().find(1)
+        self.assertEqual(1, len(self.server.requests))
+
+    async def test_post_is_not_retried(self):
+        self.service.retry = staplus.RetryPolicy(retries=2, backoff_factor=0)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            await self.service.create(staplus.Sensor(name='thermometer', description='a thermometer'))
+        self.assertEqual([('POST', '/v1.1/Sensors')], self.sent())
+
+    async def test_limiter_bounds_the_requests_in_flight(self):
+        self.server.latency = 0.02
+        self.service.limiter = staplus.RateLimiter(max_in_flight=2)
+        things = await asyncio.gather(*[self.service.things().find(id) for id in range(1, 6)])
+        self.assertEqual([1, 2, 3, 4, 5], [thing.id for thing in things])
+        self.assertEqual(2, self.server.max_in_flight)
+
+    async def test_requests_are_concurrent_without_limiter(self):
+        self.server.latency = 0.02
+        await asyncio.gather(*[self.service.things().find(id) for id in range(1, 6)])
+        self.assertEqual(5, self.server.max_in_flight)
+
+    async def test_find_reads_through_the_cache(self):
+        self.service.cache = staplus.EntityCache(ttl=60)
+        thing = await self.service.things().find(3)
+        self.assertIs(thing, await self.service.things().find(3))
+        await self.service.update(thing)
+        self.assertIsNot(thing, await self.service.things().find(3))
+        self.assertEqual(['GET', 'PUT', 'GET'], [method for method, _ in self.sent()])
+
+    async def test_identity_map_keeps_one_instance_per_entity(self):
+        self.service.identity_map = staplus.IdentityMap()
+        thing = await self.service.things().find(1)
+        things = await self.service.things().query().list()
+        self.assertIs(thing, things.entities[0])
+
+    async def test_fetch_all(self):
+        things = await self.service.things().query().fetch_all(parallelism=2)
+        self.assertEqual([1, 2, 3, 4, 5], [thing.id for thing in things.entities])
+
+
+if __name__ == '__main__':
+    unittest.main()
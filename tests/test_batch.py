@@ -0,0 +1,60 @@
+import json
+import unittest
+
+import staplus_client as staplus
+from staplus_client.service.batch import Batch, BatchError
+
+
+class Response:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, data):
+        self.content = json.dumps(data).encode('utf-8')
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.service = staplus.STAplusService('http://localhost:8080/v1.1')
+        self.batch = Batch(self.service)
+
+    def test_update_of_created_entity_sends_its_properties(self):
+        thing = staplus.Thing('boat', 'the boat of LJS')
+        self.batch.create(thing)
+        thing.name = 'sailing boat'
+        self.batch.update(thing)
+        request = self.batch.requests[1][0]
+        self.assertEqual(request['url'], '$1')
+        self.assertEqual(request['body']['name'], 'sailing boat')
+        self.assertEqual(request['body']['description'], 'the boat of LJS')
+        self.assertNotIn('@iot.id', request['body'])
+
+    def test_requests_using_content_ids_depend_on_them(self):
+        party = staplus.Party(display_name='LJS', role='individual')
+        self.batch.create(party)
+        thing = staplus.Thing('boat', 'the boat of LJS', party=party)
+        self.batch.create(thing)
+        self.batch.delete(thing)
+        create_party, create_thing, delete_thing = [request for request, _ in self.batch.requests]
+        self.assertNotIn('dependsOn', create_party)
+        self.assertEqual(create_thing['body']['Party'], {'@iot.id': '$1'})
+        self.assertEqual(create_thing['dependsOn'], ['1'])
+        self.assertEqual(delete_thing['dependsOn'], ['2'])
+
+    def test_created_entity_without_location_is_an_error(self):
+        things = [staplus.Thing('boat', 'd'), staplus.Thing('ship', 'd')]
+        for thing in things:
+            self.batch.create(thing)
+        location = 'http://localhost:8080/v1.1/Things(7)'
+        self.service.execute = lambda method, url, **kwargs: Response({'responses': [
+            {'id': '1', 'status': 201, 'headers': {}},
+            {'id': '2', 'status': 201, 'headers': {'Location': location}}]})
+        with self.assertRaises(BatchError) as raised:
+            self.batch.send()
+        self.assertEqual([(entity, status) for entity, status, _ in raised.exception.errors], [(things[0], 201)])
+        self.assertIsNone(things[0].id)
+        self.assertEqual((things[1].id, things[1].self_link), (7, location))
+
+
+if __name__ == '__main__':
+    unittest.main()
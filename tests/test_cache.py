@@ -0,0 +1,155 @@
+import json
+import unittest
+
+import requests
+
+import staplus_client as staplus
+import staplus_client.utils
+from staplus_client.service.batch import Batch
+from staplus_client.service.cache import EntityCache, ResponseCache
+
+
+class Response:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.headers = {}
+        self.content = json.dumps(data).encode('utf-8') if data is not None else b''
+        self.text = self.content.decode('utf-8')
+        self.reason = 'Not Found' if status_code == 404 else 'OK'
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(response=self)
+
+
+class Service(staplus.STAplusService):
+    def __init__(self, responses):
+        super().__init__('http://localhost:8080/v1.1', cache=EntityCache(ttl=60))
+        self.responses = responses
+        self.sent = []
+
+    def _send(self, method, url, **kwargs):
+        self.sent.append((method, str(url)))
+        return self.responses.pop(0)
+
+
+class EntityCacheTest(unittest.TestCase):
+    def cached_thing(self, service):
+        thing = staplus_client.utils.transform_json_to_entity({'@iot.id': 5, 'name': 'boat', 'description': 'd'},
+                                                              'staplus_client.model.thing.Thing')
+        service.cache.put('Thing', 5, thing)
+        return thing
+
+    def test_dao_update_invalidates_when_it_succeeded(self):
+        service = Service([Response(200)])
+        thing = self.cached_thing(service)
+        service.things().update(thing)
+        self.assertIsNone(service.cache.get('Thing', 5))
+
+    def test_failed_update_keeps_the_cached_entity(self):
+        service = Service([Response(404)])
+        thing = self.cached_thing(service)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            service.things().update(thing)
+        self.assertIs(service.cache.get('Thing', 5), thing)
+
+    def test_batch_invalidates_when_the_response_is_processed(self):
+        service = Service([Response(200, {'responses': [{'id': '1', 'status': 200}]})])
+        thing = self.cached_thing(service)
+        batch = Batch(service)
+        batch.update(thing)
+        self.assertIs(service.cache.get('Thing', 5), thing)
+        batch.send()
+        self.assertIsNone(service.cache.get('Thing', 5))
+
+    def test_invalidate_removes_the_entries_by_id_and_by_url(self):
+        cache = EntityCache(ttl=60, maxsize=3)
+        things = [staplus_client.utils.transform_json_to_entity({'@iot.id': i, 'name': 'boat', 'description': 'd'},
+                                                                'staplus_client.model.thing.Thing') for i in range(3)]
+        cache.put('Thing', 0, things[0])
+        cache.put('Thing', 'http://localhost/Things(0)?$select=name', things[0])
+        cache.put('Thing', 1, things[1])
+        cache.put('Thing', 2, things[2])
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get('Thing', 0))
+        reference = staplus_client.utils.transform_json_to_entity({'@iot.id': 0}, 'staplus_client.model.thing.Thing')
+        cache.invalidate(reference)
+        self.assertIsNone(cache.get('Thing', 'http://localhost/Things(0)?$select=name'))
+        cache.invalidate(things[1])
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache._keys, {(type(things[2]), 2): {('Thing', 2)}})
+
+
+class ConditionalService(staplus.STAplusService):
+    """
+    A service with two pages of Things; a page has the ETag of its version and answers 304 Not Modified to a
+    request that has it
+    """
+    def __init__(self, validator='ETag'):
+        super().__init__('http://localhost:8080/v1.1', response_cache=ResponseCache())
+        self.validator = validator
+        self.version = 1
+        self.sent = []
+
+    def _send(self, method, url, headers=None, **kwargs):
+        self.sent.append((str(url), headers))
+        etag = 'W/"{}"'.format(self.version)
+        if headers is not None and headers.get('If-None-Match', None) == etag:
+            return Response(304)
+        page = 2 if '$skip=2' in str(url) else 1
+        data = {'value': [{'@iot.id': page * 2 - i, 'name': 'boat', 'description': 'd'} for i in (1, 0)]}
+        if page == 1:
+            data['@iot.nextLink'] = 'http://localhost:8080/v1.1/Things?$skip=2'
+        response = Response(200, data)
+        if self.validator is not None:
+            response.headers = {self.validator: etag if self.validator == 'ETag' else 'Sat, 01 Jul 2023 00:00:00 GMT'}
+        return response
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def test_not_modified_page_reuses_the_decoded_entities(self):
+        service = ConditionalService()
+        first = service.things().query().list()
+        second = service.things().query().list()
+        self.assertIsNone(service.sent[0][1])
+        self.assertEqual(service.sent[1][1], {'If-None-Match': 'W/"1"'})
+        self.assertEqual((service.response_cache.hits, service.response_cache.misses), (1, 1))
+        self.assertIs(second.entities[0], first.entities[0])
+
+    def test_every_caller_gets_a_list_of_its_own(self):
+        service = ConditionalService()
+        first = service.things().query().list()
+        self.assertEqual([thing.id for thing in first], [1, 2, 3, 4])
+        second = service.things().query().list()
+        self.assertIsNot(second, first)
+        self.assertEqual([thing.id for thing in second.entities], [1, 2])
+        self.assertEqual(second.next_link, 'http://localhost:8080/v1.1/Things?$skip=2')
+        self.assertEqual([thing.id for thing in second], [1, 2, 3, 4])
+        self.assertEqual([thing.id for thing in first.entities], [1, 2, 3, 4])
+
+    def test_modified_page_is_decoded_again(self):
+        service = ConditionalService()
+        first = service.things().query().list()
+        service.version = 2
+        second = service.things().query().list()
+        self.assertEqual((service.response_cache.hits, service.response_cache.misses), (0, 2))
+        self.assertIsNot(second.entities[0], first.entities[0])
+        third = service.things().query().list()
+        self.assertIs(third.entities[0], second.entities[0])
+
+    def test_last_modified_is_sent_as_if_modified_since(self):
+        service = ConditionalService(validator='Last-Modified')
+        service.things().query().list()
+        service.things().query().list()
+        self.assertEqual(service.sent[1][1], {'If-Modified-Since': 'Sat, 01 Jul 2023 00:00:00 GMT'})
+
+    def test_responses_without_validator_are_not_kept(self):
+        service = ConditionalService(validator=None)
+        service.things().query().list()
+        service.things().query().list()
+        self.assertEqual(len(service.response_cache), 0)
+        self.assertIsNone(service.sent[1][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
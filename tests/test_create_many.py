@@ -0,0 +1,106 @@
+import json
+import unittest
+
+import requests
+
+import staplus_client as staplus
+
+
+class Response:
+    headers = {}
+    reason = 'Bad Request'
+
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.content = json.dumps(data).encode('utf-8')
+        self.text = self.content.decode('utf-8')
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(response=self)
+
+
+class Service(staplus.STAplusService):
+    """
+    A service that creates every Observation of CreateObservations as Observation 100 + result, except those with
+    a negative result
+    """
+    def __init__(self, status_code=201):
+        super().__init__('http://localhost:8080/v1.1')
+        self.status_code = status_code
+        self.sent = []
+
+    def _send(self, method, url, **kwargs):
+        self.sent.append((method, str(url), kwargs['json']))
+        links = []
+        for group in kwargs['json']:
+            result = group['components'].index('result')
+            for row in group['dataArray']:
+                if row[result] < 0:
+                    links.append('error: result must not be negative')
+                else:
+                    links.append('http://localhost:8080/v1.1/Observations({})'.format(100 + row[result]))
+        return Response(self.status_code, links if self.status_code < 400 else {'message': 'no such Datastream'})
+
+
+def observation(result, datastream, feature_of_interest=None):
+    return staplus.Observation('2023-01-01T00:00:00Z', result, datastream=staplus.Datastream(id=datastream),
+                               feature_of_interest=feature_of_interest)
+
+
+class CreateManyTest(unittest.TestCase):
+    def test_ids_are_mapped_to_the_observations_across_datastreams(self):
+        service = Service()
+        observations = [observation(1, 7), observation(2, 8), observation(3, 7), observation(4, 8)]
+        ids = service.observations().create_many(observations)
+        self.assertEqual(len(service.sent), 1)
+        method, url, body = service.sent[0]
+        self.assertEqual((method, url), ('post', 'http://localhost:8080/v1.1/CreateObservations'))
+        self.assertEqual([(group['Datastream']['@iot.id'], group['dataArray@iot.count']) for group in body],
+                         [(7, 2), (8, 2)])
+        self.assertEqual(ids, [101, 102, 103, 104])
+        self.assertEqual([o.id for o in observations], [101, 102, 103, 104])
+        self.assertEqual(observations[1].self_link, 'http://localhost:8080/v1.1/Observations(102)')
+        self.assertIs(observations[1].service, service)
+
+    def test_rejected_rows_get_no_id(self):
+        observations = [observation(1, 7), observation(-2, 8), observation(3, 7), observation(-4, 7)]
+        ids = Service().observations().create_many(observations)
+        self.assertEqual(ids, [101, None, 103, None])
+        self.assertIsNone(observations[1].id)
+        self.assertFalse(observations[3].self_link)
+
+    def test_one_request_per_chunk(self):
+        service = Service()
+        observations = [observation(i, 7 + i % 2) for i in range(5)]
+        ids = service.observations().create_many(observations, chunk_size=2)
+        self.assertEqual(len(service.sent), 3)
+        self.assertEqual([sum(group['dataArray@iot.count'] for group in body) for _, _, body in service.sent],
+                         [2, 2, 1])
+        self.assertEqual(ids, [100, 101, 102, 103, 104])
+
+    def test_feature_of_interest_is_sent_by_id(self):
+        service = Service()
+        service.observations().create_many([observation(1, 7, staplus.FeatureOfInterest(id=3))])
+        group = service.sent[0][2][0]
+        self.assertEqual(group['components'], ['phenomenonTime', 'result', 'FeatureOfInterest/id'])
+        self.assertEqual(group['dataArray'], [['2023-01-01T00:00:00+00:00', 1, 3]])
+
+    def test_observations_without_ids_are_rejected(self):
+        dao = Service().observations()
+        with self.assertRaises(ValueError):
+            dao.create_many([staplus.Observation('2023-01-01T00:00:00Z', 1, datastream=staplus.Datastream())])
+        with self.assertRaises(ValueError):
+            dao.create_many([observation(1, 7, staplus.FeatureOfInterest(name='f', description='d'))])
+        with self.assertRaises(ValueError):
+            dao.create_many([observation(1, 7)], chunk_size=0)
+
+    def test_failed_request_raises(self):
+        observations = [observation(1, 7)]
+        with self.assertRaises(requests.exceptions.HTTPError):
+            Service(status_code=400).observations().create_many(observations)
+        self.assertIsNone(observations[0].id)
+
+
+if __name__ == '__main__':
+    unittest.main()
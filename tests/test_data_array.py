@@ -0,0 +1,76 @@
+import json
+import unittest
+
+from furl import furl
+
+import staplus_client as staplus
+import staplus_client.utils
+
+
+class Response:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, data):
+        self.content = json.dumps(data).encode('utf-8')
+
+
+class Service(staplus.STAplusService):
+    def __init__(self, pages):
+        super().__init__('http://localhost:8080/v1.1')
+        self.pages = pages
+        self.sent = []
+
+    def _send(self, method, url, **kwargs):
+        self.sent.append(str(url))
+        return Response(self.pages.pop(0))
+
+
+def group(datastream, rows):
+    return {'Datastream@iot.navigationLink': 'http://localhost:8080/v1.1/Datastreams({})'.format(datastream),
+            'components': ['id', 'phenomenonTime', 'result', 'FeatureOfInterest/id'],
+            'dataArray@iot.count': len(rows), 'dataArray': rows}
+
+
+def pages():
+    return [{'value': [group(7, [[1, '2023-01-01T00:00:00Z', 21.5, 3], [2, '2023-01-01T00:01:00Z', 22, 3]]),
+                       group(8, [[3, '2023-01-01T00:00:00Z', 'high', 4]])],
+             '@iot.nextLink': 'http://localhost:8080/v1.1/Observations?$resultFormat=dataArray&$skip=3'},
+            {'value': [group(7, [[4, '2023-01-01T00:02:00Z', 23, 3]])]}]
+
+
+class DataArrayTest(unittest.TestCase):
+    def test_rows_are_expanded_with_their_relations(self):
+        rows = staplus_client.utils.transform_data_array_to_json(pages()[0]['value'])
+        self.assertEqual(rows, [
+            {'@iot.id': 1, 'phenomenonTime': '2023-01-01T00:00:00Z', 'result': 21.5,
+             'FeatureOfInterest': {'@iot.id': 3}, 'Datastream': {'@iot.id': 7}},
+            {'@iot.id': 2, 'phenomenonTime': '2023-01-01T00:01:00Z', 'result': 22,
+             'FeatureOfInterest': {'@iot.id': 3}, 'Datastream': {'@iot.id': 7}},
+            {'@iot.id': 3, 'phenomenonTime': '2023-01-01T00:00:00Z', 'result': 'high',
+             'FeatureOfInterest': {'@iot.id': 4}, 'Datastream': {'@iot.id': 8}}])
+
+    def test_list_decodes_the_pages_into_observations(self):
+        service = Service(pages())
+        observations = list(service.observations().query().result_format('dataArray').list())
+        self.assertEqual(furl(service.sent[0]).args['$resultFormat'], 'dataArray')
+        self.assertEqual(len(service.sent), 2)
+        self.assertEqual([observation.id for observation in observations], [1, 2, 3, 4])
+        self.assertTrue(all(isinstance(observation, staplus.Observation) for observation in observations))
+        self.assertEqual([observation.result for observation in observations], [21.5, 22, 'high', 23])
+        self.assertEqual([observation.datastream.id for observation in observations], [7, 7, 8, 7])
+        self.assertEqual([observation.feature_of_interest.id for observation in observations], [3, 3, 4, 3])
+
+    def test_records_decode_the_pages(self):
+        records = Service(pages()).observations().query().result_format('dataArray').records()
+        self.assertEqual([record.id for record in records], [1, 2, 3, 4])
+        self.assertEqual([record.datastream_id for record in records], [7, 7, 8, 7])
+        self.assertEqual(records[2].result, 'high')
+
+    def test_result_format_replaces_the_parameter(self):
+        query = Service([]).observations().query().result_format('default').result_format('dataArray')
+        self.assertEqual(query.params['$resultFormat'], 'dataArray')
+
+
+if __name__ == '__main__':
+    unittest.main()
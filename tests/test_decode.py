@@ -0,0 +1,195 @@
+import unittest
+
+import staplus_client.utils
+from staplus_client.model.ext.entity_type import EntityTypes
+from frost_sta_client.model.entity import Entity
+from frost_sta_client.model.ext.entity_list import EntityList as STAEntityList
+
+LINK = 'http://localhost:8080/v1.1/'
+PERIOD = '2023-01-01T00:00:00Z/2023-01-02T00:00:00Z'
+INSTANT = '2023-01-01T12:00:00Z'
+POINT = {'type': 'Point', 'coordinates': [11.5, 48.1]}
+UNIT = {'name': 'degree Celsius', 'symbol': 'degC', 'definition': 'http://unitsofmeasure.org/ucum.html#para-30'}
+
+# the JSON of each entity type with all of its properties, as the service returns it
+PROPERTIES = {
+    'Datastream': {'name': 'air temperature', 'description': 'the air temperature', 'unitOfMeasurement': UNIT,
+                   'observationType': 'http://www.opengis.net/def/observationType/OGC-OM/2.0/OM_Measurement',
+                   'observedArea': POINT, 'phenomenonTime': PERIOD, 'resultTime': PERIOD,
+                   'properties': {'height': 2}},
+    'MultiDatastream': {'name': 'wind', 'description': 'speed and direction', 'unitOfMeasurements': [UNIT, UNIT],
+                        'observationType': 'http://www.opengis.net/def/observationType/OGC-OM/2.0/'
+                                           'OM_ComplexObservation',
+                        'multiObservationDataTypes': ['http://www.opengis.net/def/observationType/OGC-OM/2.0/'
+                                                      'OM_Measurement'] * 2,
+                        'phenomenonTime': PERIOD, 'properties': {}},
+    'FeatureOfInterest': {'name': 'garden', 'description': 'the garden', 'encodingType': 'application/geo+json',
+                          'feature': POINT, 'properties': {'area': 12}},
+    'HistoricalLocation': {'time': INSTANT},
+    'Actuator': {'name': 'switch', 'description': 'a switch', 'encodingType': 'application/pdf',
+                 'metadata': 'http://example.org/switch.pdf', 'properties': {}},
+    'Location': {'name': 'garden', 'description': 'the garden', 'encodingType': 'application/geo+json',
+                 'location': POINT, 'properties': {}},
+    'Observation': {'phenomenonTime': INSTANT, 'resultTime': INSTANT, 'result': 21.5, 'resultQuality': 'good',
+                    'validTime': PERIOD, 'parameters': {'sky': 'clear'}},
+    'Thing': {'name': 'weather station', 'description': 'a weather station', 'properties': {'owner': 'me'}},
+    'ObservedProperty': {'name': 'temperature', 'definition': 'http://example.org/temperature',
+                         'description': 'the temperature', 'properties': {}},
+    'Sensor': {'name': 'thermometer', 'description': 'a thermometer', 'encodingType': 'application/pdf',
+               'metadata': 'http://example.org/thermometer.pdf', 'properties': {}},
+    'Task': {'creationTime': INSTANT, 'taskingParameters': {'on': True}},
+    'TaskingCapability': {'name': 'switching', 'description': 'switch on and off',
+                          'taskingParameters': {'type': 'DataRecord', 'field': []}, 'properties': {}},
+    'Party': {'authId': 'a0b1c2', 'displayName': 'Alice', 'description': 'a citizen scientist',
+              'role': 'individual'},
+    'License': {'name': 'CC BY 3.0', 'definition': 'https://creativecommons.org/licenses/by/3.0/deed.en',
+                'description': 'the Creative Commons Attribution 3.0 License', 'logo': 'https://example.org/by.png',
+                'attributionText': 'by Alice'},
+    'Campaign': {'name': 'summer', 'description': 'the summer campaign', 'classification': 'public',
+                 'termsOfUse': 'none', 'privacyPolicy': 'none', 'creationTime': INSTANT, 'startTime': INSTANT,
+                 'endTime': INSTANT, 'url': 'http://example.org/summer', 'properties': {}},
+    'ObservationGroup': {'name': 'run', 'description': 'the first run', 'purpose': 'testing',
+                         'creationTime': INSTANT, 'endTime': INSTANT, 'termsOfUse': 'none', 'privacyPolicy': 'none',
+                         'dataQuality': {'accuracy': 0.1}, 'properties': {}},
+    'Relation': {'role': 'http://example.org/isPartOf', 'description': 'a part of',
+                 'externalResource': 'http://example.org/whole', 'properties': {}},
+}
+
+# an expanded relation to one entity and an expanded relation to many entities of each entity type
+EXPANDED = {
+    'Datastream': ('Thing', 'Observations'),
+    'MultiDatastream': ('Sensor', 'ObservedProperties'),
+    'FeatureOfInterest': (None, 'Observations'),
+    'HistoricalLocation': ('Thing', 'Locations'),
+    'Actuator': (None, 'TaskingCapabilities'),
+    'Location': (None, 'Things'),
+    'Observation': ('Datastream', 'ObservationGroups'),
+    'Thing': ('Party', 'Datastreams'),
+    'ObservedProperty': (None, 'Datastreams'),
+    'Sensor': (None, 'Datastreams'),
+    'TaskingCapability': ('Actuator', None),
+    'Party': (None, 'Things'),
+    'License': (None, 'Campaigns'),
+    'Campaign': ('License', 'ObservationGroups'),
+    'ObservationGroup': ('Party', 'Relations'),
+    'Relation': (None, 'ObservationGroups'),
+}
+
+# the entity type of the relations that are not named after it
+RELATED_TYPES = {'Subject': 'Observation', 'Object': 'Observation', 'ObservedProperties': 'ObservedProperty',
+                 'Locations': 'Location', 'Things': 'Thing', 'Datastreams': 'Datastream',
+                 'Observations': 'Observation', 'ObservationGroups': 'ObservationGroup', 'Campaigns': 'Campaign',
+                 'Relations': 'Relation', 'TaskingCapabilities': 'TaskingCapability'}
+
+
+def entity_json(name, id):
+    path = EntityTypes[name]['plural'] + '(' + str(id) + ')'
+    return dict({'@iot.id': id, '@iot.selfLink': LINK + path}, **PROPERTIES[name])
+
+
+def shapes(name):
+    """
+    The JSON of an entity type in the shapes the service returns
+    """
+    full = entity_json(name, 1)
+    full[next(iter(EntityTypes[name]['relations_list'])) + '@iot.navigationLink'] = full['@iot.selfLink'] + '/x'
+    selected = {key: value for key, value in full.items() if key in ('@iot.id', 'name', 'description', 'result')}
+    reference = {'@iot.id': 2, '@iot.selfLink': full['@iot.selfLink']}
+    expanded = entity_json(name, 3)
+    one, many = EXPANDED[name]
+    if one is not None:
+        expanded[one] = entity_json(RELATED_TYPES.get(one, one), 4)
+    if many is not None:
+        related = RELATED_TYPES.get(many, many)
+        expanded[many] = [entity_json(related, 5), entity_json(related, 6)]
+        expanded[many + '@iot.count'] = 3
+        expanded[many + '@iot.nextLink'] = LINK + many + '?$skip=2'
+    return {'full': full, '$select': selected, 'reference': reference, 'expanded': expanded}
+
+
+def reference_entity(json_response, entity_class):
+    entity = staplus_client.utils.class_from_string(entity_class)()
+    entity.__setstate__(json_response)
+    return entity
+
+
+def state(value):
+    """
+    The attributes of a decoded value, with the entities of lazy entity lists decoded
+    """
+    if isinstance(value, STAEntityList):
+        return ('list', value.entity_class, value.next_link, value.count, [state(x) for x in value.entities])
+    if isinstance(value, Entity):
+        return (type(value), {key: state(x) for key, x in value.__dict__.items()})
+    if isinstance(value, dict):
+        return {key: state(x) for key, x in value.items()}
+    if isinstance(value, list):
+        return [state(x) for x in value]
+    return value
+
+
+class TrustedDecodeTest(unittest.TestCase):
+    def setUp(self):
+        staplus_client.utils._decode_plans.clear()
+
+    def tearDown(self):
+        staplus_client.utils.decode_plans_maxsize = 1000
+
+    def test_trusted_decode_equals_setstate_for_every_entity_type(self):
+        for name in PROPERTIES:
+            if name == 'Task':
+                continue
+            entity_class = EntityTypes[name]['class']
+            for shape, json_response in shapes(name).items():
+                with self.subTest(entity_type=name, shape=shape):
+                    expected = state(reference_entity(json_response, entity_class))
+                    learned = staplus_client.utils.transform_json_to_trusted_entity(json_response, entity_class)
+                    planned = staplus_client.utils.transform_json_to_trusted_entity(json_response, entity_class)
+                    self.assertEqual(expected, state(learned))
+                    self.assertEqual(expected, state(planned))
+
+    def test_plan_decodes_other_values_of_the_same_shape(self):
+        entity_class = EntityTypes['Observation']['class']
+        first, second = shapes('Observation')['expanded'], entity_json('Observation', 7)
+        second.update(result=3, parameters={'sky': 'cloudy'})
+        second['Datastream'] = entity_json('Datastream', 8)
+        second['Datastream']['unitOfMeasurement'] = {'name': 'kelvin', 'symbol': 'K', 'definition': 'http://k'}
+        second['ObservationGroups'] = [dict(entity_json('ObservationGroup', 9), name='second run')]
+        second['ObservationGroups@iot.count'] = 1
+        second['ObservationGroups@iot.nextLink'] = LINK + 'ObservationGroups?$skip=1'
+        staplus_client.utils.transform_json_to_trusted_entity(first, entity_class)
+        plans = [plan for (name, _, _), (_, plan) in staplus_client.utils._decode_plans.items() if name == entity_class]
+        self.assertIsNotNone(plans[0])
+        planned = staplus_client.utils.transform_json_to_trusted_entity(second, entity_class)
+        self.assertEqual(state(reference_entity(second, entity_class)), state(planned))
+        self.assertEqual('K', planned.datastream.unit_of_measurement.symbol)
+        self.assertEqual('second run', planned.observation_groups.entities[0].name)
+
+    def test_task_cannot_be_decoded_in_either_way(self):
+        # the default constructor of Task rejects its own default tasking parameters
+        with self.assertRaises(ValueError):
+            reference_entity(PROPERTIES['Task'], EntityTypes['Task']['class'])
+        with self.assertRaises(ValueError):
+            staplus_client.utils.transform_json_to_trusted_entity(PROPERTIES['Task'], EntityTypes['Task']['class'])
+
+    def test_plans_are_bounded(self):
+        staplus_client.utils.decode_plans_maxsize = 3
+        entity_class = EntityTypes['Thing']['class']
+        for key in ('name', 'description', 'properties', '@iot.selfLink', '@iot.id'):
+            json_response = entity_json('Thing', 1)
+            del json_response[key]
+            staplus_client.utils.transform_json_to_trusted_entity(json_response, entity_class)
+        missing = [set(entity_json('Thing', 1)) - set(keys) for _, keys, _ in staplus_client.utils._decode_plans]
+        self.assertEqual([{'properties'}, {'@iot.selfLink'}, {'@iot.id'}], missing)
+
+    def test_no_plans_are_kept_with_maxsize_zero(self):
+        staplus_client.utils.decode_plans_maxsize = 0
+        json_response = shapes('Thing')['expanded']
+        entity_class = EntityTypes['Thing']['class']
+        entity = staplus_client.utils.transform_json_to_trusted_entity(json_response, entity_class)
+        self.assertEqual(state(reference_entity(json_response, entity_class)), state(entity))
+        self.assertEqual({}, staplus_client.utils._decode_plans)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import json
+import re
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from furl import furl
+
+import staplus_client as staplus
+from staplus_client.model.ext import dedupe
+from staplus_client.model.ext.entity_list import EntityList
+
+FILTER = re.compile(r'^phenomenonTime ge (\S+) and phenomenonTime le (\S+)$')
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+class Response:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, data):
+        self.content = json.dumps(data).encode('utf-8')
+
+
+class Service(staplus.STAplusService):
+    """
+    A service that has the Observations of rows by Datastream id and answers the time range filter of present()
+    """
+    def __init__(self, rows):
+        super().__init__('http://localhost:8080/v1.1')
+        self.rows = rows
+        self.sent = []
+
+    def _send(self, method, url, **kwargs):
+        url = furl(str(url))
+        self.sent.append((str(url.path), url.args['$filter']))
+        datastream = int(re.search(r'Datastreams\((\d+)\)', str(url.path)).group(1))
+        start, end = (datetime.fromisoformat(time) for time in FILTER.match(url.args['$filter']).groups())
+        return Response({'value': [row for row in self.rows.get(datastream, [])
+                                   if start <= datetime.fromisoformat(row['phenomenonTime']) <= end]})
+
+
+def minute(i):
+    return (START + timedelta(minutes=i)).isoformat().replace('+00:00', 'Z')
+
+
+def observation(datastream, i, result=None, **kwargs):
+    return staplus.Observation(minute(i), i if result is None else result, datastream=staplus.Datastream(id=datastream),
+                               **kwargs)
+
+
+class ContentHashTest(unittest.TestCase):
+    def test_the_hash_is_the_same_in_every_process(self):
+        # stored hashes must stay valid, this is the blake2b of the canonical JSON of the content
+        hash = dedupe.content_hash(observation(1, 0, 21.5, parameters={'unit': 'C'}))
+        self.assertEqual(hash, '54e1cfb470b414730491d0f0d838b4c5')
+
+    def test_equal_content_has_the_same_hash(self):
+        hash = observation(1, 0, 21, parameters={'a': 1, 'b': [2.0]}).content_hash()
+        self.assertEqual(observation(1, 0, 21.0, parameters={'b': [2], 'a': 1.0}).content_hash(), hash)
+        same_time = staplus.Observation('2023-01-01T01:00:00+01:00', 21, datastream=staplus.Datastream(id=1),
+                                        parameters={'a': 1, 'b': [2]})
+        self.assertEqual(same_time.content_hash(), hash)
+        with_id = observation(1, 0, 21, parameters={'a': 1, 'b': [2]})
+        with_id.id = 5
+        self.assertEqual(with_id.content_hash(), hash)
+
+    def test_other_content_has_another_hash(self):
+        hash = observation(1, 0).content_hash()
+        self.assertNotEqual(observation(2, 0).content_hash(), hash)
+        self.assertNotEqual(observation(1, 1, 0).content_hash(), hash)
+        self.assertNotEqual(observation(1, 0, 1).content_hash(), hash)
+        self.assertNotEqual(observation(1, 0, parameters={'a': 1}).content_hash(), hash)
+        self.assertNotEqual(staplus.Observation(minute(0), 0, multi_datastream=staplus.MultiDatastream(id=1))
+                            .content_hash(), hash)
+
+    def test_the_stream_is_used_for_observations_without_one(self):
+        without = staplus.Observation(minute(0), 0)
+        self.assertEqual(dedupe.content_hash(without, ('Datastream', 1)), observation(1, 0).content_hash())
+
+
+class PresentTest(unittest.TestCase):
+    def test_one_request_per_batch_and_datastream(self):
+        service = Service({1: [{'@iot.id': i, 'phenomenonTime': minute(i), 'result': i} for i in range(0, 250, 2)],
+                           2: [{'@iot.id': 1000, 'phenomenonTime': minute(3), 'result': 3}]})
+        observations = [observation(1, i) for i in reversed(range(250))] + [observation(2, 3), observation(2, 4)]
+        hashes = dedupe.present(service, observations, batch_size=100)
+        self.assertEqual(service.sent, [
+            ('/v1.1/Datastreams(1)/Observations',
+             'phenomenonTime ge {} and phenomenonTime le {}'.format(minute(0), minute(99))),
+            ('/v1.1/Datastreams(1)/Observations',
+             'phenomenonTime ge {} and phenomenonTime le {}'.format(minute(100), minute(199))),
+            ('/v1.1/Datastreams(1)/Observations',
+             'phenomenonTime ge {} and phenomenonTime le {}'.format(minute(200), minute(249))),
+            ('/v1.1/Datastreams(2)/Observations',
+             'phenomenonTime ge {} and phenomenonTime le {}'.format(minute(3), minute(4)))])
+        expected = {o.content_hash() for o in observations if o.datastream.id == 2 and o.result == 3 or
+                    o.datastream.id == 1 and o.result % 2 == 0}
+        self.assertEqual(hashes, expected)
+
+    def test_observations_without_datastream_or_time_are_not_looked_up(self):
+        service = Service({})
+        self.assertEqual(dedupe.present(service, [staplus.Observation(minute(0), 0)]), set())
+        self.assertEqual(service.sent, [])
+        with self.assertRaises(ValueError):
+            dedupe.present(service, [observation(1, 0)], batch_size=0)
+
+    def test_dedupe_leaves_out_duplicates_and_present_observations(self):
+        service = Service({1: [{'@iot.id': 1, 'phenomenonTime': minute(1), 'result': 1}]})
+        entity_list = EntityList('staplus_client.model.observation.Observation',
+                                 [observation(1, 0), observation(1, 1), observation(1, 0, 0.0), observation(1, 2)])
+        self.assertEqual([o.result for o in entity_list.dedupe()], [0, 1, 2])
+        self.assertEqual([o.result for o in entity_list.dedupe(service=service)], [0, 2])
+        self.assertEqual(len(service.sent), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import json
+import unittest
+
+import staplus_client as staplus
+import staplus_client.utils
+from frost_sta_client.model.ext.unitofmeasurement import UnitOfMeasurement
+from staplus_client.dao import deep_insert
+
+
+def linked(data):
+    # the service returns the self link of every entity
+    if isinstance(data, list):
+        return [linked(value) for value in data]
+    if not isinstance(data, dict):
+        return data
+    data = {key: linked(value) for key, value in data.items()}
+    if '@iot.id' in data:
+        data['@iot.selfLink'] = 'http://localhost:8080/v1.1/Entities({})'.format(data['@iot.id'])
+    return data
+
+
+class Response:
+    def __init__(self, data):
+        self.text = json.dumps(data)
+        self.content = self.text.encode('utf-8')
+        self.headers = {'Content-Type': 'application/json'}
+        self.status_code = 200
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class Service(staplus.STAplusService):
+    def __init__(self, pages):
+        super().__init__('http://localhost:8080/v1.1')
+        self.pages = pages
+
+    def execute(self, method, url, **kwargs):
+        return Response(self.pages[str(url)])
+
+
+class DeepInsertTest(unittest.TestCase):
+    def plan(self, entity):
+        data = staplus_client.utils.transform_entity_to_json_dict(entity)
+        return deep_insert.plan(entity, data, {id(entity)})[1]
+
+    def test_times_and_numbers_are_compared_by_value(self):
+        group = staplus.ObservationGroup(name='run', description='d', creation_time='2023-01-01T01:00:00+01:00')
+        created = {'@iot.id': 1, 'name': 'run', 'description': 'd', 'creationTime': '2023-01-01T00:00:00.000Z'}
+        self.assertTrue(deep_insert.matches(staplus_client.utils.transform_entity_to_json_dict(group), created))
+        self.assertTrue(deep_insert.matches({'result': 21, 'parameters': None}, {'result': 21.0}))
+        self.assertTrue(deep_insert.matches({'result': 0.1}, {'result': 0.10000000000000001}))
+        self.assertFalse(deep_insert.matches({'result': 21}, {'result': 21.5}))
+
+    def test_identical_siblings_are_told_apart_by_their_children(self):
+        first, second = [staplus.Datastream(name='temperature', description='d', observation_type='ot',
+                                            unit_of_measurement=UnitOfMeasurement('degree Celsius', 'C', 'd'),
+                                            observed_property=staplus.ObservedProperty(name, 'd', 'x'))
+                         for name in ('air', 'water')]
+        thing = staplus.Thing('boat', 'd', datastreams=[first, second])
+        datastream = {'name': 'temperature', 'description': 'd', 'observationType': 'ot',
+                      'unitOfMeasurement': {'name': 'degree Celsius', 'symbol': 'C', 'definition': 'd'}}
+        created = {'@iot.id': 1, 'Datastreams': [
+            dict(datastream, **{'@iot.id': 2, 'ObservedProperty': {'@iot.id': 20, 'name': 'water', 'definition': 'd',
+                                                                   'description': 'x'}}),
+            dict(datastream, **{'@iot.id': 1, 'ObservedProperty': {'@iot.id': 10, 'name': 'air', 'definition': 'd',
+                                                                   'description': 'x'}})]}
+        self.assertEqual(deep_insert.resolve(Service({}), self.plan(thing), linked(created)), [])
+        self.assertEqual((first.id, first.observed_property.id), (1, 10))
+        self.assertEqual((second.id, second.observed_property.id), (2, 20))
+
+    def test_next_link_of_expanded_list_is_followed(self):
+        things = [staplus.Thing('boat {}'.format(i), 'd') for i in range(3)]
+        party = staplus.Party(display_name='LJS', role='individual', things=things)
+        next_link = 'http://localhost:8080/v1.1/Parties(1)/Things?$skip=2'
+        created = {'@iot.id': 1, 'Things@iot.nextLink': next_link,
+                   'Things': [{'@iot.id': i, 'name': 'boat {}'.format(i), 'description': 'd'} for i in range(2)]}
+        service = Service({next_link: linked({'value': [{'@iot.id': 2, 'name': 'boat 2', 'description': 'd'}]})})
+        self.assertEqual(deep_insert.resolve(service, self.plan(party), linked(created)), [])
+        self.assertEqual([thing.id for thing in things], [0, 1, 2])
+
+    def test_unresolved_entities_are_returned(self):
+        thing = staplus.Thing('boat', 'd')
+        party = staplus.Party(display_name='LJS', role='individual', things=[thing])
+        created = {'@iot.id': 1, 'Things': [{'@iot.id': 5, 'name': 'ship', 'description': 'd'}]}
+        self.assertEqual(deep_insert.resolve(Service({}), self.plan(party), linked(created)), [thing])
+        self.assertIsNone(thing.id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import gc
+import json
+import unittest
+import weakref
+
+import requests
+from furl import furl
+
+import staplus_client as staplus
+
+
+class Response:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, data):
+        self.content = json.dumps(data).encode('utf-8')
+
+
+class Service(staplus.STAplusService):
+    """
+    A service with total Observations in pages of page_size; the request of a page at one of the failing skips
+    fails once
+    """
+    def __init__(self, total=10, page_size=3, failing=()):
+        super().__init__('http://localhost:8080/v1.1')
+        self.total = total
+        self.page_size = page_size
+        self.failing = set(failing)
+        self.sent = []
+
+    def _send(self, method, url, **kwargs):
+        self.sent.append(str(url))
+        skip = int(furl(str(url)).args.get('$skip', 0))
+        if skip in self.failing:
+            self.failing.remove(skip)
+            raise requests.exceptions.ConnectionError('connection reset')
+        end = min(self.total, skip + self.page_size)
+        page = {'value': [{'@iot.id': i, 'phenomenonTime': '2023-01-01T00:00:00Z', 'result': i,
+                           'Datastream': {'@iot.id': 1}} for i in range(skip, end)]}
+        if end < self.total:
+            page['@iot.nextLink'] = 'http://localhost:8080/v1.1/Observations?$skip={}'.format(end)
+        return Response(page)
+
+
+class EntityListTest(unittest.TestCase):
+    def test_stream_releases_the_consumed_pages(self):
+        entity_list = Service().observations().query().stream()
+        iterator = iter(entity_list)
+        first = weakref.ref(next(iterator))
+        for _ in range(3):
+            next(iterator)
+        gc.collect()
+        self.assertIsNone(first())
+        self.assertEqual([observation.id for observation in entity_list.entities], [3, 4, 5])
+        self.assertEqual([next(iterator).id for _ in range(6)], list(range(4, 10)))
+        self.assertRaises(StopIteration, next, iterator)
+        self.assertEqual([observation.id for observation in entity_list.entities], [9])
+
+    def test_list_retains_the_pages(self):
+        entity_list = Service().observations().query().list()
+        self.assertEqual([observation.id for observation in entity_list], list(range(10)))
+        self.assertEqual([observation.id for observation in entity_list.entities], list(range(10)))
+
+    def test_stream_reports_the_index_in_the_collection(self):
+        indexes = []
+        entity_list = Service().observations().query().stream(callback=indexes.append, step_size=4)
+        self.assertEqual(len(list(entity_list)), 10)
+        self.assertEqual(indexes, [0, 4, 8])
+
+    def test_prefetch_yields_the_collection_in_order(self):
+        service = Service(total=20)
+        entity_list = service.observations().query().list(prefetch=2)
+        self.assertEqual([observation.id for observation in entity_list], list(range(20)))
+        self.assertEqual(len(service.sent), 7)
+
+    def test_prefetch_raises_the_error_of_the_worker_and_retries_the_same_link(self):
+        service = Service(failing=[6])
+        entity_list = service.observations().query().stream(prefetch=2)
+        iterator = iter(entity_list)
+        self.assertEqual([next(iterator).id for _ in range(6)], list(range(6)))
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            next(iterator)
+        self.assertEqual(entity_list.next_link, 'http://localhost:8080/v1.1/Observations?$skip=6')
+        self.assertEqual([next(iterator).id for _ in range(4)], list(range(6, 10)))
+        self.assertRaises(StopIteration, next, iterator)
+        self.assertEqual(service.sent.count('http://localhost:8080/v1.1/Observations?$skip=6'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
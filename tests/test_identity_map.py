@@ -0,0 +1,44 @@
+import unittest
+
+import staplus_client as staplus
+import staplus_client.utils
+from staplus_client.service.identity_map import IdentityMap
+
+
+class IdentityMapTest(unittest.TestCase):
+    def setUp(self):
+        self.service = staplus.STAplusService('http://localhost:8080/v1.1', identity_map=IdentityMap())
+
+    def decode(self, json):
+        entity = staplus_client.utils.transform_json_to_entity(json, 'frost_sta_client.model.datastream.Datastream')
+        return self.service.canonical(entity, json)
+
+    def test_reference_keeps_the_properties_read_before(self):
+        full = {'@iot.id': 5, 'name': 'temperature', 'description': 'air temperature',
+                'properties': {'height': 2}, 'observationType': 'OM_Measurement'}
+        datastream = self.decode(full)
+        reference = self.decode({'@iot.id': 5})
+        self.assertIs(reference, datastream)
+        self.assertEqual(datastream.name, 'temperature')
+        self.assertEqual(datastream.description, 'air temperature')
+        self.assertEqual(datastream.properties, {'height': 2})
+
+    def test_select_merges_the_selected_properties(self):
+        datastream = self.decode({'@iot.id': 5, 'name': 'temperature', 'description': 'air temperature'})
+        self.decode({'@iot.id': 5, 'name': 'air temperature'})
+        self.assertEqual(datastream.name, 'air temperature')
+        self.assertEqual(datastream.description, 'air temperature')
+
+    def test_list_rows_are_merged_by_their_json(self):
+        datastream = self.decode({'@iot.id': 5, 'name': 'temperature'})
+        json = {'value': [{'@iot.id': 5}, {'@iot.id': 6, 'name': 'humidity'}]}
+        entity_list = staplus_client.utils.transform_json_to_entity_list(
+            json, 'frost_sta_client.model.datastream.Datastream')
+        self.service.canonical(entity_list, json)
+        self.assertIs(entity_list.entities[0], datastream)
+        self.assertEqual(datastream.name, 'temperature')
+        self.assertEqual(entity_list.entities[1].name, 'humidity')
+
+
+if __name__ == '__main__':
+    unittest.main()
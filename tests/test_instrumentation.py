@@ -0,0 +1,51 @@
+import json
+import time
+import unittest
+
+import staplus_client as staplus
+import staplus_client.utils
+
+
+class Response:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, data):
+        self.content = json.dumps(data).encode('utf-8')
+
+
+class Hooks(staplus.Hooks):
+    def __init__(self):
+        self.decodes = []
+
+    def after_decode(self, template, count, seconds):
+        self.decodes.append((template, count, seconds))
+
+
+class Service(staplus.STAplusService):
+    def _send(self, method, url, **kwargs):
+        return Response({'value': [{'@iot.id': 1, 'name': 'boat', 'description': 'd'}]})
+
+
+class InstrumentationTest(unittest.TestCase):
+    def test_decode_time_includes_parsing(self):
+        parse = staplus_client.utils.response_json
+
+        def slow_parse(response):
+            time.sleep(0.05)
+            return parse(response)
+
+        hooks = Hooks()
+        service = Service('http://localhost:8080/v1.1', hooks=[hooks])
+        staplus_client.utils.response_json = slow_parse
+        try:
+            service.things().query().list()
+        finally:
+            staplus_client.utils.response_json = parse
+        self.assertEqual(len(hooks.decodes), 1)
+        self.assertEqual(hooks.decodes[0][1], 1)
+        self.assertGreaterEqual(hooks.decodes[0][2], 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import unittest
+
+import staplus_client as staplus
+import staplus_client.utils
+from staplus_client.model.ext import lazy
+from staplus_client.model.ext.lazy import LazyEntityList
+
+
+class Response:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, data):
+        self.content = json.dumps(data).encode('utf-8')
+
+
+class Service(staplus.STAplusService):
+    def __init__(self):
+        super().__init__('http://localhost:8080/v1.1')
+        self.sent = []
+
+    def _send(self, method, url, **kwargs):
+        self.sent.append(str(url))
+        return Response({'value': [{'@iot.id': 7, 'name': 'temperature', 'description': 'd'}]})
+
+
+class LazyEntityListTest(unittest.TestCase):
+    def setUp(self):
+        observation = {'phenomenonTime': '2023-01-01T00:00:00Z', 'result': 21, 'Datastream': {'@iot.id': 1}}
+        json = {'@iot.id': 1, 'name': 'run', 'description': 'the first run',
+                'Observations': [dict(observation, **{'@iot.id': 1}), dict(observation, **{'@iot.id': 2}),
+                                 dict(observation, **{'@iot.id': 3, 'result': 22.0})]}
+        self.group = staplus_client.utils.transform_json_to_trusted_entity(
+            json, 'staplus_client.model.observation_group.ObservationGroup')
+
+    def test_expanded_list_is_decoded_when_used(self):
+        observations = self.group.observations
+        self.assertIsInstance(observations, LazyEntityList)
+        self.assertFalse(observations.decoded)
+        self.assertEqual([o.id for o in observations], [1, 2, 3])
+        self.assertTrue(observations.decoded)
+
+    def test_dedupe_of_expanded_list(self):
+        unique = self.group.observations.dedupe()
+        self.assertIsInstance(unique, LazyEntityList)
+        self.assertTrue(unique.decoded)
+        self.assertEqual([o.id for o in unique.entities], [1, 3])
+
+    def test_dedupe_by_key(self):
+        unique = self.group.observations.dedupe(key=lambda o: o.result)
+        self.assertEqual([o.id for o in unique.entities], [1, 3])
+
+
+class LoadTest(unittest.TestCase):
+    def setUp(self):
+        self.service = Service()
+        self.thing = staplus_client.utils.transform_json_to_entity({'@iot.id': 1, 'name': 'boat', 'description': 'd'},
+                                                                   'staplus_client.model.thing.Thing')
+        self.thing.service = self.service
+
+    def test_relation_is_fetched_once(self):
+        datastreams = lazy.load(self.thing, 'datastreams')
+        self.assertEqual([d.id for d in datastreams.entities], [7])
+        self.assertIs(lazy.load(self.thing, 'Datastreams'), datastreams)
+        self.assertEqual(self.service.sent, ['http://localhost:8080/v1.1/Things(1)/Datastreams'])
+
+    def test_unknown_relation_is_rejected(self):
+        with self.assertRaises(ValueError):
+            lazy.load(self.thing, 'Observations')
+        with self.assertRaises(ValueError):
+            lazy.load(self.thing, 'name')
+
+    def test_async_service_is_rejected(self):
+        async def load():
+            service = staplus.AsyncSTAplusService('http://localhost:8080/v1.1')
+            self.thing.service = service
+            try:
+                lazy.load(self.thing, 'Datastreams')
+            finally:
+                await service.close()
+        with self.assertRaises(ValueError):
+            asyncio.run(load())
+        self.assertIsNone(self.thing.datastreams)
+
+
+if __name__ == '__main__':
+    unittest.main()
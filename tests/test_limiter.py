@@ -0,0 +1,106 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import requests
+
+import staplus_client as staplus
+
+
+class Clock:
+    """
+    A time.monotonic() that only moves when it is advanced
+    """
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Server:
+    """
+    Replaces requests.Session.request, counts the requests in flight and answers after latency seconds
+    """
+    def __init__(self, latency=0.02):
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{}'
+        return response
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_burst_then_one_token_per_interval(self):
+        clock = Clock()
+        with mock.patch('time.monotonic', clock):
+            limiter = staplus.RateLimiter(rate=10, burst=3)
+            delays = [limiter.reserve() for _ in range(5)]
+        self.assertEqual(delays[:3], [0, 0, 0])
+        self.assertAlmostEqual(delays[3], 0.1)
+        self.assertAlmostEqual(delays[4], 0.2)
+
+    def test_tokens_refill_up_to_the_burst(self):
+        clock = Clock()
+        with mock.patch('time.monotonic', clock):
+            limiter = staplus.RateLimiter(rate=10, burst=3)
+            for _ in range(3):
+                limiter.reserve()
+            clock.now += 0.25
+            self.assertEqual([limiter.reserve() for _ in range(2)], [0, 0])
+            self.assertAlmostEqual(limiter.reserve(), 0.05)
+            clock.now += 60
+            self.assertEqual([limiter.reserve() for _ in range(3)], [0, 0, 0])
+            self.assertAlmostEqual(limiter.reserve(), 0.1)
+
+    def test_without_rate_nothing_waits(self):
+        limiter = staplus.RateLimiter(max_in_flight=1)
+        self.assertEqual([limiter.reserve() for _ in range(100)], [0] * 100)
+
+    def test_rate_limits_the_requests_of_the_service(self):
+        service = staplus.STAplusService('http://localhost:8080/v1.1', limiter=staplus.RateLimiter(rate=50, burst=1))
+        server = Server(latency=0)
+        with mock.patch.object(requests.Session, 'request', server.request):
+            started = time.monotonic()
+            for _ in range(6):
+                service.execute('get', service.url)
+            seconds = time.monotonic() - started
+        self.assertGreaterEqual(seconds, 0.09)
+
+    def test_max_in_flight_limits_the_concurrent_requests(self):
+        service = staplus.STAplusService('http://localhost:8080/v1.1', limiter=staplus.RateLimiter(max_in_flight=2))
+        server = Server()
+        with mock.patch.object(requests.Session, 'request', server.request):
+            with ThreadPoolExecutor(max_workers=6) as executor:
+                list(executor.map(lambda _: service.execute('get', service.url), range(12)))
+        self.assertEqual(server.max_in_flight, 2)
+        self.assertEqual(server.in_flight, 0)
+
+    def test_a_failed_request_releases_its_slot(self):
+        limiter = staplus.RateLimiter(max_in_flight=1)
+        with self.assertRaises(RuntimeError):
+            with limiter:
+                raise RuntimeError('request failed')
+        self.assertTrue(limiter._slots.acquire(timeout=1))
+
+    def test_invalid_limits(self):
+        for kwargs in ({'rate': 0}, {'rate': -1}, {'burst': 0}, {'max_in_flight': 0}, {'max_in_flight': 1.5}):
+            with self.assertRaises(ValueError):
+                staplus.RateLimiter(**kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
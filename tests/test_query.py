@@ -0,0 +1,23 @@
+import unittest
+
+from staplus_client.query.query import collection_end, stable_orderby
+
+
+class QueryTest(unittest.TestCase):
+    def test_stable_orderby_appends_id(self):
+        self.assertEqual(stable_orderby(None), 'id asc')
+        self.assertEqual(stable_orderby('phenomenonTime asc'), 'phenomenonTime asc,id asc')
+        self.assertEqual(stable_orderby('name asc, id desc'), 'name asc,id desc')
+
+    def test_stable_orderby_skips_empty_criteria(self):
+        self.assertEqual(stable_orderby('phenomenonTime asc,'), 'phenomenonTime asc,id asc')
+        self.assertEqual(stable_orderby(' , '), 'id asc')
+
+    def test_collection_end_respects_top(self):
+        self.assertEqual(collection_end({}, 4000), 4000)
+        self.assertEqual(collection_end({'$skip': 250, '$top': 70}, 4000), 320)
+        self.assertEqual(collection_end({'$skip': 3950, '$top': 500}, 4000), 4000)
+
+
+if __name__ == '__main__':
+    unittest.main()
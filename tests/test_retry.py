@@ -0,0 +1,134 @@
+import email.utils
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import requests
+
+import staplus_client as staplus
+from staplus_client.service.retry import retry_after
+
+
+class Response:
+    content = b''
+    text = ''
+    reason = 'Service Unavailable'
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(response=self)
+
+
+class Service(staplus.STAplusService):
+    """
+    A service answering with the given responses in turn; an exception in them is raised instead
+    """
+    def __init__(self, responses, retry):
+        super().__init__('http://localhost:8080/v1.1', retry=retry)
+        self.responses = responses
+        self.sent = []
+
+    def _send(self, method, url, **kwargs):
+        self.sent.append(method)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class RetryAfterTest(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(retry_after('3'), 3.0)
+        self.assertEqual(retry_after('1.5'), 1.5)
+        self.assertEqual(retry_after('-2'), 0.0)
+
+    def test_http_date(self):
+        later = email.utils.format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+        self.assertAlmostEqual(retry_after(later), 30, delta=2)
+        self.assertEqual(retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+
+    def test_invalid_values(self):
+        self.assertIsNone(retry_after(None))
+        self.assertIsNone(retry_after('soon'))
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def test_retry_after_is_used_instead_of_the_backoff(self):
+        policy = staplus.RetryPolicy(backoff_factor=100)
+        self.assertEqual(policy.delay('GET', 0, time.monotonic(), 503, {'Retry-After': '2'}), 2.0)
+        self.assertLessEqual(policy.delay('GET', 0, time.monotonic(), 503, {}), 60)
+
+    def test_backoff_doubles_up_to_max_backoff(self):
+        policy = staplus.RetryPolicy(retries=10, backoff_factor=1, max_backoff=4)
+        with mock.patch('random.uniform', side_effect=lambda low, high: high):
+            delays = [policy.delay('GET', attempt, time.monotonic(), 503) for attempt in range(5)]
+        self.assertEqual(delays, [1, 2, 4, 4, 4])
+
+    def test_non_idempotent_methods_are_retried_only_after_429(self):
+        policy = staplus.RetryPolicy()
+        self.assertIsNone(policy.delay('post', 0, time.monotonic(), 503, {'Retry-After': '0'}))
+        self.assertIsNone(policy.delay('post', 0, time.monotonic()))
+        self.assertEqual(policy.delay('post', 0, time.monotonic(), 429, {'Retry-After': '0'}), 0)
+        self.assertEqual(policy.delay('put', 0, time.monotonic(), 503, {'Retry-After': '0'}), 0)
+        self.assertIsNone(policy.delay('get', 0, time.monotonic(), 500, {'Retry-After': '0'}))
+
+    def test_max_elapsed_ends_the_retries(self):
+        policy = staplus.RetryPolicy(max_elapsed=10)
+        self.assertEqual(policy.delay('GET', 0, time.monotonic() - 5, 503, {'Retry-After': '4'}), 4.0)
+        self.assertIsNone(policy.delay('GET', 0, time.monotonic() - 5, 503, {'Retry-After': '6'}))
+        self.assertIsNone(staplus.RetryPolicy(max_elapsed=1).delay('GET', 0, time.monotonic(), 503,
+                                                                   {'Retry-After': '2'}))
+
+
+class ExecuteTest(unittest.TestCase):
+    def test_get_is_retried_after_the_retry_after(self):
+        service = Service([Response(503, {'Retry-After': '2'}), Response(200)], staplus.RetryPolicy())
+        with mock.patch('time.sleep') as sleep:
+            self.assertEqual(service.execute('get', service.url).status_code, 200)
+        sleep.assert_called_once_with(2.0)
+        self.assertEqual(service.sent, ['get', 'get'])
+
+    def test_post_is_not_retried(self):
+        service = Service([Response(503, {'Retry-After': '0'}), Response(201)], staplus.RetryPolicy())
+        with self.assertRaises(requests.exceptions.HTTPError):
+            service.execute('post', service.url)
+        self.assertEqual(service.sent, ['post'])
+        service = Service([requests.exceptions.ConnectionError(), Response(201)], staplus.RetryPolicy())
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            service.execute('post', service.url)
+        self.assertEqual(service.sent, ['post'])
+
+    def test_post_is_retried_after_429(self):
+        service = Service([Response(429, {'Retry-After': '0'}), Response(201)], staplus.RetryPolicy())
+        self.assertEqual(service.execute('post', service.url).status_code, 201)
+        self.assertEqual(service.sent, ['post', 'post'])
+
+    def test_connection_errors_of_get_are_retried(self):
+        service = Service([requests.exceptions.ConnectionError(), requests.exceptions.Timeout(), Response(200)],
+                          staplus.RetryPolicy(backoff_factor=0))
+        self.assertEqual(service.execute('get', service.url).status_code, 200)
+        self.assertEqual(len(service.sent), 3)
+
+    def test_the_last_error_is_raised_after_the_retries(self):
+        service = Service([Response(503, {'Retry-After': '0'}) for _ in range(3)], staplus.RetryPolicy(retries=2))
+        with self.assertRaises(requests.exceptions.HTTPError) as context:
+            service.execute('get', service.url)
+        self.assertEqual(context.exception.response.status_code, 503)
+        self.assertEqual(len(service.sent), 3)
+
+    def test_a_retry_after_beyond_max_elapsed_is_not_waited_for(self):
+        service = Service([Response(503, {'Retry-After': '3600'}), Response(200)], staplus.RetryPolicy(max_elapsed=60))
+        with mock.patch('time.sleep') as sleep:
+            with self.assertRaises(requests.exceptions.HTTPError):
+                service.execute('get', service.url)
+        sleep.assert_not_called()
+        self.assertEqual(len(service.sent), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+import staplus_client as staplus
+from staplus_client.service.store import EntityStore
+
+
+class EntityStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = EntityStore()
+        self.store._insert('Campaign', [
+            {'@iot.id': 1, 'name': 'winter', 'description': 'd', 'startTime': '2023-01-01T01:00:00+01:00',
+             'endTime': '2023-03-01T00:00:00Z'},
+            {'@iot.id': 2, 'name': 'spring', 'description': 'd', 'startTime': '2023-03-01T00:30:00+02:00',
+             'endTime': '2023-06-01T00:00:00.5Z'}])
+
+    def tearDown(self):
+        self.store.close()
+
+    def ids(self, params):
+        return [item.get('@iot.id', None) for item in self.store.select('Campaign', params)[0]]
+
+    def test_times_are_compared_as_instants(self):
+        self.assertEqual(self.ids({'$filter': 'startTime eq 2023-01-01T00:00:00Z'}), [1])
+        self.assertEqual(self.ids({'$filter': 'startTime lt 2023-02-28T23:00:00Z'}), [1, 2])
+        self.assertEqual(self.ids({'$filter': 'startTime ge 2023-02-28T23:00:00Z'}), [])
+        self.assertEqual(self.ids({'$filter': '2023-06-01T00:00:00Z lt endTime'}), [2])
+
+    def test_intervals_are_compared_by_start_or_end(self):
+        self.store._insert('Observation', [{'@iot.id': 1, 'result': 1,
+                                            'phenomenonTime': '2023-01-01T00:00:00Z/2023-01-01T02:00:00Z'}])
+        select = self.store.select
+        self.assertEqual(len(select('Observation', {'$filter': 'phenomenonTime gt 2022-12-31T23:00:00Z'})[0]), 1)
+        self.assertEqual(len(select('Observation', {'$filter': 'phenomenonTime lt 2023-01-01T01:00:00Z'})[0]), 0)
+        self.assertEqual(len(select('Observation', {'$filter': 'phenomenonTime lt 2023-01-01T03:00:00Z'})[0]), 1)
+
+    def test_select_returns_the_selected_properties(self):
+        items, _ = self.store.select('Campaign', {'$select': 'id,name', '$orderby': 'id'})
+        self.assertEqual(items, [{'@iot.id': 1, 'name': 'winter'}, {'@iot.id': 2, 'name': 'spring'}])
+        with self.assertRaises(ValueError):
+            self.store.select('Campaign', {'$select': 'Party/id'})
+
+    def test_offline_list_with_select(self):
+        service = staplus.STAplusService('http://localhost:8080/v1.1', store=self.store)
+        campaigns = service.campaigns().query().select('id', 'name').list(offline=True)
+        self.assertEqual([(c.id, c.name) for c in campaigns.entities], [(1, 'winter'), (2, 'spring')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import json
+import unittest
+from datetime import datetime
+
+from furl import furl
+
+import staplus_client as staplus
+from staplus_client.service.sync import Watermark
+
+
+class Response:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, data):
+        self.content = json.dumps(data).encode('utf-8')
+
+
+def time(row):
+    return datetime.fromisoformat(row['phenomenonTime'])
+
+
+class Service(staplus.STAplusService):
+    """
+    A service with the Observations of one Datastream, which answers the filter 'phenomenonTime ge <time>',
+    ordered by phenomenonTime and id, in pages of two
+    """
+    def __init__(self, rows):
+        super().__init__('http://localhost:8080/v1.1')
+        self.rows = rows
+        self.sent = []
+
+    def _send(self, method, url, **kwargs):
+        args = furl(str(url)).args
+        self.sent.append(dict(args))
+        rows = sorted(self.rows, key=lambda row: (time(row), row['@iot.id']))
+        if '$filter' in args:
+            since = datetime.fromisoformat(args['$filter'].split(' ge ')[1])
+            rows = [row for row in rows if time(row) >= since]
+        skip = int(args.get('$skip', 0))
+        top = int(args.get('$top', 2))
+        page = {'value': rows[skip:skip + top]}
+        if skip + top < len(rows):
+            link = furl(str(url))
+            link.args['$skip'] = skip + top
+            page['@iot.nextLink'] = link.url
+        return Response(page)
+
+
+def observation(id, minute):
+    return {'@iot.id': id, 'phenomenonTime': '2023-01-01T00:{:02d}:00Z'.format(minute), 'result': id}
+
+
+class Sink:
+    """
+    Collects the synced ids and the last watermark; raises at the call fail_at
+    """
+    def __init__(self, fail_at=None):
+        self.ids = []
+        self.watermark = None
+        self.calls = 0
+        self.fail_at = fail_at
+
+    def __call__(self, observations, watermark):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise RuntimeError('sink failed')
+        self.ids += [observation.id for observation in observations]
+        self.watermark = watermark
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.service = Service([observation(1, 1), observation(2, 1), observation(3, 2), observation(4, 2),
+                                observation(5, 2)])
+        self.datastream = staplus.Datastream(id=1)
+        self.datastream.set_service(self.service)
+
+    def test_the_watermark_is_the_latest_time_with_its_ids(self):
+        sink = Sink()
+        watermark = self.service.sync(self.datastream, sink=sink)
+        self.assertEqual(sink.ids, [1, 2, 3, 4, 5])
+        self.assertEqual(watermark, Watermark('2023-01-01T00:02:00+00:00', [3, 4, 5]))
+        self.assertEqual(self.service.sent[0]['$orderby'], 'phenomenonTime asc,id asc')
+        self.assertNotIn('$filter', self.service.sent[0])
+
+    def test_resume_at_a_time_shared_with_new_observations(self):
+        watermark = self.service.sync(self.datastream, sink=Sink())
+        self.service.rows += [observation(6, 2), observation(7, 3)]
+        sink = Sink()
+        watermark = self.service.sync(self.datastream, since=watermark, sink=sink)
+        self.assertEqual(sink.ids, [6, 7])
+        self.assertEqual(watermark, Watermark('2023-01-01T00:03:00+00:00', [7]))
+        self.assertEqual(self.service.sent[-1]['$filter'], 'phenomenonTime ge 2023-01-01T00:02:00+00:00')
+
+    def test_resume_after_the_sink_failed_in_the_middle_of_a_time(self):
+        sink = Sink(fail_at=3)
+        with self.assertRaises(RuntimeError):
+            self.service.sync(self.datastream, sink=sink)
+        self.assertEqual(sink.ids, [1, 2, 3, 4])
+        self.assertEqual(sink.watermark, Watermark('2023-01-01T00:02:00+00:00', [3, 4]))
+        state = json.loads(json.dumps(sink.watermark.__getstate__()))
+        since = Watermark()
+        since.__setstate__(state)
+        self.service.sync(self.datastream, since=since, sink=sink)
+        self.assertEqual(sink.ids, [1, 2, 3, 4, 5])
+
+    def test_resume_without_new_observations_syncs_nothing(self):
+        watermark = self.service.sync(self.datastream, sink=Sink())
+        sink = Sink()
+        self.assertEqual(self.service.sync(self.datastream, since=watermark, sink=sink), watermark)
+        self.assertEqual(sink.calls, 0)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            self.service.sync(self.datastream, sink=Sink(), by='validTime')
+        with self.assertRaises(ValueError):
+            self.service.sync(self.datastream)
+
+
+if __name__ == '__main__':
+    unittest.main()
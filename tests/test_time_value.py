@@ -0,0 +1,40 @@
+import datetime
+import unittest
+
+import staplus_client as staplus
+from staplus_client.model.ext import time_value
+
+
+class TimeValueTest(unittest.TestCase):
+    start = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+    end = datetime.datetime(2023, 1, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def test_list_of_datetimes_is_an_interval(self):
+        observation = staplus.Observation(phenomenon_time=[self.start, self.end], result=1)
+        self.assertEqual(observation.__getstate__()['phenomenonTime'],
+                         '2023-01-01T00:00:00+00:00/2023-01-01T01:00:00+00:00')
+
+    def test_list_equals_interval_string(self):
+        self.assertEqual(time_value.parse((self.start, self.end)),
+                         time_value.parse('2023-01-01T01:00:00+01:00/2023-01-01T01:00:00Z'))
+
+    def test_parsed_times_are_not_kept_by_default(self):
+        observation = staplus.Observation(phenomenon_time='2023-01-01T00:00:00Z', result=1)
+        observation.__getstate__()
+        self.assertEqual(observation, staplus.Observation(phenomenon_time='2023-01-01T01:00:00+01:00', result=1))
+        self.assertNotIn('_times', observation.__dict__)
+
+    def test_list_changed_in_place_is_parsed_again(self):
+        time_value.keep_parsed = True
+        try:
+            observation = staplus.Observation(phenomenon_time=[self.start, self.end], result=1)
+            parsed = time_value.cached(observation, 'phenomenon_time')
+            self.assertIs(time_value.cached(observation, 'phenomenon_time'), parsed)
+            observation.phenomenon_time[1] = self.start
+            self.assertEqual(time_value.cached(observation, 'phenomenon_time').key[1], self.start)
+        finally:
+            time_value.keep_parsed = False
+
+
+if __name__ == '__main__':
+    unittest.main()